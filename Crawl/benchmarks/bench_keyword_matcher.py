@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+关键词匹配微基准
+
+对比 url_filter 中逐个关键词子串查找（原实现）与预构建的 KeywordAutomaton：
+- has_whitelist_keywords：锚文本 vs 白名单
+- get_matched_whitelist_keyword：锚文本 vs 白名单，按列表顺序返回第一个关键词。短锚文本上自动机
+  逐字符扫描反而比逐个子串查找慢（约 0.65x），因此新实现仍是逐个查找，这一行只用于校验结果一致
+- should_skip_by_anchor_text：锚文本 vs 链接文本黑名单
+- should_skip_url：URL vs URL关键词黑名单
+- should_skip_url_regex：URL vs 正则黑名单（逐条 re.search vs 预编译合并正则，及按 host 的判定缓存）
+
+同时校验两种实现的返回值（包括第一个匹配的关键词）完全一致。
+
+输入：
+- 默认使用内置的典型锚文本与项目URL样本
+- 若存在 benchmarks/corpus（见 bench_parser_backends.py --fetch），使用语料页面中的全部 <a> 链接
+
+用法：
+    python benchmarks/bench_keyword_matcher.py
+    python benchmarks/bench_keyword_matcher.py --repeat 20
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from functools import partial
+
+CRAWL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CRAWL_DIR)
+
+from program_crawler.url_filter import (  # noqa: E402
+    ANCHOR_TEXT_BLACKLIST,
+    URL_BLACKLIST_KEYWORDS,
+    URL_BLACKLIST_PATTERNS,
+    URL_WHITELIST_KEYWORDS,
+    UrlVerdictCache,
+    get_matched_whitelist_keyword,
+    has_whitelist_keywords,
+    should_skip_by_anchor_text,
+    should_skip_url,
+    should_skip_url_regex,
+)
+
+DEFAULT_CORPUS_DIR = os.path.join(CRAWL_DIR, 'benchmarks', 'corpus')
+
+SAMPLE_ANCHORS = [
+    'Home', 'Read more', 'Contact us', 'About us', 'Apply now', 'Entry requirements',
+    'Course structure and modules', 'Fees and funding', 'Tuition fees', 'Student stories',
+    'Our research', 'Frequently asked questions', 'Careers and employability', 'News', 'Events',
+    'Postgraduate taught courses', 'MSc Data Science', 'Scholarships', 'Privacy policy',
+    'How to apply', 'International students', 'Accommodation', 'Capstone project', 'Library',
+]
+
+SAMPLE_URLS = [
+    'https://www.example.ac.uk/postgraduate/taught/courses/msc-data-science/entry-requirements',
+    'https://www.example.edu/graduate/programs/computer-science/ms',
+    'https://www.example.edu.au/study/postgraduate/master-of-information-technology',
+    'https://www.example.edu/news/2024/05/graduate-school-rankings',
+    'https://www.example.ac.uk/study/postgraduate/fees-and-funding/scholarships',
+    'https://www.example.edu.hk/programmes/taught-postgraduate/msc-finance/curriculum',
+]
+
+
+# =============================================================================
+# 原实现（逐个关键词子串查找）
+# =============================================================================
+
+def legacy_has_whitelist_keywords(url, anchor_text=''):
+    if not anchor_text:
+        return False
+    text_lower = anchor_text.lower()
+    return any(keyword in text_lower for keyword in URL_WHITELIST_KEYWORDS)
+
+
+def legacy_get_matched_whitelist_keyword(anchor_text):
+    if not anchor_text:
+        return None
+    text_lower = anchor_text.lower()
+    for keyword in URL_WHITELIST_KEYWORDS:
+        if keyword in text_lower:
+            return keyword
+    return None
+
+
+def legacy_should_skip_by_anchor_text(anchor_text):
+    if not anchor_text:
+        return False
+    text_lower = anchor_text.lower().strip()
+    return any(blacklist_text in text_lower for blacklist_text in ANCHOR_TEXT_BLACKLIST)
+
+
+def legacy_should_skip_url(url):
+    url_lower = url.lower()
+    return any(keyword in url_lower for keyword in URL_BLACKLIST_KEYWORDS)
+
+
+def legacy_should_skip_url_regex(url):
+    for pattern in URL_BLACKLIST_PATTERNS:
+        if re.search(pattern, url):
+            return True
+    return False
+
+
+# =============================================================================
+
+def load_links(corpus_dir):
+    """从语料页面中提取 (href, 锚文本)；没有语料时返回内置样本"""
+    index_path = os.path.join(corpus_dir, 'index.json')
+    if not os.path.exists(index_path):
+        return [(url, anchor) for url in SAMPLE_URLS for anchor in SAMPLE_ANCHORS], '内置样本'
+
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+
+    anchor_re = re.compile(r'<a\s[^>]*href=["\']([^"\']+)["\'][^>]*>(.*?)</a>', re.I | re.S)
+    tag_re = re.compile(r'<[^>]+>')
+    links = []
+    for filename in index:
+        with open(os.path.join(corpus_dir, filename), 'rb') as f:
+            html = f.read().decode('utf-8', errors='ignore')
+        for href, inner in anchor_re.findall(html):
+            links.append((href, ' '.join(tag_re.sub(' ', inner).split())))
+    return links, f'语料 {len(index)} 个页面'
+
+
+def bench(func, args_list, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for args in args_list:
+            func(*args)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(args_list)) * 1e6  # 微秒/次
+
+
+def main():
+    parser = argparse.ArgumentParser(description='关键词匹配微基准')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR, help='语料目录')
+    parser.add_argument('--repeat', type=int, default=10, help='重复遍历输入的次数')
+    args = parser.parse_args()
+
+    links, source = load_links(args.corpus)
+    anchors = [(anchor,) for _href, anchor in links]
+    whitelist_args = [(href, anchor) for href, anchor in links]
+    urls = [(href,) for href, _anchor in links]
+    print(f"输入: {source}，共 {len(links)} 个链接，重复 {args.repeat} 次\n")
+
+    cases = [
+        ('has_whitelist_keywords', legacy_has_whitelist_keywords, has_whitelist_keywords, whitelist_args),
+        ('get_matched_whitelist_keyword', legacy_get_matched_whitelist_keyword, get_matched_whitelist_keyword, anchors),
+        ('should_skip_by_anchor_text', legacy_should_skip_by_anchor_text, should_skip_by_anchor_text, anchors),
+        ('should_skip_url', legacy_should_skip_url, should_skip_url, urls),
+        ('should_skip_url_regex', legacy_should_skip_url_regex, should_skip_url_regex, urls),
+        ('should_skip_url_regex(缓存)', legacy_should_skip_url_regex,
+         partial(should_skip_url_regex, verdict_cache=UrlVerdictCache()), urls),
+    ]
+
+    print(f"{'函数':<32}{'原实现 us/次':>14}{'新实现 us/次':>14}{'加速比':>10}{'结果一致':>10}")
+    for name, legacy_func, new_func, args_list in cases:
+        mismatches = sum(1 for a in args_list if legacy_func(*a) != new_func(*a))
+        legacy_us = bench(legacy_func, args_list, args.repeat)
+        new_us = bench(new_func, args_list, args.repeat)
+        consistent = '是' if mismatches == 0 else f'否({mismatches})'
+        print(f"{name:<32}{legacy_us:>14.3f}{new_us:>14.3f}{legacy_us / new_us:>9.2f}x{consistent:>10}")
+
+
+if __name__ == '__main__':
+    main()
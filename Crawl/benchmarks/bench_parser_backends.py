@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+HTML解析后端基准测试
+
+在固定的已保存大学页面语料上，对比各解析后端（html.parser / lxml / selectolax）
+执行 ProgramSpider 的标题 + 结构化内容 + 链接提取的速度：
+- 每秒处理页面数（pages/s，按墙钟时间）
+- 每页 CPU 时间（ms/page，按进程 CPU 时间）
+- 每页平均 content 字节数
+- 与 html.parser 输出完全一致的页面比例
+
+--extractor 可选择 legacy / single_pass 内容提取器，用于对比两者的 CPU 与 content 体积。
+
+用法：
+1. 先保存一份固定语料（只需一次，之后重复使用同一批页面）：
+   python benchmarks/bench_parser_backends.py --fetch top_200_urls.csv --limit 100
+2. 运行基准：
+   python benchmarks/bench_parser_backends.py
+   python benchmarks/bench_parser_backends.py --backends lxml selectolax --repeat 5
+   python benchmarks/bench_parser_backends.py --extractor single_pass
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.request
+
+CRAWL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CRAWL_DIR)
+
+from scrapy.http import HtmlResponse, Request  # noqa: E402
+
+from program_crawler.html_parsing import PARSER_BACKENDS, check_parser_backend, make_soup  # noqa: E402
+from program_crawler.spiders.program_spider import CONTENT_EXTRACTORS, ProgramSpider  # noqa: E402
+
+DEFAULT_CORPUS_DIR = os.path.join(CRAWL_DIR, 'benchmarks', 'corpus')
+
+
+def fetch_corpus(csv_file, corpus_dir, limit, timeout=20):
+    """从URL列表下载根页面，保存为固定语料（index.json 记录 文件名 -> URL）"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    index_path = os.path.join(corpus_dir, 'index.json')
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+    with open(csv_file, 'r', encoding='utf-8-sig') as f:
+        urls = [row['program_url'] for row in csv.DictReader(f)
+                if row.get('program_url', '').startswith(('http://', 'https://'))]
+
+    saved = 0
+    for url in urls:
+        if saved >= limit:
+            break
+        filename = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.html'
+        if filename in index:
+            saved += 1
+            continue
+        try:
+            req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                if 'text/html' not in resp.headers.get('Content-Type', ''):
+                    continue
+                body = resp.read()
+        except Exception as e:
+            print(f"下载失败 {url}: {e}")
+            continue
+
+        with open(os.path.join(corpus_dir, filename), 'wb') as f:
+            f.write(body)
+        index[filename] = url
+        saved += 1
+        print(f"[{saved}/{limit}] 已保存 {url}")
+
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    print(f"语料目录: {corpus_dir}，共 {len(index)} 个页面")
+
+
+def load_corpus(corpus_dir):
+    """加载语料为 HtmlResponse 列表（按文件名排序，保证每次顺序一致）"""
+    index_path = os.path.join(corpus_dir, 'index.json')
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"语料不存在: {index_path}，请先使用 --fetch 生成")
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+
+    responses = []
+    for filename in sorted(index):
+        with open(os.path.join(corpus_dir, filename), 'rb') as f:
+            body = f.read()
+        url = index[filename]
+        request = Request(url, meta={'project_id': 'bench'})
+        responses.append(HtmlResponse(url=url, body=body, request=request,
+                                      headers={'Content-Type': 'text/html'}))
+    return responses
+
+
+def extract_page(spider, response, backend):
+    """与 ProgramSpider.parse_page 相同的提取步骤：标题 -> 结构化内容 -> 链接"""
+    soup = make_soup(response.text, backend)
+    title = spider.extract_title_from_soup(soup)
+    content = spider.extract_content_from_soup(soup)
+    links = spider.extract_links_from_soup(soup, response)
+    return title, content, links
+
+
+def run_backend(spider, responses, backend, repeat):
+    """返回 (pages/s, CPU ms/page, 各页面输出)；各页面输出为 (title, content, links)"""
+    outputs = [extract_page(spider, response, backend) for response in responses]  # 预热
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(repeat):
+        for response in responses:
+            extract_page(spider, response, backend)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    pages = len(responses) * repeat
+    return pages / max(wall, 1e-9), cpu * 1000 / max(pages, 1), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTML解析后端基准测试')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR, help='语料目录')
+    parser.add_argument('--fetch', metavar='CSV', help='从CSV下载根页面生成语料后退出')
+    parser.add_argument('--limit', type=int, default=100, help='--fetch 时保存的页面数')
+    parser.add_argument('--backends', nargs='+', default=list(PARSER_BACKENDS), choices=PARSER_BACKENDS)
+    parser.add_argument('--repeat', type=int, default=3, help='每个后端重复遍历语料的次数')
+    parser.add_argument('--extractor', default='legacy', choices=CONTENT_EXTRACTORS, help='结构化内容提取器')
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_corpus(args.fetch, args.corpus, args.limit)
+        return
+
+    responses = load_corpus(args.corpus)
+    print(f"语料: {len(responses)} 个页面, 重复 {args.repeat} 次, 内容提取器: {args.extractor}")
+
+    # 只复用提取方法，不加载CSV；基准期间关闭提取过程中的INFO日志
+    spider = ProgramSpider.__new__(ProgramSpider)
+    spider.logger.logger.setLevel('WARNING')
+    spider.content_extractor = args.extractor
+
+    baseline = None
+    print(f"{'后端':<14}{'pages/s':>10}{'CPU ms/page':>14}{'content B/page':>16}{'与html.parser一致':>20}")
+    print("-" * 76)
+    for backend in args.backends:
+        try:
+            check_parser_backend(backend)
+        except ImportError as e:
+            print(f"{backend:<14}跳过: {e}")
+            continue
+
+        pages_per_sec, cpu_ms, outputs = run_backend(spider, responses, backend, args.repeat)
+        if backend == 'html.parser':
+            baseline = outputs
+        if baseline is not None:
+            same = sum(1 for a, b in zip(outputs, baseline) if a == b)
+            parity = f"{same}/{len(outputs)}"
+        else:
+            parity = 'N/A'
+        content_bytes = sum(len(content.encode('utf-8')) for _title, content, _links in outputs) / max(len(outputs), 1)
+        print(f"{backend:<14}{pages_per_sec:>10.1f}{cpu_ms:>14.2f}{content_bytes:>16.0f}{parity:>20}")
+
+
+if __name__ == '__main__':
+    main()
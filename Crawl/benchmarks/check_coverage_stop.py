@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+覆盖度停止规则检查（LINK_COVERAGE_TOPICS / CoverageStopMiddleware）
+
+在本地 HTTP 服务上启动一个固定的项目站点：根页面链接到 4 个主题页面（入学要求 / 截止日期 / 学费 / 课程）
+和若干弱相关页面（子页面带模拟网络延迟）。以单并发（CONCURRENT_REQUESTS=1）爬取，主题链接分数最高、最先下载；
+覆盖全部主题后，仍在调度器中排队的弱相关页面应被丢弃：
+- stats link_scoring/skipped_after_coverage > 0
+- 项目正常收尾（completed），输出页面数 = 根页面链接数 + 1 - 丢弃数
+- 丢弃的请求不作为失败页面输出
+
+用法：
+    python benchmarks/check_coverage_stop.py
+"""
+
+import csv
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CRAWL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CRAWL_DIR)
+os.chdir(CRAWL_DIR)
+
+from scrapy.crawler import CrawlerProcess  # noqa: E402
+from scrapy.utils.project import get_project_settings  # noqa: E402
+
+ROOT_PATH = '/graduate/ms-data-science/'
+# 子页面的模拟网络延迟（秒）：本地服务响应比解析还快时，所有请求会在第一个主题页面解析前就已下载完
+RESPONSE_DELAY = 0.2
+
+# 锚文本 -> 子页面路径；前 4 个覆盖全部主题，其余为弱相关链接
+TOPIC_LINKS = [
+    ('Admission requirements', 'admission-requirements'),
+    ('Application deadline', 'deadlines'),
+    ('Tuition', 'tuition'),
+    ('Curriculum', 'curriculum'),
+]
+WEAK_LINKS = [
+    ('Capstone project', 'capstone'),
+    ('Internship', 'internship'),
+    ('Thesis', 'thesis'),
+    ('Certificates', 'certificates'),
+    ('Concentration', 'concentration'),
+    ('Specialization track', 'specialization'),
+]
+
+
+def render_page(title, links=()):
+    anchors = ''.join(f'<li><a href="{ROOT_PATH}{path}">{text}</a></li>' for text, path in links)
+    return (f'<html><head><title>{title}</title></head><body><h1>{title}</h1>'
+            f'<p>{title} for the MS in Data Science.</p><ul>{anchors}</ul></body></html>').encode('utf-8')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == ROOT_PATH:
+            body = render_page('MS in Data Science', TOPIC_LINKS + WEAK_LINKS)
+        elif self.path.startswith(ROOT_PATH):
+            slug = self.path[len(ROOT_PATH):]
+            titles = {path: text for text, path in TOPIC_LINKS + WEAK_LINKS}
+            if slug not in titles:
+                self.send_error(404)
+                return
+            body = render_page(titles[slug])
+            time.sleep(RESPONSE_DELAY)
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root_url = f'http://127.0.0.1:{server.server_address[1]}{ROOT_PATH}'
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'coverage_fixture.csv')
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'program_name', 'program_url', 'source_file'])
+            writer.writerow(['coverage-fixture', 'MS in Data Science', root_url, 'coverage_fixture.csv'])
+
+        settings = get_project_settings()
+        settings.setdict({
+            'CONCURRENT_REQUESTS': 1,
+            'DOWNLOAD_DELAY': 0,
+            'RANDOMIZE_DOWNLOAD_DELAY': False,
+            'AUTOTHROTTLE_ENABLED': False,
+            'LINK_SCORING_ENABLED': True,
+            'LINK_COVERAGE_TOPICS': ['admissions', 'deadline', 'tuition', 'curriculum'],
+            'SHARED_PAGE_CACHE_SIZE': 0,
+            'HTTP_CONDITIONAL_CACHE_ENABLED': False,
+            'CHECKPOINT_ENABLED': False,
+            'OUTPUT_DIR': os.path.join(tmp_dir, 'output'),
+            'FAILURE_LOG_DIR': os.path.join(tmp_dir, 'log'),
+            'STATUS_LOG_DIR': os.path.join(tmp_dir, 'status_log'),
+            'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+        }, priority='cmdline')
+
+        process = CrawlerProcess(settings)
+        crawler = process.create_crawler('program_spider')
+        process.crawl(crawler, csv_file=csv_path)
+        process.start()
+        server.shutdown()
+
+        stats = crawler.stats.get_stats()
+        skipped = stats.get('link_scoring/skipped_after_coverage', 0)
+        outputs = glob.glob(os.path.join(tmp_dir, 'output', '**', '*.json'), recursive=True)
+        project = None
+        for path in outputs:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('project_id') == 'coverage-fixture':
+                project = data
+
+    num_links = len(TOPIC_LINKS) + len(WEAK_LINKS)
+    print(f"根页面子链接数: {num_links}")
+    print(f"link_scoring/skipped_after_coverage: {skipped}")
+    if project is not None:
+        print(f"项目状态: {project.get('status')}, 输出页面数: {len(project['pages'])}")
+
+    assert skipped > 0, "覆盖全部主题后没有丢弃任何排队中的子页面请求"
+    assert project is not None, "没有找到项目输出"
+    assert project.get('status') == 'completed', project.get('status')
+    assert len(project['pages']) == num_links + 1 - skipped, "输出页面数与丢弃数不符"
+    assert all(page['crawl_status'] == 'success' for page in project['pages']), "丢弃的请求被记为失败页面"
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+爬取计划 - 合并输入CSV并按根URL去重
+
+同一个项目URL经常出现在多个 urls_subject/<学科>/*.csv 中，也会以不同的 source_file
+出现在 top_200_urls.csv 中；逐个CSV爬取时每次出现都会被重新爬取一遍。
+
+本脚本：
+1. 合并所有输入CSV
+2. 按规范化的根URL分组（page_store.canonical_page_url）
+3. 每个唯一根URL只保留一行（第一次出现的行）写入计划CSV，可直接交给 run_crawler.py
+4. 其余引用同一根URL的 (project_id, source_file) 写入扇出映射 {计划CSV名}.fanout.json，
+   JsonWriterPipeline 在项目完成时把结果复制给这些项目（settings.FANOUT_MAP_FILE）
+
+用法：
+    python plan_crawl.py                                  # 默认合并 urls_subject/ 下全部CSV（不含 *_backup.csv）
+    python plan_crawl.py urls_subject/计算机 top_200_urls.csv --output plans/计算机_plan.csv
+    python run_crawler.py plans/crawl_plan.csv            # 自动加载 plans/crawl_plan.fanout.json
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from program_crawler.page_store import canonical_page_url  # noqa: E402
+
+
+def collect_csv_files(inputs):
+    """展开输入路径：目录递归查找 *.csv（跳过 *_backup.csv），文件原样保留"""
+    csv_files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            found = sorted(glob.glob(os.path.join(path, '**', '*.csv'), recursive=True))
+            csv_files.extend(f for f in found if not f.endswith('_backup.csv'))
+        else:
+            csv_files.append(path)
+    return csv_files
+
+
+def build_plan(csv_files):
+    """
+    按规范化根URL分组
+
+    Returns:
+        tuple: (字段名列表, 计划行列表, 扇出映射 {代表项目ID: [{project_id, program_name, source_file}, ...]}, 总行数)
+    """
+    fieldnames = None
+    plan_rows = {}  # 规范化URL -> 代表行
+    targets = {}    # 规范化URL -> {(project_id, source_file): program_name}
+    total_rows = 0
+
+    for csv_file in csv_files:
+        with open(csv_file, 'r', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            if fieldnames is None:
+                fieldnames = reader.fieldnames
+            for row in reader:
+                total_rows += 1
+                url = (row.get('program_url') or '').strip()
+                # 非 http(s) URL（如“暂无”）不合并，交给爬虫按原样处理
+                key = f"{csv_file}#{total_rows}"
+                if url.startswith(('http://', 'https://')):
+                    try:
+                        key = canonical_page_url(url)
+                    except ValueError:
+                        pass
+
+                if key not in plan_rows:
+                    plan_rows[key] = row
+                    targets[key] = {}
+                targets[key].setdefault((row['id'], row['source_file']), row['program_name'])
+
+    fanout = {}
+    for key, row in plan_rows.items():
+        representative = (row['id'], row['source_file'])
+        aliases = [
+            {'project_id': project_id, 'program_name': program_name, 'source_file': source_file}
+            for (project_id, source_file), program_name in targets[key].items()
+            if (project_id, source_file) != representative
+        ]
+        if aliases:
+            fanout[row['id']] = aliases
+
+    return fieldnames, list(plan_rows.values()), fanout, total_rows
+
+
+def main():
+    crawl_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='合并输入CSV并按根URL去重，生成爬取计划与扇出映射')
+    parser.add_argument('inputs', nargs='*', default=[os.path.join(crawl_dir, 'urls_subject')],
+                        help='输入CSV文件或目录（默认 urls_subject/）')
+    parser.add_argument('--output', default=os.path.join(crawl_dir, 'plans', 'crawl_plan.csv'),
+                        help='计划CSV路径，扇出映射写入同名 .fanout.json')
+    args = parser.parse_args()
+
+    csv_files = collect_csv_files(args.inputs)
+    if not csv_files:
+        print("没有找到输入CSV")
+        return
+
+    fieldnames, plan_rows, fanout, total_rows = build_plan(csv_files)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(plan_rows)
+
+    fanout_path = os.path.splitext(args.output)[0] + '.fanout.json'
+    with open(fanout_path, 'w', encoding='utf-8') as f:
+        json.dump(fanout, f, ensure_ascii=False, indent=2)
+
+    fanout_targets = sum(len(aliases) for aliases in fanout.values())
+    print(f"输入CSV: {len(csv_files)} 个，共 {total_rows} 行")
+    print(f"唯一根URL: {len(plan_rows)} 个 -> {args.output}")
+    print(f"扇出: {len(fanout)} 个根URL 额外输出给 {fanout_targets} 个 (project_id, source_file) -> {fanout_path}")
+    print(f"省去重复爬取: {total_rows - len(plan_rows)} 行（其中 {total_rows - len(plan_rows) - fanout_targets} 行为完全相同的项目）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+爬取断点 - 持久化已完成 / 进行中的项目，崩溃后重启自动续爬
+
+原来只能通过 ProgramSpider 的 start_index 参数按CSV位置续爬，崩溃后需要从日志里推算索引，
+而且多项目并发时“索引之前的项目都已完成”并不成立。
+
+断点文件为追加式 JSONL（checkpoints/{CSV文件名}.jsonl），每行一个事件：
+    {"event": "start", "project_id": ..., "source_file": ...}   项目开始爬取
+    {"event": "done",  "project_id": ..., "source_file": ...}   项目已收尾（Item 已交给管道）
+
+重启时：
+1. 已 done 的项目直接跳过（与其在CSV中的顺序无关）
+2. 只有 start 没有 done 的项目（崩溃时正在爬取）排到队列最前面重新爬取
+3. 加载后把断点压缩为只含 done 的记录，避免文件随重启次数增长
+
+爬虫正常结束（reason == 'finished' 且没有剩余项目）时删除断点文件，下一次运行重新开始。
+"""
+
+import json
+import os
+
+
+class CrawlCheckpoint:
+    """
+    项目级爬取断点
+
+    Args:
+        path (str): 断点文件路径
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()  # {(project_id, source_file)}
+        self.in_flight = set()
+        self._file = None
+
+    def load(self):
+        """
+        读取断点并压缩为只含 done 的记录；损坏的行（崩溃时写了一半）直接跳过
+
+        Returns:
+            tuple: (已完成的项目键集合, 进行中的项目键集合)
+        """
+        started = set()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        key = (record['project_id'], record['source_file'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if record.get('event') == 'done':
+                        self.completed.add(key)
+                    else:
+                        started.add(key)
+        self.in_flight = started - self.completed
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for project_id, source_file in self.completed:
+                f.write(self._dumps('done', project_id, source_file))
+        os.replace(tmp_path, self.path)
+
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        return self.completed, self.in_flight
+
+    def is_completed(self, project_id, source_file):
+        return (project_id, source_file) in self.completed
+
+    def mark_started(self, project_id, source_file):
+        self._write('start', project_id, source_file)
+
+    def mark_done(self, project_id, source_file):
+        self.completed.add((project_id, source_file))
+        self._write('done', project_id, source_file)
+
+    def _write(self, event, project_id, source_file):
+        if self._file is not None:
+            self._file.write(self._dumps(event, project_id, source_file))
+
+    @staticmethod
+    def _dumps(event, project_id, source_file):
+        return json.dumps({'event': event, 'project_id': project_id, 'source_file': source_file},
+                          ensure_ascii=False) + '\n'
+
+    def close(self, remove=False):
+        """
+        关闭断点文件
+
+        Args:
+            remove (bool): 爬取已全部完成，删除断点文件
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
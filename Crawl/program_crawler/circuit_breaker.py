@@ -0,0 +1,131 @@
+"""
+域名熔断 - 连续连接失败/超时的域名暂时直接判为失败，冷却后再探测
+
+背景：
+大学网站宕机时，该网站每个项目的每个请求都要等满 DOWNLOAD_TIMEOUT 再重试 RETRY_TIMES 次，
+一个死站点每个项目就要消耗数分钟。
+
+状态机（每个域名）：
+- closed：正常放行；连续 K 次连接失败/超时后转为 open（任何响应，包括 4xx/5xx，都说明主机存活，计数清零）
+- open：所有发往该域名的请求立即以 DomainCircuitOpen 失败（不占用下载槽位，也不会被重试）；
+  冷却时间到后转为 half_open
+- half_open：只放行一个探测请求，其余仍立即失败；探测成功回到 closed，失败则重新 open 且冷却时间加倍
+"""
+
+import time
+
+from scrapy.exceptions import IgnoreRequest
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class DomainCircuitOpen(IgnoreRequest):
+    """域名处于熔断状态，请求未发送"""
+
+
+class DomainCircuit:
+    """单个域名的熔断状态"""
+
+    __slots__ = ('state', 'failures', 'opened_at', 'cooldown', 'probe_in_flight', 'fast_failed')
+
+    def __init__(self, cooldown):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.cooldown = cooldown
+        self.probe_in_flight = False
+        self.fast_failed = 0
+
+
+class CircuitBreaker:
+    """
+    各域名的熔断器（只在 reactor 线程中使用）
+
+    Args:
+        failure_threshold (int): 连续失败多少次后熔断
+        cooldown (float): 首次熔断的冷却时间（秒）
+        max_cooldown (float): 探测失败后冷却时间加倍的上限（秒）
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=120.0, max_cooldown=1800.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.circuits = {}
+
+    def get(self, domain):
+        circuit = self.circuits.get(domain)
+        if circuit is None:
+            circuit = self.circuits[domain] = DomainCircuit(self.cooldown)
+        return circuit
+
+    def allow(self, domain, now=None):
+        """
+        是否放行发往该域名的请求
+
+        Returns:
+            str | None: None 表示拒绝；否则为放行原因 'closed' / 'probe'
+        """
+        circuit = self.circuits.get(domain)
+        if circuit is None or circuit.state == CLOSED:
+            return CLOSED
+
+        now = now if now is not None else time.monotonic()
+        if circuit.state == OPEN and now - circuit.opened_at >= circuit.cooldown:
+            circuit.state = HALF_OPEN
+            circuit.probe_in_flight = False
+
+        if circuit.state == HALF_OPEN and not circuit.probe_in_flight:
+            circuit.probe_in_flight = True
+            return 'probe'
+
+        circuit.fast_failed += 1
+        return None
+
+    def record_success(self, domain):
+        """
+        收到响应：主机存活，清零失败计数
+
+        Returns:
+            bool: True 表示由熔断状态恢复
+        """
+        circuit = self.circuits.get(domain)
+        if circuit is None:
+            return False
+        recovered = circuit.state != CLOSED
+        circuit.state = CLOSED
+        circuit.failures = 0
+        circuit.cooldown = self.cooldown
+        circuit.probe_in_flight = False
+        return recovered
+
+    def record_failure(self, domain, is_probe=False, now=None):
+        """
+        连接失败/超时
+
+        Returns:
+            bool: True 表示本次失败导致熔断（或探测失败后重新熔断）
+        """
+        circuit = self.get(domain)
+        now = now if now is not None else time.monotonic()
+        if is_probe or circuit.state == HALF_OPEN:
+            circuit.state = OPEN
+            circuit.opened_at = now
+            circuit.cooldown = min(self.max_cooldown, circuit.cooldown * 2)
+            circuit.probe_in_flight = False
+            return True
+        if circuit.state == OPEN:
+            # 熔断前已发出的请求陆续超时，不重复计时
+            return False
+
+        circuit.failures += 1
+        if circuit.failures >= self.failure_threshold:
+            circuit.state = OPEN
+            circuit.opened_at = now
+            return True
+        return False
+
+    def open_domains(self):
+        return [domain for domain, circuit in self.circuits.items() if circuit.state != CLOSED]
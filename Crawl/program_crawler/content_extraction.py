@@ -0,0 +1,446 @@
+"""
+结构化内容提取 - 单次遍历提取器
+
+与 ProgramSpider.extract_structured_content_from_soup 输出相同的标签化文本格式：
+    <H1>标题</H1>
+    <table>\n<tr><th>..</th><td>..</td></tr>\n</table>
+    <p>段落</p>
+    <ul>\n<li>..</li>\n</ul>
+
+区别：
+1. 只遍历一次 DOM（旧实现对标题、表格、段落、列表各 find_all 一次，表格再逐行逐格 find_all）
+2. 按文档顺序输出（旧实现按 标题 -> 表格 -> 段落 -> 列表 分组输出）
+3. 去重：已输出元素内部的内容不再单独输出
+   - 嵌套列表只随外层 <li> 的文本输出一次（旧实现外层、内层列表各输出一次）
+   - 表格单元格中的段落/列表/嵌套表格只随单元格文本输出一次
+   - 列表项中的段落只随列表项输出一次
+
+对 BeautifulSoup 与 html_parsing.LexborSoup 均适用（只依赖 children / name /
+get_text / decompose 接口）。
+
+此外本模块提供与 ProgramSpider 相同的标题、旧版结构化内容和锚文本链接提取函数。
+它们均为无状态的模块级函数，既供 Spider 在 reactor 线程中调用，也可在
+PARSE_PROCESS_POOL 模式下由子进程通过 extract_page_from_body 调用。
+"""
+
+import logging
+from urllib.parse import urljoin, urlparse
+
+from w3lib.encoding import html_to_unicode
+
+from .html_parsing import make_soup
+from .url_filter import get_matched_whitelist_keyword
+
+logger = logging.getLogger(__name__)
+
+# 与旧实现一致：提取前移除的元素（同时影响随后基于同一 soup 的链接提取）
+SKIP_TAGS = frozenset(['script', 'style', 'nav', 'header', 'footer', 'aside'])
+HEADING_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+LIST_TAGS = frozenset(['ul', 'ol'])
+CELL_TAGS = frozenset(['td', 'th'])
+
+# 链接提取前删除的导航元素 - 减少误删，只删除明确的导航和页脚（不含 nav，避免误删页面主要内容）
+NAV_SELECTORS = ['footer', '.menu', 'header']
+
+# 可选的结构化内容提取器
+CONTENT_EXTRACTORS = ('single_pass', 'legacy')
+
+# 上下文：位于段落/标题内部，只需继续寻找需要移除的元素
+_LEAF = object()
+
+
+class _TableContext:
+    """位于某个输出表格内部时的遍历状态"""
+
+    __slots__ = ('rows', 'row', 'nested')
+
+    def __init__(self, rows, row=None, nested=False):
+        self.rows = rows      # [(tr, [cell, ...]), ...]
+        self.row = row        # 当前行的单元格列表
+        self.nested = nested  # 位于单元格/嵌套表格内部，内容已包含在单元格文本中
+
+
+class _ListContext:
+    """位于某个输出列表内部时的遍历状态"""
+
+    __slots__ = ('items', 'nested')
+
+    def __init__(self, items, nested=False):
+        self.items = items    # [li, ...]
+        self.nested = nested  # 位于 <li> 内部，嵌套列表已包含在列表项文本中
+
+
+def _child_context(ctx, node, name, records):
+    """根据当前上下文和元素，记录需要输出的元素并返回子节点的上下文"""
+    if ctx is None:
+        if name in HEADING_TAGS:
+            records.append(('heading', node, None))
+            return _LEAF
+        if name == 'table':
+            rows = []
+            records.append(('table', node, rows))
+            return _TableContext(rows)
+        if name == 'p':
+            records.append(('p', node, None))
+            return _LEAF
+        if name in LIST_TAGS:
+            items = []
+            records.append(('list', node, items))
+            return _ListContext(items)
+        return None
+
+    if isinstance(ctx, _TableContext) and not ctx.nested:
+        if name == 'tr':
+            row = []
+            ctx.rows.append((node, row))
+            return _TableContext(ctx.rows, row=row)
+        if name in CELL_TAGS:
+            if ctx.row is not None:
+                ctx.row.append(node)
+            return _TableContext(ctx.rows, nested=True)
+        if name == 'table':
+            return _TableContext(ctx.rows, nested=True)
+        return ctx
+
+    if isinstance(ctx, _ListContext) and not ctx.nested:
+        if name == 'li':
+            ctx.items.append(node)
+            return _ListContext(ctx.items, nested=True)
+        return ctx
+
+    return ctx
+
+
+def _render_table(rows):
+    table_content = ["<table>"]
+    for _tr, cells in rows:
+        row_content = ["<tr>"]
+        for cell in cells:
+            cell_text = cell.get_text().strip()
+            tag_name = cell.name
+            if cell_text:
+                row_content.append(f"<{tag_name}>{cell_text}</{tag_name}>")
+            else:
+                row_content.append(f"<{tag_name}></{tag_name}>")
+
+        if len(row_content) > 1:  # 如果有内容才添加行
+            row_content.append("</tr>")
+            table_content.append("".join(row_content))
+    table_content.append("</table>")
+
+    # 只有表格有实际内容才返回
+    if len(table_content) > 2:
+        return "\n".join(table_content)
+    return ""
+
+
+def _render_list(node, items):
+    list_items = []
+    for li in items:
+        item_text = li.get_text().strip()
+        if item_text:
+            list_items.append(f"<li>{item_text}</li>")
+
+    if not list_items:
+        return ""
+    list_tag = node.name
+    return "\n".join([f"<{list_tag}>"] + list_items + [f"</{list_tag}>"])
+
+
+def extract_structured_content_single_pass(soup):
+    """
+    单次遍历DOM提取结构化内容
+
+    第一阶段按文档顺序遍历一次元素树，记录需要输出的最外层元素（及表格行/单元格、
+    列表项）和需要移除的元素；第二阶段移除 SKIP_TAGS 元素后再取文本，保证文本与
+    旧实现一样不包含脚本/导航等内容。
+
+    Args:
+        soup: BeautifulSoup 或 LexborSoup 文档对象（会被原地修改：移除 SKIP_TAGS）
+
+    Returns:
+        str: 标签化的结构化文本
+    """
+    if soup is None:
+        return ""
+
+    records = []   # (kind, node, extra)，文档顺序
+    pruned = []
+    stack = [(iter(soup.children), None)]
+
+    while stack:
+        children, ctx = stack[-1]
+        node = next(children, None)
+        if node is None:
+            stack.pop()
+            continue
+
+        name = node.name
+        if not name:
+            continue  # 文本、注释、doctype
+        if name in SKIP_TAGS:
+            pruned.append(node)
+            continue
+
+        stack.append((iter(node.children), _child_context(ctx, node, name, records)))
+
+    for node in pruned:
+        node.decompose()
+
+    content_parts = []
+    for kind, node, extra in records:
+        if kind == 'heading':
+            text = node.get_text().strip()
+            if text:
+                tag_name = node.name.upper()
+                content_parts.append(f"<{tag_name}>{text}</{tag_name}>")
+        elif kind == 'p':
+            text = node.get_text().strip()
+            if text and len(text) > 10:
+                content_parts.append(f"<p>{text}</p>")
+        elif kind == 'table':
+            content_parts.append(_render_table(extra))
+        elif kind == 'list':
+            content_parts.append(_render_list(node, extra))
+
+    return '\n'.join(filter(None, content_parts))
+
+
+# =============================================================================
+# 旧版（多次 find_all）结构化内容提取
+# =============================================================================
+
+def extract_structured_headings(soup):
+    """提取保留层级的标题结构"""
+    content_parts = []
+
+    for tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        text = tag.get_text().strip()
+        if text:
+            tag_name = tag.name.upper()
+            content_parts.append(f"<{tag_name}>{text}</{tag_name}>")
+
+    return content_parts
+
+
+def extract_clean_table_html(table):
+    """提取清理后的表格HTML结构"""
+    try:
+        # 创建新的表格结构
+        table_content = ["<table>"]
+
+        for tr in table.find_all('tr'):
+            row_content = ["<tr>"]
+
+            for cell in tr.find_all(['td', 'th']):
+                cell_text = cell.get_text().strip()
+                tag_name = cell.name
+                if cell_text:
+                    row_content.append(f"<{tag_name}>{cell_text}</{tag_name}>")
+                else:
+                    row_content.append(f"<{tag_name}></{tag_name}>")
+
+            if len(row_content) > 1:  # 如果有内容才添加行
+                row_content.append("</tr>")
+                table_content.append("".join(row_content))
+
+        table_content.append("</table>")
+
+        # 只有表格有实际内容才返回
+        if len(table_content) > 2:  # 超过开始和结束标签
+            return "\n".join(table_content)
+
+        return ""
+
+    except Exception as e:
+        logger.error(f"表格HTML提取失败: {e}")
+        return ""
+
+
+def extract_structured_tables(soup):
+    """提取保留结构的表格内容"""
+    content_parts = []
+
+    for table in soup.find_all('table'):
+        table_html = extract_clean_table_html(table)
+        if table_html:
+            content_parts.append(table_html)
+
+    return content_parts
+
+
+def extract_structured_text_elements(soup):
+    """提取其他文本元素，保持基本结构"""
+    content_parts = []
+
+    # 提取段落
+    for tag in soup.find_all('p'):
+        text = tag.get_text().strip()
+        if text and len(text) > 10:
+            content_parts.append(f"<p>{text}</p>")
+
+    # 提取列表，保持结构
+    for tag in soup.find_all(['ul', 'ol']):
+        list_items = []
+        for li in tag.find_all('li'):
+            item_text = li.get_text().strip()
+            if item_text:
+                list_items.append(f"<li>{item_text}</li>")
+
+        if list_items:
+            list_tag = tag.name
+            list_content = [f"<{list_tag}>"] + list_items + [f"</{list_tag}>"]
+            content_parts.append("\n".join(list_content))
+
+    return content_parts
+
+
+def extract_structured_content_legacy(soup):
+    """
+    提取保留HTML结构的内容用于RAG系统（旧版实现）
+    保留标题层级、表格结构等关键信息
+    """
+    if soup is None:
+        return ""
+
+    # 移除不需要的元素但保留主要内容结构
+    for script in soup(list(SKIP_TAGS)):
+        script.decompose()
+
+    content_parts = []
+    content_parts.extend(extract_structured_headings(soup))
+    content_parts.extend(extract_structured_tables(soup))
+    content_parts.extend(extract_structured_text_elements(soup))
+
+    return '\n'.join(filter(None, content_parts))
+
+
+def extract_structured_content(soup, extractor='single_pass'):
+    """按提取器名称提取结构化内容（会移除 soup 中的脚本/导航等元素）"""
+    if extractor == 'legacy':
+        return extract_structured_content_legacy(soup)
+    return extract_structured_content_single_pass(soup)
+
+
+# =============================================================================
+# 标题与链接
+# =============================================================================
+
+def extract_title(soup):
+    """从soup对象提取页面标题"""
+    if soup is None:
+        return ""
+    title_tag = soup.find('title')
+    return title_tag.get_text().strip() if title_tag else ""
+
+
+def is_valid_link(url):
+    """检查链接是否有效（必须为带域名的绝对URL）"""
+    try:
+        return bool(urlparse(url).netloc)
+    except ValueError:
+        return False
+
+
+def extract_anchor_links(soup, page_url):
+    """
+    提取锚文本匹配白名单关键词的链接
+
+    先删除页眉/页脚/菜单中的链接，再把 href 转换为去掉 fragment 的绝对 URL，
+    页面内按 URL 去重。
+
+    Args:
+        soup: 文档对象（会被原地修改：删除 NAV_SELECTORS 元素）
+        page_url (str): 当前页面URL，用于拼接相对链接并跳过自循环链接
+
+    Returns:
+        tuple: (links, stats)
+            links: [{"url", "anchor_text", "matched_keyword"}, ...]
+            stats: 各阶段链接数统计，供调用方记录日志
+    """
+    stats = {'total': 0, 'removed_nav': 0, 'remaining': 0, 'valid': 0, 'matched': 0}
+    if soup is None:
+        return [], stats
+
+    stats['total'] = len(soup.find_all('a', href=True))
+
+    for selector in NAV_SELECTORS:
+        for nav_elem in soup.select(selector):
+            nav_elem.decompose()
+            stats['removed_nav'] += len(nav_elem.find_all('a', href=True))
+
+    remaining_links = soup.find_all('a', href=True)
+    stats['remaining'] = len(remaining_links)
+
+    links = []
+    returned_urls = set()  # 页面内URL去重
+
+    for a_tag in remaining_links:
+        href = a_tag['href']
+        anchor_text = a_tag.get_text().strip()
+
+        # 转换为绝对URL
+        if not href.startswith(('http://', 'https://')):
+            href = urljoin(page_url, href)
+
+        # 移除fragment
+        href = href.split('#')[0]
+
+        # 跳过指向当前页面的链接（避免自循环）
+        if href == page_url or not is_valid_link(href):
+            continue
+
+        stats['valid'] += 1
+        matched_keyword = get_matched_whitelist_keyword(anchor_text)  # 仅匹配锚文本
+        if not matched_keyword:
+            continue
+
+        stats['matched'] += 1
+        if href in returned_urls:
+            continue  # 跳过重复 URL
+        returned_urls.add(href)
+
+        links.append({
+            "url": href,                        # 链接地址
+            "anchor_text": anchor_text,         # 锚文本（链接显示的文字）
+            "matched_keyword": matched_keyword  # 匹配的白名单关键词
+        })
+
+    return links, stats
+
+
+# =============================================================================
+# 整页提取
+# =============================================================================
+
+def extract_page(soup, page_url, extractor='single_pass', with_links=True):
+    """
+    与 ProgramSpider.parse_page 相同的提取顺序：标题 -> 结构化内容 -> 链接
+
+    顺序不可调换：内容提取会移除 nav/aside 等元素，这些元素中的链接也就不会被提取。
+
+    Returns:
+        dict: {'title', 'content', 'links', 'link_stats'}；with_links=False 时 links 为 None
+    """
+    result = {
+        'title': extract_title(soup),
+        'content': extract_structured_content(soup, extractor),
+        'links': None,
+        'link_stats': None,
+    }
+    if with_links:
+        result['links'], result['link_stats'] = extract_anchor_links(soup, page_url)
+    return result
+
+
+def extract_page_from_body(body, content_type, page_url, backend='html.parser',
+                           extractor='single_pass', with_links=True):
+    """
+    从原始响应字节提取页面（进程池工作函数，参数与返回值均可 pickle）
+
+    编码识别与 Scrapy TextResponse 相同（Content-Type -> BOM -> meta 声明 -> 自动探测），
+    因此解码也在子进程中完成。
+    """
+    _encoding, text = html_to_unicode(content_type, body)
+    soup = make_soup(text, backend)
+    return extract_page(soup, page_url, extractor, with_links)
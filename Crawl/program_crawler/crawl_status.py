@@ -0,0 +1,125 @@
+"""
+爬取状态聚合器 - 内存计数 + 定期原子写盘
+
+功能：
+1. 在内存中按来源文件（学科）累计完成/失败项目数，不再每个项目读写一次状态文件
+2. 每次运行只写一个状态文件 status_log/crawl_status_{运行开始时间YYMMDDHHMM}.json
+3. 满足以下任一条件时写盘：累计 flush_every 个新记录、距上次写盘超过 flush_interval 秒
+   （由 JsonWriterPipeline 的定时器触发）、爬虫关闭
+4. 写盘先写临时文件再 os.replace，读取方不会看到写了一半的文件
+5. 计数同步到 Scrapy stats（crawl_status/{来源文件}/completed 等），snapshot() 返回实时状态
+"""
+
+import json
+import os
+from datetime import datetime
+
+
+class CrawlStatusAggregator:
+    """
+    爬取状态聚合器
+
+    Args:
+        status_file (str): 状态文件路径
+        flush_every (int): 累计多少条新记录后写盘（0 表示不按数量写盘）
+        stats: Scrapy StatsCollector，可选；用于实时进度查询
+    """
+
+    def __init__(self, status_file, flush_every=50, stats=None):
+        self.status_file = status_file
+        self.flush_every = flush_every
+        self.stats = stats
+        self.crawl_status = {
+            "subjects": {},
+            "failed_projects": [],
+            "completed_subjects": [],
+            "start_time": datetime.now().isoformat(),
+            "last_update": None
+        }
+        self.pending = 0  # 上次写盘后新增的记录数
+
+    @staticmethod
+    def subject_key(source_file):
+        """与输出目录一致的来源文件键：移除 .json 扩展名"""
+        return (source_file or 'unknown.json').replace('.json', '')
+
+    def get_subject(self, source_file):
+        subjects = self.crawl_status['subjects']
+        key = self.subject_key(source_file)
+        if key not in subjects:
+            subjects[key] = {
+                'status': 'running',
+                'total': 0,
+                'completed': 0,
+                'unchanged': 0,
+                'partial': 0,
+                'failed': 0
+            }
+        return key, subjects[key]
+
+    def set_totals(self, projects):
+        """根据待爬取项目列表设置各来源文件的项目总数"""
+        for project in projects:
+            _key, subject = self.get_subject(project.get('source_file'))
+            subject['total'] += 1
+
+    def record(self, item, status, error_msg=None):
+        """
+        记录一个项目的输出结果
+
+        Args:
+            item: 项目 Item
+            status (str): 'success'、'unchanged'（增量模式下没有变化）、'partial'（超出项目预算）或 'failed'
+            error_msg (str): 失败原因
+        """
+        key, subject = self.get_subject(item.get('source_file'))
+
+        if status == 'success':
+            subject['completed'] += 1
+        elif status == 'unchanged':
+            subject['unchanged'] += 1
+        elif status == 'partial':
+            subject['partial'] += 1
+        elif status == 'failed':
+            subject['failed'] += 1
+
+            # 记录失败项目详情
+            self.crawl_status['failed_projects'].append({
+                'project_id': item.get('project_id'),
+                'program_name': item.get('program_name'),
+                'source_file': key,
+                'error': error_msg,
+                'timestamp': datetime.now().isoformat()
+            })
+
+        if subject['total'] and subject['completed'] + subject['unchanged'] + subject['partial'] + subject['failed'] >= subject['total']:
+            subject['status'] = 'completed'
+            if key not in self.crawl_status['completed_subjects']:
+                self.crawl_status['completed_subjects'].append(key)
+
+        if self.stats is not None:
+            counter = {'success': 'completed', 'unchanged': 'unchanged', 'partial': 'partial'}.get(status, 'failed')
+            self.stats.inc_value(f'crawl_status/{key}/{counter}')
+
+        self.crawl_status['last_update'] = datetime.now().isoformat()
+        self.pending += 1
+        if self.flush_every and self.pending >= self.flush_every:
+            self.flush()
+
+    def snapshot(self):
+        """返回当前状态的副本（用于实时进度查询）"""
+        return json.loads(json.dumps(self.crawl_status))
+
+    def flush(self, force=False):
+        """原子写入状态文件；没有新记录且未强制时跳过"""
+        if not self.pending and not force:
+            return False
+
+        os.makedirs(os.path.dirname(self.status_file), exist_ok=True)
+        tmp_file = self.status_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.crawl_status, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.status_file)
+
+        self.pending = 0
+        return True
@@ -0,0 +1,209 @@
+"""
+失败URL日志 - 追加式 JSONL 日志 + 内存去重索引
+
+功能：
+1. 每个来源文件对应一个追加式日志：log/{学科}/failed_urls_{来源文件}.jsonl
+2. 首次使用某个来源文件时一次性加载已有记录（包括旧版 failed_urls_{来源文件}.json），
+   之后只在内存中按 URL 去重，每次失败只追加一行，不再读取/重写整个文件
+3. 压缩(compact)：合并旧版 JSON 与 JSONL 日志，按 URL 去重后导出为
+   failed_urls_{来源文件}.json（与旧版格式相同的 JSON 列表），供下游工具使用
+
+命令行：
+    python -m program_crawler.failure_journal compact log/            # 压缩 log/ 下所有日志
+    python -m program_crawler.failure_journal compact log/计算机/failed_urls_计算机_1.jsonl
+    python -m program_crawler.failure_journal export log/计算机/failed_urls_计算机_1.jsonl \
+        --program-urls urls_subject/计算机/计算机_1.csv --output failed_urls.csv
+"""
+
+import json
+import os
+
+
+def split_source_file(source_file_raw):
+    """
+    统一处理 source_file
+
+    Returns:
+        tuple: (来源文件名(无扩展名), 学科名称)，如 "计算机_1.csv" -> ("计算机_1", "计算机")
+    """
+    # 统一处理source_file，移除所有可能的扩展名
+    source_file = (source_file_raw or 'unknown.csv').replace('.csv', '').replace('.json', '')
+    # 提取学科名称（去掉可能的数字后缀，如"计算机_1" -> "计算机"）
+    subject_name = source_file.split('_')[0] if '_' in source_file else source_file
+    return source_file, subject_name
+
+
+def read_records(path):
+    """读取 JSONL 日志或旧版 JSON 列表，文件不存在时返回空列表；跳过损坏的行（如中断时写了一半）"""
+    if not os.path.exists(path):
+        return []
+
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def merge_records(*record_lists):
+    """按 URL 去重合并多份记录，保留每个 URL 的第一条记录"""
+    merged = []
+    seen_urls = set()
+    for records in record_lists:
+        for record in records:
+            url = record.get('url')
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+            merged.append(record)
+    return merged
+
+
+class FailureJournal:
+    """
+    追加式失败URL日志
+
+    Args:
+        log_root (str): 日志根目录（crawl/log），各学科日志位于其子目录中
+    """
+
+    def __init__(self, log_root):
+        self.log_root = log_root
+        self.seen_urls = {}  # 来源文件 -> 已记录的URL集合
+        self.files = {}      # 来源文件 -> 以追加模式打开的 JSONL 文件
+
+    def get_paths(self, source_file_raw):
+        """
+        Returns:
+            tuple: (JSONL 日志路径, 旧版/压缩后 JSON 路径)
+        """
+        source_file, subject_name = split_source_file(source_file_raw)
+        log_dir = os.path.join(self.log_root, subject_name)
+        base = os.path.join(log_dir, f'failed_urls_{source_file}')
+        return base + '.jsonl', base + '.json'
+
+    def load(self, source_file_raw):
+        """一次性加载某个来源文件已有的失败URL到内存索引（已加载则直接返回）"""
+        source_file, _ = split_source_file(source_file_raw)
+        if source_file in self.seen_urls:
+            return self.seen_urls[source_file]
+
+        journal_path, json_path = self.get_paths(source_file_raw)
+        urls = {record.get('url') for record in read_records(json_path)}
+        urls.update(record.get('url') for record in read_records(journal_path))
+        self.seen_urls[source_file] = urls
+        return urls
+
+    def record(self, source_file_raw, failed_record):
+        """
+        追加一条失败记录（同一URL只记录一次）
+
+        Returns:
+            bool: True 表示新增记录，False 表示URL已存在
+        """
+        seen_urls = self.load(source_file_raw)
+        url = failed_record['url']
+        if url in seen_urls:
+            return False
+        seen_urls.add(url)
+
+        source_file, _ = split_source_file(source_file_raw)
+        journal_file = self.files.get(source_file)
+        if journal_file is None:
+            journal_path, _ = self.get_paths(source_file_raw)
+            os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+            # 行缓冲：每条记录写完即落盘，爬虫中断也不会丢失已记录的失败
+            journal_file = open(journal_path, 'a', encoding='utf-8', buffering=1)
+            self.files[source_file] = journal_file
+
+        journal_file.write(json.dumps(failed_record, ensure_ascii=False) + '\n')
+        return True
+
+    def close(self):
+        for journal_file in self.files.values():
+            journal_file.close()
+        self.files.clear()
+
+
+def compact(journal_path, output_path=None):
+    """
+    把 JSONL 日志（及同名旧版 JSON）合并导出为 JSON 列表
+
+    Args:
+        journal_path (str): failed_urls_{来源文件}.jsonl
+        output_path (str | None): 输出路径，默认与日志同名的 .json
+
+    Returns:
+        int: 导出的记录数
+    """
+    json_path = journal_path[:-len('.jsonl')] + '.json'
+    output_path = output_path or json_path
+    records = merge_records(read_records(json_path), read_records(journal_path))
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
+    return len(records)
+
+
+def to_failed_projects(records):
+    """
+    转换为 log_utils.export_failed_urls_to_csv 使用的 [(项目名称, URL), ...]
+
+    export_failed_urls_to_csv 只按根URL匹配 program_url，因此子页面的失败记录不会被导出
+    """
+    return [(record.get('program_name'), record.get('url')) for record in records]
+
+
+def _find_journals(path):
+    if os.path.isfile(path):
+        return [path]
+    journals = []
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            if filename.startswith('failed_urls_') and filename.endswith('.jsonl'):
+                journals.append(os.path.join(dirpath, filename))
+    return sorted(journals)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='失败URL日志压缩与导出')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compact_parser = subparsers.add_parser('compact', help='把 JSONL 日志压缩为 JSON 列表')
+    compact_parser.add_argument('path', help='JSONL 日志文件，或包含日志的目录（递归查找）')
+
+    export_parser = subparsers.add_parser('export', help='导出失败项目的CSV行（export_failed_urls_to_csv）')
+    export_parser.add_argument('journal', help='failed_urls_{来源文件}.jsonl')
+    export_parser.add_argument('--program-urls', required=True, help='项目URL CSV')
+    export_parser.add_argument('--output', default=None, help='输出CSV路径')
+
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        for journal_path in _find_journals(args.path):
+            count = compact(journal_path)
+            print(f"{journal_path} -> {count} 条记录")
+    else:
+        from .utils.log_utils import export_failed_urls_to_csv
+
+        json_path = args.journal[:-len('.jsonl')] + '.json'
+        records = merge_records(read_records(json_path), read_records(args.journal))
+        export_failed_urls_to_csv(to_failed_projects(records), args.program_urls, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+HTML解析后端 - 可插拔的解析器选择
+
+支持的后端（通过 settings.HTML_PARSER_BACKEND 选择）：
+1. html.parser  BeautifulSoup 内置纯 Python 解析器（最慢，零依赖）
+2. lxml         BeautifulSoup + lxml（C 实现，Scrapy 依赖中已包含 lxml）
+3. selectolax   selectolax 的 lexbor 引擎（最快，需额外安装 selectolax）
+
+所有后端返回的对象都提供 ProgramSpider.extract_* 方法用到的 BeautifulSoup
+接口子集（find / find_all / select / get_text / decompose / name ...），
+因此切换后端不需要改动任何提取逻辑，输出的标题/表格/段落/列表格式保持一致。
+"""
+
+from bs4 import BeautifulSoup
+
+# 可选后端名称
+PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax')
+
+
+def check_parser_backend(backend):
+    """
+    校验解析后端是否可用
+
+    Args:
+        backend (str): 后端名称
+
+    Raises:
+        ValueError: 未知的后端名称
+        ImportError: 后端依赖未安装
+    """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"未知的HTML解析后端: {backend}，可选: {', '.join(PARSER_BACKENDS)}")
+
+    if backend == 'lxml':
+        try:
+            import lxml  # noqa: F401
+        except ImportError as e:
+            raise ImportError("HTML_PARSER_BACKEND='lxml' 需要安装 lxml: pip install lxml") from e
+    elif backend == 'selectolax':
+        try:
+            from selectolax.lexbor import LexborHTMLParser  # noqa: F401
+        except ImportError as e:
+            raise ImportError("HTML_PARSER_BACKEND='selectolax' 需要安装 selectolax: pip install selectolax") from e
+
+
+def make_soup(markup, backend='html.parser'):
+    """
+    使用指定后端解析HTML
+
+    Args:
+        markup (str): HTML文本
+        backend (str): 解析后端名称，见 PARSER_BACKENDS
+
+    Returns:
+        BeautifulSoup 或 LexborSoup: 提供相同查询接口的文档对象
+    """
+    if backend in ('html.parser', 'lxml'):
+        return BeautifulSoup(markup, backend)
+    if backend == 'selectolax':
+        return LexborSoup(markup)
+    raise ValueError(f"未知的HTML解析后端: {backend}，可选: {', '.join(PARSER_BACKENDS)}")
+
+
+# =============================================================================
+# selectolax / lexbor 适配层
+# =============================================================================
+
+def _build_selector(name=None, attrs=None):
+    """把 find_all 风格的 (name, attrs) 转换为 CSS 选择器"""
+    if name is None:
+        names = ['*']
+    elif isinstance(name, str):
+        names = [name]
+    else:
+        names = list(name)
+
+    attr_selector = ''
+    for attr, value in (attrs or {}).items():
+        if value is True:
+            attr_selector += f'[{attr}]'
+        else:
+            attr_selector += f'[{attr}="{value}"]'
+
+    return ', '.join(f'{n}{attr_selector}' for n in names)
+
+
+class LexborTag:
+    """
+    lexbor 节点的 BeautifulSoup 风格包装
+
+    lexbor 的 decompose 会直接释放节点内存，因此同一次查询返回的节点共享一个
+    batch：某个节点被移除时，同批次中位于其子树内的节点会被标记为已移除，
+    之后对它们的操作都是空操作（与 BeautifulSoup 中 decompose 后子树被清空的
+    行为一致），避免访问已释放的内存。
+    """
+
+    __slots__ = ('_node', '_batch', '_removed')
+
+    def __init__(self, node, batch=None):
+        self._node = node
+        self._batch = batch
+        self._removed = False
+
+    @property
+    def name(self):
+        return self._node.tag
+
+    @property
+    def children(self):
+        """直接子元素（不含文本节点）"""
+        if self._removed:
+            return
+        for child in self._node.iter(include_text=False):
+            yield LexborTag(child)
+
+    def get_text(self):
+        if self._removed:
+            return ''
+        return self._node.text(deep=True) or ''
+
+    def get(self, attr, default=None):
+        if self._removed:
+            return default
+        value = self._node.attributes.get(attr)
+        return default if value is None else value
+
+    def __getitem__(self, attr):
+        value = self._node.attributes[attr]
+        return '' if value is None else value
+
+    def _wrap_batch(self, nodes):
+        batch = []
+        batch.extend(LexborTag(node, batch) for node in nodes)
+        return batch
+
+    def find(self, name=None, **attrs):
+        if self._removed:
+            return None
+        node = self._node.css_first(_build_selector(name, attrs))
+        return LexborTag(node) if node is not None else None
+
+    def find_all(self, name=None, **attrs):
+        if self._removed:
+            return []
+        return self._wrap_batch(self._node.css(_build_selector(name, attrs)))
+
+    __call__ = find_all
+
+    def select(self, selector):
+        if self._removed:
+            return []
+        return self._wrap_batch(self._node.css(selector))
+
+    def _contains(self, other):
+        """判断 other 是否位于当前节点的子树中（调用时两者都必须尚未释放）"""
+        target = self._node.mem_id
+        parent = other._node.parent
+        while parent is not None:
+            if parent.mem_id == target:
+                return True
+            parent = parent.parent
+        return False
+
+    def decompose(self):
+        if self._removed:
+            return
+        if self._batch:
+            for other in self._batch:
+                if other is not self and not other._removed and self._contains(other):
+                    other._removed = True
+        self._removed = True
+        self._node.decompose()
+
+
+class LexborSoup(LexborTag):
+    """selectolax/lexbor 文档对象，对外表现为 BeautifulSoup"""
+
+    __slots__ = ('_parser',)
+
+    def __init__(self, markup):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser = LexborHTMLParser(markup)
+        super().__init__(self._parser.root)
+
+    @property
+    def name(self):
+        return '[document]'
+
+    @property
+    def children(self):
+        if self._node is not None:
+            yield LexborTag(self._node)
+
+    def get_text(self):
+        if self._node is None:
+            return ''
+        return self._node.text(deep=True) or ''
+
+    def find(self, name=None, **attrs):
+        node = self._parser.css_first(_build_selector(name, attrs))
+        return LexborTag(node) if node is not None else None
+
+    def find_all(self, name=None, **attrs):
+        return self._wrap_batch(self._parser.css(_build_selector(name, attrs)))
+
+    __call__ = find_all
+
+    def select(self, selector):
+        return self._wrap_batch(self._parser.css(selector))
+
+    def decompose(self):
+        raise TypeError("不能移除整个文档")
@@ -0,0 +1,73 @@
+"""
+条件请求缓存 - 持久化每个URL的 ETag / Last-Modified 与提取结果
+
+功能：
+1. 页面解析完成后，保存响应的 ETag、Last-Modified 以及提取结果（标题/内容/链接）
+2. 重新爬取时由 ConditionalRequestMiddleware 发送 If-None-Match / If-Modified-Since
+3. 服务器返回 304 时直接复用保存的提取结果，不再下载正文、不再解析
+
+存储：SQLite 单文件（settings.HTTP_CONDITIONAL_CACHE_DB），只在 reactor 线程中读写，
+每 commit_every 次写入提交一次事务，爬虫关闭时提交剩余写入。
+
+与 Scrapy 自带 HttpCacheMiddleware（RFC2616Policy）的区别：后者保存完整响应正文，
+304 后仍把正文交给回调重新解析；这里只保存提取结果，正文不落盘。
+"""
+
+import json
+from datetime import datetime
+
+from .sqlite_store import SQLiteStore
+
+
+class ConditionalCacheStore(SQLiteStore):
+    """
+    条件请求缓存存储
+
+    Args:
+        db_path (str): SQLite 文件路径
+        commit_every (int): 每多少次写入提交一次
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            result TEXT NOT NULL,
+            has_links INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+    """
+
+    def get(self, url):
+        """
+        Returns:
+            dict | None: {'etag', 'last_modified', 'result'}，未缓存返回 None
+        """
+        row = self.conn.execute(
+            'SELECT etag, last_modified, result FROM pages WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'result': json.loads(row[2])}
+
+    def get_validators(self, url):
+        """
+        只读取校验字段（发送条件请求时不需要反序列化提取结果）
+
+        Returns:
+            tuple | None: (etag, last_modified, 是否保存了链接)
+        """
+        row = self.conn.execute(
+            'SELECT etag, last_modified, has_links FROM pages WHERE url = ?', (url,)
+        ).fetchone()
+        return None if row is None else (row[0], row[1], bool(row[2]))
+
+    def put(self, url, etag, last_modified, result):
+        """保存校验字段与提取结果 {'title', 'content', 'links', 'body_bytes'}（body_bytes 为原始响应体字节数）"""
+        self._write(
+            'INSERT OR REPLACE INTO pages (url, etag, last_modified, result, has_links, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (url, etag, last_modified, json.dumps(result, ensure_ascii=False),
+             int(result.get('links') is not None), datetime.now().isoformat()),
+        )
@@ -0,0 +1,131 @@
+"""
+增量爬取 - 基于内容哈希的变更检测（settings.INCREMENTAL_MODE）
+
+很多大学服务器不支持条件请求，每次都返回 200 和相同的正文。增量模式下：
+1. 每个页面保存“规范化正文哈希”与提取结果；再次爬取时哈希相同则直接复用提取结果，跳过解析
+2. 每个项目保存“项目指纹”（全部页面 URL + 标题/内容摘要）；指纹不变的项目标记为 unchanged，
+   JsonWriterPipeline 不再重写其输出，只把有变化的项目写入增量清单，供下游只处理变化部分
+
+规范化：去掉 <script>/<style>/注释、nonce/csrf 等每次请求都会变化的属性，并合并空白，
+避免这些噪声导致内容未变的页面被判定为已变化。
+"""
+
+import hashlib
+import json
+import re
+from datetime import datetime
+
+from .sqlite_store import SQLiteStore
+
+# 每次请求都可能变化、但不影响提取结果的片段
+_NOISE_PATTERNS = [
+    re.compile(rb'<script\b.*?</script\s*>', re.I | re.S),
+    re.compile(rb'<style\b.*?</style\s*>', re.I | re.S),
+    re.compile(rb'<!--.*?-->', re.S),
+    re.compile(rb'\s(?:nonce|integrity|data-csrf|csrf[-_]?token|data-timestamp)\s*=\s*("[^"]*"|\'[^\']*\')', re.I),
+    re.compile(rb'<input\b[^>]*name\s*=\s*["\']?(?:csrf|_token|__requestverificationtoken)[^>]*>', re.I),
+]
+_WHITESPACE = re.compile(rb'\s+')
+
+
+def normalized_content_hash(body):
+    """
+    规范化正文哈希
+
+    Args:
+        body (bytes): 原始响应体
+
+    Returns:
+        str: sha1 十六进制摘要
+    """
+    for pattern in _NOISE_PATTERNS:
+        body = pattern.sub(b'', body)
+    body = _WHITESPACE.sub(b' ', body).strip()
+    return hashlib.sha1(body).hexdigest()
+
+
+def page_digest(page_data):
+    """页面记录（标题/内容/状态）的摘要，用于计算项目指纹"""
+    digest = hashlib.sha1()
+    for field in ('title', 'content', 'crawl_status'):
+        digest.update(str(page_data.get(field, '')).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def project_fingerprint(page_digests):
+    """
+    项目指纹：与页面顺序无关；页面增减或任一页面内容变化都会改变指纹
+
+    Args:
+        page_digests (list): [(页面URL, page_digest), ...]
+    """
+    digest = hashlib.sha1()
+    for url, page_hash in sorted(page_digests):
+        digest.update(f'{url}\0{page_hash}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class IncrementalStateStore(SQLiteStore):
+    """
+    增量状态存储（SQLite，只在 reactor 线程中读写）
+
+    Args:
+        db_path (str): SQLite 文件路径
+        commit_every (int): 每多少次写入提交一次
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            result TEXT NOT NULL,
+            has_links INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS projects (
+            project_id TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+    """
+
+    def get_unchanged_result(self, url, content_hash, needs_links):
+        """
+        正文哈希未变化时返回保存的提取结果，否则返回 None
+
+        Args:
+            needs_links (bool): 当前页面需要提取链接；保存的结果没有链接时视为需要重新解析
+        """
+        row = self.conn.execute(
+            'SELECT content_hash, result, has_links FROM pages WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None or row[0] != content_hash or (needs_links and not row[2]):
+            return None
+        return json.loads(row[1])
+
+    def put_page(self, url, content_hash, result):
+        """保存页面正文哈希与提取结果 {'title', 'content', 'links'}"""
+        self._write(
+            'INSERT OR REPLACE INTO pages (url, content_hash, result, has_links, updated_at) VALUES (?, ?, ?, ?, ?)',
+            (url, content_hash, json.dumps(result, ensure_ascii=False),
+             int(result.get('links') is not None), datetime.now().isoformat()),
+        )
+
+    def update_project(self, project_id, fingerprint):
+        """
+        比较并更新项目指纹
+
+        Returns:
+            bool: True 表示与上次爬取相比没有变化
+        """
+        row = self.conn.execute(
+            'SELECT fingerprint FROM projects WHERE project_id = ?', (project_id,)
+        ).fetchone()
+        if row is not None and row[0] == fingerprint:
+            return True
+        self._write(
+            'INSERT OR REPLACE INTO projects (project_id, fingerprint, updated_at) VALUES (?, ?, ?)',
+            (project_id, fingerprint, datetime.now().isoformat()),
+        )
+        return False
@@ -20,4 +20,18 @@ class ProgramPageItem(scrapy.Item):
     total_pages = scrapy.Field()     # 页面总数
     
     # 状态信息
-    status = scrapy.Field()          # 爬取状态
\ No newline at end of file
+    status = scrapy.Field()          # 爬取状态
+    partial_reason = scrapy.Field()  # status 为 partial 时超出的预算：'time' / 'pages'
+
+
+class ProgramPageRecordItem(scrapy.Item):
+    """
+    单个页面的数据记录（OUTPUT_MODE = 'stream' 时使用）
+    
+    每解析完一个页面立即输出，由管道追加到项目的 JSONL 文件中；
+    项目完成时再输出一个不含 pages 的 ProgramPageItem 作为摘要
+    """
+    project_id = scrapy.Field()      # 项目唯一标识符
+    program_name = scrapy.Field()    # 项目名称（中文）
+    source_file = scrapy.Field()     # 来源文件名
+    page = scrapy.Field()            # 页面数据（url/depth/title/content/links/crawl_status）
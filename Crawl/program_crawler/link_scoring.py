@@ -0,0 +1,126 @@
+"""
+子链接打分与覆盖度停止规则（settings.LINK_SCORING_ENABLED / LINK_COVERAGE_TOPICS）
+
+原来只要锚文本匹配任一白名单关键词，子链接就以相同优先级调度：'apply'、'tuition'、'curriculum'
+与 'project'、'track' 等弱相关链接平等竞争下载槽位，每个项目都会把所有匹配链接爬完。
+
+打分：
+1. 锚文本关键词权重：锚文本中出现的白名单关键词取最高权重（申请/截止日期/学费/课程设置最高）
+2. URL 路径与根URL的相似度：同一主机下与根URL共享的路径段比例（0~1），其他主机为 0
+3. score = 关键词权重 * 10 + 相似度 * PATH_WEIGHT，取整后作为 Scrapy 请求优先级（越大越先下载）
+
+覆盖度：
+根据已成功爬取的子页面的 URL、标题以及指向它的锚文本判断页面覆盖了哪些主题
+（admissions / deadline / tuition / curriculum）；项目已覆盖 LINK_COVERAGE_TOPICS 中的全部主题后，
+还在调度器中排队的子页面请求由 CoverageStopMiddleware 丢弃（CoverageReached），下载中的请求照常完成，
+项目状态仍为 completed。高分的主题链接优先级更高，通常先于其他链接下载。
+主题关键词按整词匹配（'fee' 不匹配 "feedback"，'course' 不匹配 "/courses/" 目录），
+根页面本身不计入覆盖度：项目根URL与标题几乎总含有 course/programme 等词。
+"""
+
+import re
+from urllib.parse import urlsplit
+
+from scrapy.exceptions import IgnoreRequest
+
+# 白名单关键词权重（未列出的关键词权重为 DEFAULT_KEYWORD_WEIGHT）
+KEYWORD_WEIGHTS = {
+    'admission': 3, 'apply': 3, 'application': 3, 'requirement': 3, 'requirements': 3,
+    'entry': 3, 'deadline': 3, 'tuition': 3, 'curriculum': 3, 'course': 3, 'module': 3,
+    'program': 2, 'financial': 2, 'concentration': 2, 'specialization': 2, 'capstone': 2, 'thesis': 2,
+    'frequently asked questions': 2, 'faqs': 2, 'faq': 2, 'frequently': 2,
+    'track': 1, 'project': 1, 'career': 1, 'certificates': 1, 'internship': 1,
+    'funding': 1, 'scholarship': 1,
+}
+DEFAULT_KEYWORD_WEIGHT = 1
+
+# 路径相似度在分数中的最大贡献
+PATH_WEIGHT = 5
+
+# 覆盖度主题及其判定关键词（整词匹配页面 URL、标题与锚文本，小写；复数形式需单独列出）
+TOPIC_KEYWORDS = {
+    'admissions': ('admission', 'admissions', 'apply', 'application', 'applications',
+                   'entry requirement', 'entry requirements', 'requirements'),
+    'deadline': ('deadline', 'deadlines', 'key dates', 'important dates'),
+    'tuition': ('tuition', 'fees', 'fee', 'cost', 'costs'),
+    'curriculum': ('curriculum', 'course structure', 'course content', 'module', 'modules',
+                   'program structure', 'programme structure', 'study plan'),
+}
+
+# 每个主题一个预编译的整词正则：\b(?:kw1|kw2|...)\b
+TOPIC_PATTERNS = {
+    topic: re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + r')\b')
+    for topic, keywords in TOPIC_KEYWORDS.items()
+}
+
+
+class CoverageReached(IgnoreRequest):
+    """项目已覆盖全部主题，排队中的子页面请求不再下载"""
+
+
+def _path_segments(path):
+    return [segment for segment in path.lower().split('/') if segment]
+
+
+def path_similarity(link_url, root_url):
+    """
+    子链接与根URL的路径相似度
+
+    Returns:
+        float: 同一主机下共享的路径段前缀长度 / 根URL路径段数（根为站点首页时为 1），其他主机为 0
+    """
+    link = urlsplit(link_url)
+    root = urlsplit(root_url)
+    if link.netloc.lower() != root.netloc.lower():
+        return 0.0
+    root_segments = _path_segments(root.path)
+    if not root_segments:
+        return 1.0
+    shared = 0
+    for link_segment, root_segment in zip(_path_segments(link.path), root_segments):
+        if link_segment != root_segment:
+            break
+        shared += 1
+    return shared / len(root_segments)
+
+
+def keyword_weight(anchor_text):
+    """锚文本中出现的白名单关键词的最高权重"""
+    text = (anchor_text or '').lower()
+    weights = [weight for keyword, weight in KEYWORD_WEIGHTS.items() if keyword in text]
+    return max(weights) if weights else DEFAULT_KEYWORD_WEIGHT
+
+
+def score_link(link_info, root_url):
+    """
+    子链接分数（即请求优先级）
+
+    Args:
+        link_info (dict): extract_anchor_links 返回的链接 {"url", "anchor_text", "matched_keyword"}
+        root_url (str): 项目根URL
+
+    Returns:
+        int: 分数，越大越先下载
+    """
+    return int(keyword_weight(link_info.get('anchor_text')) * 10
+               + path_similarity(link_info['url'], root_url) * PATH_WEIGHT)
+
+
+def match_topics(*texts):
+    """返回文本中涉及的覆盖度主题集合（关键词按整词匹配）"""
+    text = ' '.join(t for t in texts if t).lower()
+    if not text:
+        return set()
+    return {topic for topic, pattern in TOPIC_PATTERNS.items() if pattern.search(text)}
+
+
+def page_topics(page_data, anchor_text=None):
+    """
+    页面覆盖的主题：URL 路径、标题与指向该页面的锚文本
+
+    Args:
+        page_data (dict): 页面记录（url/title/...）
+        anchor_text (str): 指向该页面的锚文本（根页面与共享页面为 None）
+    """
+    path = urlsplit(page_data.get('url', '')).path.replace('-', ' ').replace('_', ' ')
+    return match_topics(path, page_data.get('title'), anchor_text)
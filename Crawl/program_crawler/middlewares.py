@@ -4,8 +4,28 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
 from scrapy.http import HtmlResponse
+from scrapy.utils.httpobj import urlparse_cached
 import random
+import time
+
+from twisted.internet import error as twisted_errors
+from twisted.web._newclient import ResponseNeverReceived
+
+from .circuit_breaker import CircuitBreaker, DomainCircuitOpen
+from .link_scoring import CoverageReached
+from .rate_control import THROTTLE_STATUS_CODES, DomainRateController, parse_retry_after
+
+# 说明主机不可达的异常（计入域名熔断）；HTTP 错误状态码说明主机存活，不计入
+CONNECTION_FAILURES = (
+    twisted_errors.TimeoutError,
+    twisted_errors.DNSLookupError,
+    twisted_errors.ConnectionRefusedError,
+    twisted_errors.ConnectError,
+    twisted_errors.TCPTimedOutError,
+    ResponseNeverReceived,
+)
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -238,4 +258,311 @@ class BrowserHeadersMiddleware:
         for key, value in headers.items():
             request.headers[key] = value
             
-        return None 
\ No newline at end of file
+        return None 
+
+class ConditionalRequestMiddleware:
+    """
+    条件请求下载器中间件（需开启 HTTP_CONDITIONAL_CACHE_ENABLED）
+    
+    1. 请求已缓存的URL时附加 If-None-Match / If-Modified-Since
+    2. 收到 304 时把保存的提取结果放入 meta['conditional_cache_result']，并把响应改写为
+       200，回调据此直接复用结果，不再解析（HttpErrorMiddleware 也不会丢弃该响应）
+    
+    缓存存储由 ProgramSpider 创建（spider.http_cache），页面解析完成后由 spider 写入。
+    """
+    
+    def __init__(self, stats):
+        self.stats = stats
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+    
+    def process_request(self, request, spider):
+        http_cache = getattr(spider, 'http_cache', None)
+        if http_cache is None or request.method != 'GET':
+            return None
+        
+        validators = http_cache.get_validators(request.url)
+        if validators is None:
+            return None
+        
+        etag, last_modified, has_links = validators
+        # 需要提取链接的页面（根页面）而缓存中没有链接时，不能用 304 复用结果
+        needs_links = request.meta.get('is_root') or request.meta.get('depth', 0) < 1
+        if needs_links and not has_links:
+            return None
+        
+        if etag:
+            request.headers['If-None-Match'] = etag
+        if last_modified:
+            request.headers['If-Modified-Since'] = last_modified
+        if etag or last_modified:
+            request.meta['conditional_request'] = True
+            self.stats.inc_value('conditional_cache/requests')
+        return None
+    
+    def process_response(self, request, response, spider):
+        if response.status != 304 or not request.meta.get('conditional_request'):
+            return response
+        
+        entry = spider.http_cache.get(request.url)
+        if entry is None:
+            return response
+        
+        self.stats.inc_value('conditional_cache/not_modified')
+        request.meta['conditional_cache_result'] = entry['result']
+        return response.replace(status=200, flags=response.flags + ['not_modified'])
+
+
+class AdaptiveRateMiddleware:
+    """
+    按域名自适应限速下载器中间件（需开启 ADAPTIVE_RATE_ENABLED）
+    
+    速率逻辑见 rate_control.DomainRateController；本中间件负责：
+    1. 把每个域名当前的并发与下载间隔写入 Scrapy 下载槽位（slot.concurrency / slot.delay）
+    2. 有 Retry-After 时把该域名下载槽位的下一次发送时间（slot.lastseen）推迟到限流结束：
+       请求留在槽位队列中，不在中间件链中挂起等待
+    3. 接管 AutoThrottle 对这些请求的间隔调整（meta['autothrottle_dont_adjust_delay']）
+    4. 定时及关闭时把各域名速率写入 ADAPTIVE_RATE_FILE，统计计入 stats adaptive_rate/*
+    
+    位于 RetryMiddleware(550) 之后：429/503 先经过这里记录限流，再交给重试。
+    """
+    
+    def __init__(self, crawler, controller, rate_file, export_interval):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.controller = controller
+        self.rate_file = rate_file
+        self.export_interval = export_interval
+        self.export_task = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_RATE_ENABLED', False):
+            raise NotConfigured
+        controller = DomainRateController(
+            start_concurrency=settings.getint('ADAPTIVE_RATE_START_CONCURRENCY', 2),
+            max_concurrency=settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN', 8),
+            start_delay=settings.getfloat('DOWNLOAD_DELAY', 1.0),
+            min_delay=settings.getfloat('ADAPTIVE_RATE_MIN_DELAY', 0.25),
+            max_delay=settings.getfloat('ADAPTIVE_RATE_MAX_DELAY', 30.0),
+            target_latency=settings.getfloat('ADAPTIVE_RATE_TARGET_LATENCY', 2.0),
+            max_retry_after=settings.getfloat('ADAPTIVE_RATE_MAX_RETRY_AFTER', 300.0),
+        )
+        s = cls(crawler, controller, settings.get('ADAPTIVE_RATE_FILE'),
+                settings.getfloat('ADAPTIVE_RATE_EXPORT_INTERVAL', 60))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+    
+    def spider_opened(self, spider):
+        loaded = self.controller.load(self.rate_file)
+        if loaded:
+            spider.logger.info(f"自适应限速: 从 {self.rate_file} 恢复 {loaded} 个域名的速率")
+        if self.export_interval > 0:
+            from twisted.internet import task
+            
+            self.export_task = task.LoopingCall(self.controller.export, self.rate_file)
+            self.export_task.start(self.export_interval, now=False)
+    
+    def spider_closed(self, spider):
+        if self.export_task is not None and self.export_task.running:
+            self.export_task.stop()
+        self.controller.export(self.rate_file)
+        throttled = sorted(self.controller.domains.items(), key=lambda entry: -entry[1].throttled)[:5]
+        throttled = [f"{domain}({state.throttled})" for domain, state in throttled if state.throttled]
+        if throttled:
+            spider.logger.info(f"自适应限速: 限流最多的域名 {', '.join(throttled)}")
+    
+    @staticmethod
+    def get_domain(request):
+        """与 Scrapy 下载槽位相同的键：meta['download_slot'] 或 host"""
+        return request.meta.get('download_slot') or urlparse_cached(request).hostname or ''
+    
+    def apply_to_slot(self, domain, state):
+        slot = self.crawler.engine.downloader.slots.get(domain)
+        if slot is None:
+            return
+        slot.concurrency = state.concurrency
+        slot.delay = state.delay
+        wait = self.controller.wait_time(domain)
+        if wait > 0:
+            self.block_slot(slot, wait)
+    
+    def block_slot(self, slot, wait):
+        """
+        推迟槽位的下一次发送：Downloader 在 lastseen + download_delay() 之前不会从槽位队列取请求
+        
+        download_delay() 为 0 时不检查 lastseen，因此至少保留 ADAPTIVE_RATE_MIN_DELAY 的间隔；
+        RANDOMIZE_DOWNLOAD_DELAY 时按最短的 0.5 倍间隔计算，保证不早于 Retry-After 到期。
+        """
+        if slot.delay <= 0:
+            slot.delay = self.controller.min_delay
+        min_delay = slot.delay * (0.5 if slot.randomize_delay else 1)
+        # lastseen 是墙上时间（time.time()），wait 是相对秒数
+        slot.lastseen = max(slot.lastseen, time.time() + wait - min_delay)
+        self.stats.inc_value('adaptive_rate/blocked_slots')
+    
+    def process_request(self, request, spider):
+        request.meta['autothrottle_dont_adjust_delay'] = True
+        # 槽位闲置被回收后重新创建时没有限流信息：已出队的这个请求照常发送，之后的请求等到 Retry-After 到期
+        domain = self.get_domain(request)
+        wait = self.controller.wait_time(domain)
+        if wait > 0:
+            slot = self.crawler.engine.downloader.slots.get(domain)
+            if slot is not None:
+                self.block_slot(slot, wait)
+        return None
+    
+    def process_response(self, request, response, spider):
+        domain = self.get_domain(request)
+        if response.status in THROTTLE_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            state = self.controller.on_throttle(domain, retry_after)
+            self.stats.inc_value('adaptive_rate/throttled')
+            spider.logger.warning(
+                f"自适应限速: {domain} 返回 {response.status}，并发降为 {state.concurrency}，"
+                f"间隔 {state.delay:.2f}s" + (f"，Retry-After {retry_after:.0f}s" if retry_after else ''))
+        elif response.status >= 500:
+            state = self.controller.on_error(domain)
+            self.stats.inc_value('adaptive_rate/server_errors')
+        else:
+            state = self.controller.on_success(domain, request.meta.get('download_latency'))
+        self.apply_to_slot(domain, state)
+        return response
+    
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, IgnoreRequest):
+            # 请求未发送（如域名熔断），不是服务器的错误
+            return None
+        domain = self.get_domain(request)
+        state = self.controller.on_error(domain)
+        self.stats.inc_value('adaptive_rate/exceptions')
+        self.apply_to_slot(domain, state)
+        return None
+
+
+class CircuitBreakerMiddleware:
+    """
+    域名熔断下载器中间件（需开启 CIRCUIT_BREAKER_ENABLED），状态机见 circuit_breaker.CircuitBreaker
+    
+    1. process_request：域名熔断中时直接抛出 DomainCircuitOpen，请求不进入下载槽位，
+       errback 立即收到失败（RetryMiddleware 不会重试该异常）
+    2. process_exception：连接失败/超时计数，连续 CIRCUIT_BREAKER_FAILURES 次后熔断
+    3. process_response：任何响应都说明主机存活，清零计数并结束熔断
+    
+    位于 RetryMiddleware(550) 之后：每次重试都会重新经过这里，熔断后剩余的重试也立即失败。
+    """
+    
+    def __init__(self, stats, breaker):
+        self.stats = stats
+        self.breaker = breaker
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CIRCUIT_BREAKER_ENABLED', False):
+            raise NotConfigured
+        breaker = CircuitBreaker(
+            failure_threshold=settings.getint('CIRCUIT_BREAKER_FAILURES', 5),
+            cooldown=settings.getfloat('CIRCUIT_BREAKER_COOLDOWN', 120),
+            max_cooldown=settings.getfloat('CIRCUIT_BREAKER_MAX_COOLDOWN', 1800),
+        )
+        s = cls(crawler.stats, breaker)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+    
+    def spider_closed(self, spider):
+        circuits = sorted(self.breaker.circuits.items(), key=lambda entry: -entry[1].fast_failed)
+        summary = [f"{domain}({circuit.fast_failed})" for domain, circuit in circuits if circuit.fast_failed][:10]
+        if summary:
+            spider.logger.info(f"域名熔断: 直接失败的请求数 {', '.join(summary)}")
+    
+    def process_request(self, request, spider):
+        domain = AdaptiveRateMiddleware.get_domain(request)
+        allowed = self.breaker.allow(domain)
+        if allowed is None:
+            self.stats.inc_value('circuit_breaker/fast_failed')
+            raise DomainCircuitOpen(f"域名 {domain} 连续连接失败，熔断中")
+        if allowed == 'probe':
+            request.meta['circuit_probe'] = True
+            self.stats.inc_value('circuit_breaker/probes')
+            spider.logger.info(f"域名熔断: 冷却结束，探测 {domain}: {request.url}")
+        return None
+    
+    def process_response(self, request, response, spider):
+        domain = AdaptiveRateMiddleware.get_domain(request)
+        if self.breaker.record_success(domain):
+            self.stats.inc_value('circuit_breaker/recovered')
+            spider.logger.info(f"域名熔断: {domain} 已恢复")
+        return response
+    
+    def process_exception(self, request, exception, spider):
+        domain = AdaptiveRateMiddleware.get_domain(request)
+        is_probe = request.meta.pop('circuit_probe', False)
+        if not isinstance(exception, CONNECTION_FAILURES):
+            if is_probe:
+                # 探测请求因其他原因失败：允许下一个请求继续探测
+                self.breaker.get(domain).probe_in_flight = False
+            return None
+        if self.breaker.record_failure(domain, is_probe=is_probe):
+            circuit = self.breaker.get(domain)
+            self.stats.inc_value('circuit_breaker/opened')
+            spider.logger.warning(
+                f"域名熔断: {domain} 连续连接失败（{type(exception).__name__}），"
+                f"{circuit.cooldown:.0f} 秒内发往该域名的请求直接失败")
+        return None
+
+
+class ProjectBudgetMiddleware:
+    """
+    丢弃已按时间预算提前收尾的项目仍在排队的请求（PROJECT_TIME_BUDGET）
+    
+    ProgramSpider 超时收尾时只清零项目的请求计数，调度器中剩余的请求在这里以 IgnoreRequest 丢弃，
+    不再占用下载槽位；errback 中按迟到结果忽略。位于最前面，被丢弃的请求不经过其他中间件。
+    """
+    
+    def __init__(self, stats):
+        self.stats = stats
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.getfloat('PROJECT_TIME_BUDGET', 0) <= 0:
+            raise NotConfigured
+        return cls(crawler.stats)
+    
+    def process_request(self, request, spider):
+        project_id = request.meta.get('project_id')
+        if project_id is not None and project_id in getattr(spider, 'cut_off_projects', ()):
+            self.stats.inc_value('project_budget/dropped_requests')
+            raise IgnoreRequest(f"项目 {project_id} 已按时间预算收尾")
+        return None
+
+
+class CoverageStopMiddleware:
+    """
+    丢弃已覆盖全部主题（LINK_COVERAGE_TOPICS）的项目仍在排队的子页面请求
+    
+    子链接只在根页面返回时一次性调度，覆盖度要等主题页面下载后才能判断，因此停止规则在请求
+    离开调度器时生效：ProgramSpider.covered_projects 中的项目的请求以 CoverageReached 丢弃，
+    errback 只回收计数，不记为失败页面。位于 ProjectBudgetMiddleware 之后、其他中间件之前。
+    """
+    
+    def __init__(self, stats):
+        self.stats = stats
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getlist('LINK_COVERAGE_TOPICS', []):
+            raise NotConfigured
+        return cls(crawler.stats)
+    
+    def process_request(self, request, spider):
+        project_id = request.meta.get('project_id')
+        if project_id is not None and project_id in getattr(spider, 'covered_projects', ()) \
+                and not request.meta.get('is_root'):
+            self.stats.inc_value('link_scoring/skipped_after_coverage')
+            raise CoverageReached(f"项目 {project_id} 已覆盖全部主题")
+        return None
@@ -0,0 +1,105 @@
+"""
+近似重复页面检测 - SimHash 指纹（settings.NEAR_DUPLICATE_ENABLED）
+
+大学网站的子页面经常共享大段正文：同一段申请要求出现在多个URL下、页面的打印版本等，
+原来每份副本都完整保存在 pages[].content 中。
+
+做法：
+1. 页面正文按词切分，取连续 3 个词的 shingle，每个 shingle 用 blake2b 取 64 位哈希，
+   按位投票得到 64 位 SimHash；正文相近的页面指纹只相差少数几位
+2. 指纹切成 NEAR_DUPLICATE_MAX_DISTANCE + 1 段分别建桶：汉明距离不超过 k 的两个指纹在 k + 1 段中
+   至少有一段完全相同（抽屉原理），查询只需比较同桶的候选
+3. 距离不超过 NEAR_DUPLICATE_MAX_DISTANCE 的页面视为近似重复，只保存指向第一次出现的页面
+   （规范页面）的指针，不再保存正文
+
+位投票按字节统计：每个 shingle 只做 8 次计数，最后再由 8×256 的字节计数表还原每一位的票数，
+避免纯 Python 中每个 shingle 逐位循环 64 次。
+"""
+
+import hashlib
+import re
+
+FINGERPRINT_BITS = 64
+
+_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def simhash(text, shingle_size=3):
+    """
+    计算文本的 64 位 SimHash
+
+    Args:
+        text (str): 页面正文
+        shingle_size (int): shingle 的词数
+
+    Returns:
+        int: 指纹；没有任何词时返回 0
+    """
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return 0
+    shingles = {' '.join(tokens[i:i + shingle_size]) for i in range(max(1, len(tokens) - shingle_size + 1))}
+
+    byte_counts = [[0] * 256 for _ in range(8)]
+    for shingle in shingles:
+        digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest()
+        for position, value in enumerate(digest):
+            byte_counts[position][value] += 1
+
+    half = len(shingles) / 2
+    fingerprint = 0
+    for position, counts in enumerate(byte_counts):
+        present = [(value, count) for value, count in enumerate(counts) if count]
+        for bit in range(8):
+            ones = sum(count for value, count in present if value >> bit & 1)
+            if ones > half:
+                fingerprint |= 1 << (position * 8 + bit)
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class SimHashIndex:
+    """
+    SimHash 指纹索引（分 max_distance + 1 段建桶）
+
+    Args:
+        max_distance (int): 视为近似重复的最大汉明距离
+    """
+
+    def __init__(self, max_distance=6):
+        self.max_distance = max(0, min(max_distance, FINGERPRINT_BITS // 4))
+        bands = self.max_distance + 1
+        # 各段的 (起始位, 掩码)，位数尽量均分
+        bounds = [FINGERPRINT_BITS * i // bands for i in range(bands + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.buckets = [{} for _ in self.bands]
+        self.size = 0
+
+    def find_or_add(self, fingerprint, ref):
+        """
+        查找近似重复的规范页面；没有时把当前页面登记为规范页面
+
+        Args:
+            fingerprint (int): 页面指纹
+            ref: 页面引用（原样返回给之后的近似重复页面）
+
+        Returns:
+            tuple | None: (规范页面引用, 汉明距离)；当前页面成为规范页面时返回 None
+        """
+        keys = [fingerprint >> start & mask for start, mask in self.bands]
+        best = None
+        for key, bucket in zip(keys, self.buckets):
+            for candidate_fingerprint, candidate_ref in bucket.get(key, ()):
+                distance = hamming_distance(fingerprint, candidate_fingerprint)
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (candidate_ref, distance)
+        if best is not None:
+            return best
+
+        for key, bucket in zip(keys, self.buckets):
+            bucket.setdefault(key, []).append((fingerprint, ref))
+        self.size += 1
+        return None
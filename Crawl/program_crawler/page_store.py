@@ -0,0 +1,95 @@
+"""
+跨项目共享页面库 - 同一大学的多个项目复用已下载的子页面
+
+背景：
+同一大学的不同项目根页面往往链接到相同的招生、学费、FAQ 页面，而 seen_urls
+只在项目内去重，因此这些页面会被每个项目重复下载、解析。
+
+策略：
+1. 以规范化URL为键保存已解析的子页面（标题/内容等页面记录），LRU 淘汰
+2. 某个子页面第一次被请求时登记为“下载中”；期间其他项目遇到同一页面不再发请求，
+   而是登记为等待者，待第一次下载完成后直接引用其结果
+3. 统计节省的请求数与字节数（按第一次下载的响应体大小计算）
+"""
+
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+from w3lib.url import canonicalize_url
+
+
+def canonical_page_url(url):
+    """
+    页面的规范化URL：排序查询参数、去掉 fragment、host 小写、去掉路径末尾的 /
+
+    Example:
+        >>> canonical_page_url("https://WWW.Uni.edu/Admissions/?b=2&a=1#fees")
+        "https://www.uni.edu/Admissions?a=1&b=2"
+    """
+    canonical = canonicalize_url(url, keep_fragments=False)
+    parts = urlsplit(canonical)
+    path = parts.path
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme, parts.netloc.lower(), path, parts.query, ''))
+
+
+class SharedPageStore:
+    """
+    爬虫级共享页面库
+
+    Args:
+        max_pages (int): 最多保存的页面数（按最近使用淘汰）
+    """
+
+    def __init__(self, max_pages=2000):
+        self.max_pages = max_pages
+        self.pages = OrderedDict()  # 规范化URL -> {'page': 页面记录, 'bytes': 响应体字节数}
+        self.pending = {}           # 下载中的规范化URL -> [(项目ID, 链接URL, 深度), ...] 等待者
+        self.requests_avoided = 0
+        self.bytes_avoided = 0
+
+    def get(self, key):
+        """返回已保存的页面，未保存返回 None"""
+        entry = self.pages.get(key)
+        if entry is not None:
+            self.pages.move_to_end(key)
+        return entry
+
+    def is_pending(self, key):
+        return key in self.pending
+
+    def start(self, key):
+        """登记页面开始下载"""
+        self.pending[key] = []
+
+    def add_waiter(self, key, project_id, url, depth):
+        """页面正在下载中：登记等待者，下载完成后直接引用结果"""
+        self.pending[key].append((project_id, url, depth))
+
+    def store(self, key, page, nbytes):
+        """
+        保存下载完成的页面
+
+        Returns:
+            list: 等待该页面的 (项目ID, 链接URL, 深度)
+        """
+        self.pages[key] = {'page': page, 'bytes': nbytes}
+        self.pages.move_to_end(key)
+        if len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+        return self.pending.pop(key, [])
+
+    def release(self, key):
+        """
+        页面下载失败：取消登记，不保存结果
+
+        Returns:
+            list: 等待该页面的 (项目ID, 链接URL, 深度)，需要各自重新请求
+        """
+        return self.pending.pop(key, [])
+
+    def record_reuse(self, entry):
+        """记录一次复用节省的请求与字节"""
+        self.requests_avoided += 1
+        self.bytes_avoided += entry['bytes']
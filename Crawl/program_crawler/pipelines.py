@@ -11,13 +11,31 @@
 - 每个项目独立保存为一个JSON文件
 - 文件名格式：{项目名}_{来源文件}.json
 - 使用UTF-8编码确保中文正确显示
+- OUTPUT_MODE = 'stream' 时，页面逐条追加到 {项目名}_{来源文件}.pages.jsonl，
+  项目完成时 {项目名}_{来源文件}.json 只保存不含页面内容的项目摘要
+- 爬取状态在内存中聚合（见 crawl_status.py），每次运行只写一个状态文件
+- INCREMENTAL_MODE 下 status 为 unchanged 的项目不重写输出；有变化的项目逐行记录到
+  output/_delta/delta_{运行开始时间}.jsonl，下游只需处理清单中的项目
+- 设置 FANOUT_MAP_FILE（plan_crawl.py 生成）时，项目结果同时复制给引用同一根URL的其他
+  (project_id, source_file)，写入各自的输出路径
+
+NearDuplicatePipeline（NEAR_DUPLICATE_ENABLED，位于 JsonWriterPipeline 之前）：
+- 用 SimHash 检测项目内与整个爬取中的近似重复页面，重复页面只保存指向规范页面的指针，
+  节省的字节数写入 output/_near_duplicates/report_{运行开始时间}.json
 """
 
 import json
 import os
 import re
+import shutil
 from datetime import datetime
 
+from scrapy.exceptions import NotConfigured
+
+from .crawl_status import CrawlStatusAggregator
+from .items import ProgramPageRecordItem
+from .near_duplicate import SimHashIndex, simhash
+
 
 class JsonWriterPipeline:
     """
@@ -27,19 +45,151 @@ class JsonWriterPipeline:
     每个项目生成一个独立的JSON文件，便于后续处理
     """
     
-    def __init__(self):
+    def __init__(self, output_mode='project', status_flush_items=50, status_flush_interval=30, stats=None,
+                 fanout_map=None, incremental=False, output_dir='output', status_log_dir=None):
         """
         初始化管道
         
         创建输出目录，准备文件保存环境
+        
+        Args:
+            output_mode (str): 'project' 每个项目一个完整JSON；'stream' 逐页JSONL + 项目摘要
+            status_flush_items (int): 状态文件每累计多少个项目写盘一次
+            status_flush_interval (float): 状态文件定时写盘间隔（秒），0 表示不定时写盘
+            stats: Scrapy StatsCollector，状态计数同步到其中供实时查询
+            fanout_map (dict): {代表项目ID: [{project_id, program_name, source_file}, ...]}，
+                               项目结果需要额外复制给的项目
+            incremental (bool): 增量模式，跳过 unchanged 项目并输出增量清单
+            output_dir (str): 输出目录（分片运行时每个分片使用独立目录）
+            status_log_dir (str): 状态文件目录，默认 crawl/status_log
         """
-        self.output_dir = 'output'  # 输出目录名
+        self.output_dir = output_dir  # 输出目录名
+        self.status_log_dir = status_log_dir
+        self.output_mode = output_mode
+        self.page_files = {}  # stream 模式下各项目已打开的 JSONL 文件：project_id -> 文件对象
+        self.status_flush_items = status_flush_items
+        self.status_flush_interval = status_flush_interval
+        self.stats = stats
+        self.crawl_status = None  # CrawlStatusAggregator，open_spider 时创建
+        self.status_flush_task = None
+        self.fanout_map = fanout_map or {}
+        self.incremental = incremental
+        self.delta_file = None  # 增量清单（JSONL），open_spider 时创建
         
         # 如果输出目录不存在，则创建
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
             print(f"创建输出目录: {self.output_dir}")
     
+    @classmethod
+    def from_crawler(cls, crawler):
+        """从爬虫设置中读取输出模式与扇出映射"""
+        fanout_map = None
+        fanout_map_file = crawler.settings.get('FANOUT_MAP_FILE')
+        if fanout_map_file:
+            with open(fanout_map_file, 'r', encoding='utf-8') as f:
+                fanout_map = json.load(f)
+        
+        return cls(
+            output_mode=crawler.settings.get('OUTPUT_MODE', 'project'),
+            status_flush_items=crawler.settings.getint('CRAWL_STATUS_FLUSH_ITEMS', 50),
+            status_flush_interval=crawler.settings.getfloat('CRAWL_STATUS_FLUSH_INTERVAL', 30),
+            stats=crawler.stats,
+            fanout_map=fanout_map,
+            incremental=crawler.settings.getbool('INCREMENTAL_MODE', False),
+            output_dir=crawler.settings.get('OUTPUT_DIR') or 'output',
+            status_log_dir=crawler.settings.get('STATUS_LOG_DIR'),
+        )
+    
+    def open_spider(self, spider):
+        """创建本次运行的状态聚合器（一个运行一个状态文件），并启动定时写盘"""
+        # 默认保存在 crawl/status_log 目录中，文件名使用运行开始时间 (格式: YYMMDDHHMM)
+        status_log_dir = self.status_log_dir
+        if not status_log_dir:
+            status_log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'status_log')
+        timestamp = datetime.now().strftime('%y%m%d%H%M')
+        status_file = os.path.join(status_log_dir, f'crawl_status_{timestamp}.json')
+        
+        self.crawl_status = CrawlStatusAggregator(status_file, flush_every=self.status_flush_items, stats=self.stats)
+        projects = list(getattr(spider, 'project_queue', []))
+        # 扇出的项目同样计入各来源文件的总数
+        for project in list(projects):
+            projects.extend(self.fanout_map.get(project.get('id'), []))
+        self.crawl_status.set_totals(projects)
+        
+        if self.incremental:
+            delta_dir = os.path.join(self.output_dir, '_delta')
+            os.makedirs(delta_dir, exist_ok=True)
+            self.delta_file = open(os.path.join(delta_dir, f'delta_{timestamp}.jsonl'), 'a', encoding='utf-8', buffering=1)
+        
+        if self.status_flush_interval > 0:
+            from twisted.internet import task
+            
+            self.status_flush_task = task.LoopingCall(self.flush_crawl_status)
+            self.status_flush_task.start(self.status_flush_interval, now=False)
+    
+    def close_spider(self, spider):
+        """关闭仍未收到项目摘要的 JSONL 文件（例如爬虫被中断），并写出最终状态"""
+        for page_file in self.page_files.values():
+            page_file.close()
+        self.page_files.clear()
+        
+        if self.delta_file is not None:
+            self.delta_file.close()
+        
+        if self.status_flush_task is not None and self.status_flush_task.running:
+            self.status_flush_task.stop()
+        if self.crawl_status is not None:
+            self.crawl_status.flush(force=True)
+    
+    def flush_crawl_status(self):
+        """定时写盘；状态写入失败不应该影响主流程"""
+        try:
+            self.crawl_status.flush()
+        except Exception:
+            pass
+    
+    def get_project_path(self, item):
+        """
+        计算项目输出文件路径（不含扩展名）
+        
+        Returns:
+            str: output/{来源文件}/{项目名}_{来源文件}
+        """
+        # 提取项目基本信息，设置默认值防止KeyError
+        program_name = item.get('program_name', 'unknown_program')
+        source_file = item.get('source_file', 'unknown.json')
+        
+        # 清理文件名，确保文件系统兼容性
+        safe_program_name = self.sanitize_filename(program_name)
+        safe_source_file = source_file.replace('.json', '')  # 移除原有扩展名
+        
+        # 根据来源文件创建子文件夹
+        subject_dir = os.path.join(self.output_dir, safe_source_file)
+        if not os.path.exists(subject_dir):
+            os.makedirs(subject_dir)
+        
+        return os.path.join(subject_dir, f"{safe_program_name}_{safe_source_file}")
+    
+    def write_page_record(self, item, spider):
+        """
+        stream 模式：把单个页面追加为 JSONL 的一行
+        
+        项目在本次运行中的第一条记录以 'w' 打开文件，覆盖上一次运行留下的旧记录
+        """
+        project_id = item.get('project_id')
+        page_file = self.page_files.get(project_id)
+        if page_file is None:
+            filepath = self.get_project_path(item) + '.pages.jsonl'
+            if self.incremental:
+                # 增量模式先写临时文件，项目确认有变化后才替换旧的 JSONL
+                filepath += '.tmp'
+            page_file = open(filepath, 'w', encoding='utf-8')
+            self.page_files[project_id] = page_file
+        
+        page_file.write(json.dumps(item['page'], ensure_ascii=False) + '\n')
+        return item
+    
     def process_item(self, item, spider):
         """
         处理每个爬取完成的项目数据
@@ -48,7 +198,7 @@ class JsonWriterPipeline:
         1. 提取项目名称和来源文件信息
         2. 生成安全的文件名（处理特殊字符）
         3. 构建完整的文件路径
-        4. 保存为格式化的JSON文件
+        4. 保存为格式化的JSON文件（stream 模式下单页记录追加到 JSONL，项目摘要不含页面）
         5. 记录保存日志
         
         Args:
@@ -58,28 +208,44 @@ class JsonWriterPipeline:
         Returns:
             item: 原始Item对象（管道链传递）
         """
-        # 提取项目基本信息，设置默认值防止KeyError
-        program_name = item.get('program_name', 'unknown_program')
-        source_file = item.get('source_file', 'unknown.json')
+        # 单页记录（stream 模式）直接追加到 JSONL
+        if isinstance(item, ProgramPageRecordItem):
+            return self.write_page_record(item, spider)
         
-        # 清理文件名，确保文件系统兼容性
-        safe_program_name = self.sanitize_filename(program_name)
-        safe_source_file = source_file.replace('.json', '')  # 移除原有扩展名
+        # 构建文件名：项目名_来源文件.json
+        base_path = self.get_project_path(item)
+        filepath = base_path + '.json'
         
-        # 根据来源文件创建子文件夹
-        subject_dir = os.path.join(self.output_dir, safe_source_file)
-        if not os.path.exists(subject_dir):
-            os.makedirs(subject_dir)
+        data = dict(item)  # 将Item转换为字典
+        if self.output_mode == 'stream':
+            # 页面已逐条写入 JSONL，摘要中只记录 JSONL 文件名（没有任何页面时为 None）
+            data.pop('pages', None)
+            page_file = self.page_files.pop(item.get('project_id'), None)
+            if page_file is not None:
+                page_file.close()
+                pages_path = base_path + '.pages.jsonl'
+                if page_file.name != pages_path:
+                    if item.get('status') == 'unchanged':
+                        os.remove(page_file.name)
+                    else:
+                        os.replace(page_file.name, pages_path)
+                data['pages_file'] = os.path.basename(pages_path)
+            else:
+                data['pages_file'] = None
         
-        # 构建文件名：项目名_来源文件.json
-        filename = f"{safe_program_name}_{safe_source_file}.json"
-        filepath = os.path.join(subject_dir, filename)
+        # 增量模式：没有变化的项目保留上次的输出，不再重写
+        if item.get('status') == 'unchanged':
+            spider.logger.info(f'项目未变化，保留已有输出: {filepath}')
+            self.update_crawl_status(item, 'unchanged')
+            for alias in self.fanout_map.get(item.get('project_id'), []):
+                self.update_crawl_status(alias, 'unchanged')
+            return item
         
         # 保存JSON文件
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(
-                    dict(item),  # 将Item转换为字典
+                    data,
                     f,
                     ensure_ascii=False,  # 保持中文字符不转义
                     indent=2,  # 格式化缩进，便于阅读
@@ -90,7 +256,8 @@ class JsonWriterPipeline:
             spider.logger.info(f'成功保存项目数据: {filepath}')
             
             # 更新状态跟踪
-            self.update_crawl_status(item, 'success')
+            self.update_crawl_status(item, 'partial' if item.get('status') == 'partial' else 'success')
+            self.record_delta(data, filepath)
             
         except Exception as e:
             # 记录保存失败的错误
@@ -100,8 +267,54 @@ class JsonWriterPipeline:
             self.update_crawl_status(item, 'failed', str(e))
             raise
         
+        self.write_fanout(item, data, base_path, spider)
+        
         return item  # 返回原始item，供下一个管道处理
     
+    def write_fanout(self, item, data, base_path, spider):
+        """
+        把项目结果复制给引用同一根URL的其他 (project_id, source_file)
+        
+        复制的 JSON 替换项目ID/名称/来源文件，并以 fanout_from 记录实际爬取的项目；
+        stream 模式下同时复制页面 JSONL
+        """
+        for alias in self.fanout_map.get(item.get('project_id'), []):
+            alias_data = dict(data)
+            alias_data.update(alias)
+            alias_data['fanout_from'] = item.get('project_id')
+            alias_path = self.get_project_path(alias_data)
+            filepath = alias_path + '.json'
+            
+            try:
+                if data.get('pages_file'):
+                    alias_data['pages_file'] = os.path.basename(alias_path) + '.pages.jsonl'
+                    shutil.copyfile(base_path + '.pages.jsonl', alias_path + '.pages.jsonl')
+                
+                with open(filepath, 'w', encoding='utf-8') as f:
+                    json.dump(alias_data, f, ensure_ascii=False, indent=2, sort_keys=True)
+                
+                spider.logger.info(f'扇出项目数据: {filepath} (来自 {item.get("project_id")})')
+                self.update_crawl_status(alias_data, 'partial' if data.get('status') == 'partial' else 'success')
+                self.record_delta(alias_data, filepath)
+                if self.stats is not None:
+                    self.stats.inc_value('fanout/items')
+            except Exception as e:
+                spider.logger.error(f'扇出保存失败 {filepath}: {str(e)}')
+                self.update_crawl_status(alias_data, 'failed', str(e))
+    
+    def record_delta(self, data, filepath):
+        """增量模式：把本次写入（有变化）的项目追加到增量清单"""
+        if self.delta_file is None:
+            return
+        record = {
+            'project_id': data.get('project_id'),
+            'program_name': data.get('program_name'),
+            'source_file': data.get('source_file'),
+            'crawl_time': data.get('crawl_time'),
+            'path': filepath,
+        }
+        self.delta_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+    
     def sanitize_filename(self, filename):
         """
         清理文件名，确保文件系统兼容性
@@ -138,66 +351,161 @@ class JsonWriterPipeline:
         return filename[:50] if len(filename) > 50 else filename
     
     def update_crawl_status(self, item, status, error_msg=None):
-        """更新爬取状态追踪"""
-        # 修改为保存在 crawl/status_log 目录中
-        crawl_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        status_log_dir = os.path.join(crawl_dir, 'status_log')
-        
-        # 确保状态日志目录存在
-        if not os.path.exists(status_log_dir):
-            os.makedirs(status_log_dir)
-        
-        # 生成带时间戳的文件名 (格式: YYMMDDHHMM)
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%y%m%d%H%M')
-        status_file = os.path.join(status_log_dir, f'crawl_status_{timestamp}.json')
+        """更新爬取状态追踪（内存聚合，按数量/定时写盘）"""
+        if self.crawl_status is None:
+            return
         
         try:
-            # 读取现有状态
-            if os.path.exists(status_file):
-                with open(status_file, 'r', encoding='utf-8') as f:
-                    crawl_status = json.load(f)
-            else:
-                crawl_status = {
-                    "subjects": {},
-                    "failed_projects": [],
-                    "completed_subjects": [],
-                    "last_update": None
-                }
-            
-            project_id = item.get('project_id')
-            source_file = item.get('source_file', 'unknown.json').replace('.json', '')
-            
-            # 更新学科状态
-            if source_file not in crawl_status['subjects']:
-                crawl_status['subjects'][source_file] = {
-                    'status': 'running',
-                    'total': 0,
-                    'completed': 0,
-                    'failed': 0
-                }
-            
-            if status == 'success':
-                crawl_status['subjects'][source_file]['completed'] += 1
-            elif status == 'failed':
-                crawl_status['subjects'][source_file]['failed'] += 1
-                
-                # 记录失败项目详情
-                failed_project = {
-                    'project_id': project_id,
-                    'program_name': item.get('program_name'),
-                    'source_file': source_file,
-                    'error': error_msg,
-                    'timestamp': datetime.now().isoformat()
-                }
-                crawl_status['failed_projects'].append(failed_project)
-            
-            crawl_status['last_update'] = datetime.now().isoformat()
-            
-            # 保存状态
-            with open(status_file, 'w', encoding='utf-8') as f:
-                json.dump(crawl_status, f, ensure_ascii=False, indent=2)
-                
+            self.crawl_status.record(item, status, error_msg)
         except Exception as e:
             # 状态更新失败不应该影响主流程
-            pass
\ No newline at end of file
+            pass
+
+
+class NearDuplicatePipeline:
+    """
+    近似重复页面管道（需开启 NEAR_DUPLICATE_ENABLED）
+    
+    每个成功页面的正文计算 SimHash（见 near_duplicate.py）；与已出现页面的汉明距离不超过
+    NEAR_DUPLICATE_MAX_DISTANCE 时，页面的 content 清空，改为记录
+    duplicate_of = {project_id, source_file, url}（规范页面）与 duplicate_distance。
+    
+    规范页面是本次运行中第一次出现的页面，可能在另一个项目的输出中（NEAR_DUPLICATE_SCOPE = 'crawl'）；
+    'project' 时只在项目内部去重，输出文件自包含。增量模式下保留的旧输出中也可能含有指针，
+    读取方应沿 duplicate_of 解析到有正文的页面为止。
+    
+    页面字典与共享页面库等处共用，这里总是替换为新字典，不原地修改。
+    """
+    
+    def __init__(self, max_distance=5, min_length=200, scope='crawl', output_dir='output', stats=None):
+        """
+        Args:
+            max_distance (int): 视为近似重复的最大汉明距离（64 位指纹）
+            min_length (int): 正文少于该字符数的页面不参与去重
+            scope (str): 'crawl' 整个爬取范围内去重；'project' 只在项目内部去重
+            output_dir (str): 输出目录，报告写入其中的 _near_duplicates/
+            stats: Scrapy StatsCollector
+        """
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.scope = scope
+        self.output_dir = output_dir
+        self.stats = stats
+        self.indexes = {}       # 去重范围键 -> SimHashIndex
+        self.projects = {}      # (project_id, source_file) -> {'pages', 'duplicates', 'cross_project', 'bytes_saved'}
+        self.duplicates = []    # 每个近似重复页面的记录
+        self.pages_checked = 0
+        self.bytes_total = 0
+        self.bytes_saved = 0
+        self.timestamp = datetime.now().strftime('%y%m%d%H%M')
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('NEAR_DUPLICATE_ENABLED', False):
+            raise NotConfigured
+        scope = settings.get('NEAR_DUPLICATE_SCOPE', 'crawl')
+        if scope not in ('crawl', 'project'):
+            raise ValueError(f"未知的 NEAR_DUPLICATE_SCOPE: {scope}，可选: crawl, project")
+        return cls(
+            max_distance=settings.getint('NEAR_DUPLICATE_MAX_DISTANCE', 5),
+            min_length=settings.getint('NEAR_DUPLICATE_MIN_LENGTH', 200),
+            scope=scope,
+            output_dir=settings.get('OUTPUT_DIR') or 'output',
+            stats=crawler.stats,
+        )
+    
+    def process_item(self, item, spider):
+        if isinstance(item, ProgramPageRecordItem):
+            item['page'] = self.check_page(item, item['page'])
+            return item
+        
+        # 增量模式下 unchanged 项目保留旧输出，其页面不参与去重
+        if item.get('pages') and item.get('status') != 'unchanged':
+            item['pages'] = [self.check_page(item, page) for page in item['pages']]
+        if self.scope == 'project':
+            # 项目摘要是项目的最后一个 Item，项目内的索引可以回收
+            self.indexes.pop(item.get('project_id'), None)
+        return item
+    
+    def check_page(self, item, page):
+        """
+        检查一个页面，近似重复时返回只含指针的新页面字典，否则原样返回
+        """
+        content = page.get('content') or ''
+        if page.get('crawl_status') != 'success' or len(content) < self.min_length:
+            return page
+        
+        project_id = item.get('project_id')
+        source_file = item.get('source_file')
+        content_bytes = len(content.encode('utf-8'))
+        project = self.projects.setdefault(
+            (project_id, source_file), {'pages': 0, 'duplicates': 0, 'cross_project': 0, 'bytes_saved': 0})
+        project['pages'] += 1
+        self.pages_checked += 1
+        self.bytes_total += content_bytes
+        
+        scope_key = project_id if self.scope == 'project' else None
+        index = self.indexes.get(scope_key)
+        if index is None:
+            index = self.indexes[scope_key] = SimHashIndex(self.max_distance)
+        match = index.find_or_add(simhash(content), (project_id, source_file, page['url']))
+        if match is None:
+            return page
+        
+        (canonical_project, canonical_source, canonical_url), distance = match
+        cross_project = (canonical_project, canonical_source) != (project_id, source_file)
+        project['duplicates'] += 1
+        project['cross_project'] += int(cross_project)
+        project['bytes_saved'] += content_bytes
+        self.bytes_saved += content_bytes
+        self.duplicates.append({
+            'project_id': project_id,
+            'source_file': source_file,
+            'url': page['url'],
+            'duplicate_of': {'project_id': canonical_project, 'source_file': canonical_source, 'url': canonical_url},
+            'distance': distance,
+            'bytes_saved': content_bytes,
+        })
+        if self.stats is not None:
+            self.stats.inc_value('near_duplicate/pages')
+            self.stats.inc_value('near_duplicate/bytes_saved', content_bytes)
+            if cross_project:
+                self.stats.inc_value('near_duplicate/cross_project')
+        
+        return dict(
+            page,
+            content='',
+            duplicate_of={'project_id': canonical_project, 'source_file': canonical_source, 'url': canonical_url},
+            duplicate_distance=distance,
+        )
+    
+    def close_spider(self, spider):
+        """写出节省字节报告"""
+        report_dir = os.path.join(self.output_dir, '_near_duplicates')
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, f'report_{self.timestamp}.json')
+        projects = [
+            dict(summary, project_id=project_id, source_file=source_file)
+            for (project_id, source_file), summary in self.projects.items() if summary['duplicates']
+        ]
+        projects.sort(key=lambda summary: -summary['bytes_saved'])
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'summary': {
+                    'scope': self.scope,
+                    'max_distance': self.max_distance,
+                    'pages_checked': self.pages_checked,
+                    'duplicates': len(self.duplicates),
+                    'cross_project': sum(summary['cross_project'] for summary in projects),
+                    'content_bytes': self.bytes_total,
+                    'bytes_saved': self.bytes_saved,
+                },
+                'projects': projects,
+                'duplicates': self.duplicates,
+            }, f, ensure_ascii=False, indent=2)
+        
+        ratio = self.bytes_saved / self.bytes_total if self.bytes_total else 0
+        spider.logger.info(
+            f"近似重复页面: 检查 {self.pages_checked} 个页面，{len(self.duplicates)} 个改为指针，"
+            f"节省正文 {self.bytes_saved / 1024 / 1024:.1f} MB ({ratio:.1%})，报告: {report_path}")
@@ -0,0 +1,206 @@
+"""
+按域名自适应限速 - 每个域名独立估计延迟与错误率，动态调整并发与下载间隔
+
+背景：
+settings 中固定的 DOWNLOAD_DELAY + AutoThrottle + 统一的 RETRY_HTTP_CODES 对所有域名一视同仁，
+只能按最脆弱的网站设定速率；响应快的网站跑不满，脆弱的网站仍会返回 429/503。
+
+策略（AIMD，加性增、乘性减）：
+1. 每个域名维护延迟与错误率的指数滑动平均（EWMA）
+2. 健康（成功且平均延迟不超过目标）时，每连续成功“当前并发数”个响应并发 +1，下载间隔缩短 10%
+3. 429 / 503：并发减半、下载间隔加倍；有 Retry-After 时在该时间之前暂停向该域名发送请求
+4. 其他 5xx 与网络异常：并发 -1；平均延迟超过目标 2 倍时并发同样 -1
+5. 学到的各域名速率写入 ADAPTIVE_RATE_FILE（JSON），下次运行以此为起点，并可用于人工调参
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# 视为“请慢一点”的状态码
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value, now=None):
+    """
+    解析 Retry-After 头（秒数或 HTTP 日期）
+
+    Returns:
+        float | None: 需要等待的秒数，无法解析返回 None
+    """
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    now = now if now is not None else datetime.now(timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class DomainRate:
+    """单个域名的速率状态"""
+
+    __slots__ = ('concurrency', 'delay', 'latency', 'error_rate', 'streak', 'blocked_until',
+                 'responses', 'errors', 'throttled', 'peak_concurrency')
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency = None       # 下载延迟 EWMA（秒）
+        self.error_rate = 0.0     # 错误率 EWMA（0~1）
+        self.streak = 0           # 上次调整后连续成功的响应数
+        self.blocked_until = 0.0  # Retry-After 截止时间（time.monotonic）
+        self.responses = 0
+        self.errors = 0
+        self.throttled = 0
+        self.peak_concurrency = concurrency
+
+    def to_dict(self):
+        return {
+            'concurrency': self.concurrency,
+            'delay': round(self.delay, 3),
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 4),
+            'responses': self.responses,
+            'errors': self.errors,
+            'throttled': self.throttled,
+            'peak_concurrency': self.peak_concurrency,
+        }
+
+
+class DomainRateController:
+    """
+    各域名的自适应速率控制器（只在 reactor 线程中使用）
+
+    Args:
+        start_concurrency (int): 新域名的初始并发
+        max_concurrency (int): 单域名并发上限
+        start_delay (float): 新域名的初始下载间隔（秒）
+        min_delay (float): 下载间隔下限
+        max_delay (float): 下载间隔上限
+        target_latency (float): 目标平均延迟（秒），超过时不再增加并发
+        max_retry_after (float): Retry-After 最长遵守时间（秒），防止个别网站要求等待数小时
+        alpha (float): EWMA 平滑系数
+    """
+
+    def __init__(self, start_concurrency=2, max_concurrency=8, start_delay=1.0, min_delay=0.25,
+                 max_delay=30.0, target_latency=2.0, max_retry_after=300.0, alpha=0.2):
+        self.start_concurrency = max(1, min(start_concurrency, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.start_delay = start_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.target_latency = target_latency
+        self.max_retry_after = max_retry_after
+        self.alpha = alpha
+        self.domains = {}
+
+    def get(self, domain):
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = DomainRate(self.start_concurrency, self.start_delay)
+        return state
+
+    def wait_time(self, domain, now=None):
+        """距离 Retry-After 截止还需等待的秒数"""
+        state = self.domains.get(domain)
+        if state is None or not state.blocked_until:
+            return 0.0
+        now = now if now is not None else time.monotonic()
+        return max(0.0, state.blocked_until - now)
+
+    def _observe(self, state, latency, is_error):
+        if latency is not None:
+            state.latency = latency if state.latency is None else \
+                (1 - self.alpha) * state.latency + self.alpha * latency
+        state.error_rate = (1 - self.alpha) * state.error_rate + self.alpha * (1.0 if is_error else 0.0)
+
+    def on_success(self, domain, latency=None):
+        """
+        成功响应（包括 404 等非限流的客户端错误）
+
+        Returns:
+            DomainRate: 更新后的状态
+        """
+        state = self.get(domain)
+        state.responses += 1
+        self._observe(state, latency, False)
+
+        if state.latency is not None and state.latency > 2 * self.target_latency:
+            # 服务器明显变慢：在出错之前先降低并发
+            if state.concurrency > 1:
+                state.concurrency -= 1
+            state.streak = 0
+            return state
+
+        state.streak += 1
+        if state.streak >= state.concurrency and (state.latency is None or state.latency <= self.target_latency):
+            state.streak = 0
+            if state.concurrency < self.max_concurrency:
+                state.concurrency += 1
+                state.peak_concurrency = max(state.peak_concurrency, state.concurrency)
+            state.delay = max(self.min_delay, state.delay * 0.9)
+        return state
+
+    def on_throttle(self, domain, retry_after=None, now=None):
+        """429 / 503：并发减半、间隔加倍，并遵守 Retry-After"""
+        state = self.get(domain)
+        state.responses += 1
+        state.throttled += 1
+        self._observe(state, None, True)
+        state.concurrency = max(1, state.concurrency // 2)
+        state.delay = min(self.max_delay, max(self.start_delay, state.delay * 2))
+        state.streak = 0
+        if retry_after:
+            now = now if now is not None else time.monotonic()
+            state.blocked_until = max(state.blocked_until, now + min(retry_after, self.max_retry_after))
+        return state
+
+    def on_error(self, domain):
+        """其他 5xx 或网络异常：并发 -1"""
+        state = self.get(domain)
+        state.errors += 1
+        self._observe(state, None, True)
+        state.concurrency = max(1, state.concurrency - 1)
+        state.streak = 0
+        return state
+
+    def load(self, path):
+        """从上次运行导出的速率文件恢复各域名的起始并发与间隔"""
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f).get('domains', {})
+        except (OSError, ValueError):
+            return 0
+        for domain, entry in saved.items():
+            state = self.get(domain)
+            state.concurrency = max(1, min(int(entry.get('concurrency') or 1), self.max_concurrency))
+            state.delay = min(self.max_delay, max(self.min_delay, float(entry.get('delay') or self.start_delay)))
+            state.peak_concurrency = state.concurrency
+        return len(saved)
+
+    def export(self, path):
+        """原子写出各域名速率（按响应数降序）"""
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        domains = sorted(self.domains.items(), key=lambda entry: -entry[1].responses)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'updated_at': datetime.now().isoformat(),
+                'domains': {domain: state.to_dict() for domain, state in domains},
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,131 @@
+"""
+页面相关性分类 - 爬取过程中用 classifier/xgboost_classifier.joblib 给子页面打分
+
+classifier/ 中训练的 XGBoost 模型（TF-IDF + XGBoost 的 sklearn Pipeline）原来只在离线阶段使用，
+无价值页面仍会写入输出 JSON 并进入下游 LLM 处理。开启 RELEVANCE_CLASSIFIER_ENABLED 后：
+1. 子页面提取出的内容交给 RelevanceBatcher，跨页面攒成小批次（RELEVANCE_BATCH_SIZE 个或等待
+   RELEVANCE_BATCH_WAIT 秒）后在线程池中一次 predict_proba，reactor 线程不被模型推理阻塞
+2. 低于阈值的页面按 RELEVANCE_LOW_SCORE_ACTION 丢弃（drop）、只保留URL/标题等存根（stub）或照常保留（keep）
+3. RELEVANCE_GATE_EXPANSION：同一分数决定深度1的页面是否继续展开子链接
+
+预处理与 classifier/use_xgboost_classifier.py 保持一致，保证与训练时的输入相同。
+"""
+
+import re
+
+from twisted.internet import defer, threads
+
+# 预处理后少于该长度的内容直接判为 0 分（与离线分类器一致）
+MIN_CONTENT_LENGTH = 10
+
+LOW_SCORE_ACTIONS = ('drop', 'stub', 'keep')
+
+
+def preprocess_text(text):
+    """与训练脚本相同的文本预处理：去掉 [HEADING] 标记和标点，合并空白并转小写"""
+    if not isinstance(text, str):
+        return ""
+    text = re.sub(r'\[HEADING\]', '', text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip().lower()
+
+
+class RelevanceClassifier:
+    """
+    加载 train_xgboost_final.py 保存的模型包（{'model', 'threshold', 'model_name', 'metrics', ...}）
+
+    Args:
+        model_path (str): joblib 模型文件路径
+        threshold (float): 判为有价值的最低概率；None 表示使用模型包中优化过的阈值
+
+    Raises:
+        ImportError: 未安装 joblib / scikit-learn / xgboost
+    """
+
+    def __init__(self, model_path, threshold=None):
+        try:
+            import joblib
+        except ImportError as e:
+            raise ImportError(
+                "RELEVANCE_CLASSIFIER_ENABLED 需要安装 joblib、scikit-learn 与 xgboost: "
+                "pip install joblib scikit-learn xgboost") from e
+        model_data = joblib.load(model_path)
+        self.model = model_data['model']
+        self.model_name = model_data.get('model_name', 'unknown')
+        self.threshold = float(threshold if threshold is not None else model_data['threshold'])
+
+    def predict(self, contents):
+        """
+        批量打分（在线程池中调用）
+
+        Returns:
+            list[float]: 每个内容为“有价值”的概率
+        """
+        texts = [preprocess_text(content) for content in contents]
+        indexes = [i for i, text in enumerate(texts) if len(text) >= MIN_CONTENT_LENGTH]
+        scores = [0.0] * len(texts)
+        if indexes:
+            probabilities = self.model.predict_proba([texts[i] for i in indexes])
+            for i, row in zip(indexes, probabilities):
+                scores[i] = float(row[1])
+        return scores
+
+
+class RelevanceBatcher:
+    """
+    跨页面的微批次打分（只在 reactor 线程中调用 score）
+
+    Args:
+        classifier (RelevanceClassifier): 分类器
+        batch_size (int): 攒满多少个页面立即打分
+        max_wait (float): 第一个页面进入批次后最多等待多少秒
+    """
+
+    def __init__(self, classifier, batch_size=32, max_wait=0.2):
+        self.classifier = classifier
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.pending = []  # [(内容, Deferred), ...]
+        self.timer = None
+        self.batches = 0
+        self.scored = 0
+
+    def score(self, content):
+        """
+        提交一个页面的内容
+
+        Returns:
+            Deferred: 回调参数为该页面的分数（0~1）
+        """
+        dfd = defer.Deferred()
+        self.pending.append((content, dfd))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            from twisted.internet import reactor
+
+            self.timer = reactor.callLater(self.max_wait, self.flush)
+        return dfd
+
+    def flush(self):
+        """把当前批次交给线程池打分"""
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.scored += len(batch)
+
+        def on_scores(scores):
+            for (_content, dfd), score in zip(batch, scores):
+                dfd.callback(score)
+
+        def on_failure(failure):
+            for _content, dfd in batch:
+                dfd.errback(failure)
+
+        threads.deferToThread(self.classifier.predict, [content for content, _dfd in batch]) \
+            .addCallbacks(on_scores, on_failure)
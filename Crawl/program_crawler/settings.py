@@ -11,11 +11,31 @@ ROBOTSTXT_OBEY = False
 CONCURRENT_REQUESTS = 32
 CONCURRENT_REQUESTS_PER_DOMAIN = 8
 
+# 多项目并发调度：同时保持 N 个项目在爬取中，按域名交错启动，
+# 避免逐个项目顺序爬取时大部分下载槽位空闲
+CONCURRENT_PROJECTS = 8
+# 同一域名最多同时爬取的项目数，保证 CONCURRENT_REQUESTS_PER_DOMAIN 仍是单站压力上限
+PROJECTS_PER_DOMAIN = 1
+
 DOWNLOAD_DELAY = 1
 RANDOMIZE_DOWNLOAD_DELAY = 0.5
 
 COOKIES_ENABLED = True
 
+# HTML解析后端：'html.parser'（纯 Python，最慢）/ 'lxml' / 'selectolax'（需 pip install selectolax）
+# 默认 html.parser 保持原有输出：lxml/selectolax 对不规范的HTML构建的DOM树不同，标题/内容/链接可能变化，
+# 切换前先用 benchmarks/bench_parser_backends.py 在页面语料上对比速度与输出一致性
+HTML_PARSER_BACKEND = 'html.parser'
+
+# 结构化内容提取器：'legacy'（默认）为原先按 标题->表格->段落->列表 分组、多次 find_all 的实现；
+# 'single_pass' 单次遍历 DOM、按文档顺序输出并对嵌套列表/表格去重，content 的顺序与格式不同，下游迁移后再开启
+CONTENT_EXTRACTOR = 'legacy'
+
+# 进程池解析：把原始响应字节交给工作进程完成解码、解析和标题/内容/链接提取，
+# reactor 线程不再被大页面的解析阻塞；工作进程数为 0 时使用 CPU 核数
+PARSE_PROCESS_POOL = False
+PARSE_PROCESS_POOL_WORKERS = 0
+
 TELNETCONSOLE_ENABLED = False
 
 # DEFAULT_REQUEST_HEADERS 现在由 BrowserHeadersMiddleware 动态生成
@@ -43,12 +63,125 @@ SPIDER_MIDDLEWARES = {
 
 DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
+    'program_crawler.middlewares.ProjectBudgetMiddleware': 100,
+    'program_crawler.middlewares.CoverageStopMiddleware': 110,
     'program_crawler.middlewares.RandomUserAgentMiddleware': 400,
     'program_crawler.middlewares.BrowserHeadersMiddleware': 500,
     'scrapy.downloadermiddlewares.retry.RetryMiddleware': 550,
+    'program_crawler.middlewares.AdaptiveRateMiddleware': 560,
+    'program_crawler.middlewares.CircuitBreakerMiddleware': 570,
+    'program_crawler.middlewares.ConditionalRequestMiddleware': 585,
 }
 
+# 按域名自适应限速（AdaptiveRateMiddleware）：每个域名独立估计延迟/错误率，健康时逐步提高并发
+# （上限 CONCURRENT_REQUESTS_PER_DOMAIN）并缩短间隔，429/503 时并发减半、间隔加倍并遵守 Retry-After；
+# 开启后由它接管下载间隔，AutoThrottle 不再调整这些请求。学到的速率写入 ADAPTIVE_RATE_FILE，下次运行从此开始
+ADAPTIVE_RATE_ENABLED = False
+ADAPTIVE_RATE_START_CONCURRENCY = 2
+ADAPTIVE_RATE_MIN_DELAY = 0.25
+ADAPTIVE_RATE_MAX_DELAY = 30
+# 目标平均延迟（秒）：超过时不再提高并发，超过 2 倍时降低并发
+ADAPTIVE_RATE_TARGET_LATENCY = 2.0
+# Retry-After 最长遵守时间（秒）
+ADAPTIVE_RATE_MAX_RETRY_AFTER = 300
+ADAPTIVE_RATE_FILE = 'httpcache/domain_rates.json'
+ADAPTIVE_RATE_EXPORT_INTERVAL = 60
+
+# 域名熔断（CircuitBreakerMiddleware）：同一域名连续 N 次连接失败/超时后，冷却期内发往该域名的请求
+# 直接失败（不再等待 DOWNLOAD_TIMEOUT 与重试）；冷却后只放行一个探测请求，失败则冷却时间加倍。默认关闭
+CIRCUIT_BREAKER_ENABLED = False
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_COOLDOWN = 120
+CIRCUIT_BREAKER_MAX_COOLDOWN = 1800
+
+# 项目预算：单个项目最多爬取的墙钟时间（秒）与页面数（含根页面），0 表示不限制（默认均不启用，如 900 / 40）。
+# 超出时间预算的项目以已收集的页面立即收尾（状态 partial），剩余请求丢弃，槽位让给下一个项目；
+# 达到页面预算后不再调度新的子链接，项目正常收尾但同样标记为 partial。关闭时日志输出项目耗时分布
+PROJECT_TIME_BUDGET = 0
+PROJECT_PAGE_BUDGET = 0
+
+# 子链接打分（program_crawler/link_scoring.py）：按锚文本关键词权重（申请/截止日期/学费/课程最高，
+# project/track 等最低）与和根URL的路径相似度给子链接打分，高分先调度，分数即请求优先级。
+# LINK_COVERAGE_TOPICS：项目已成功爬取的子页面（不含根页面）覆盖了列出的全部主题后，排队中的子页面请求
+# 由 CoverageStopMiddleware 丢弃（空列表表示不启用）
+LINK_SCORING_ENABLED = True
+LINK_COVERAGE_TOPICS = ['admissions', 'deadline', 'tuition', 'curriculum']
+
+# sitemap 辅助发现（program_crawler/sitemap.py）：每个网站只请求一次 /sitemap.xml（索引文件中的子 sitemap
+# 合计最多 SITEMAP_MAX_FILES 个），按路径建立索引；项目根URL所在目录下、路径含白名单关键词的URL
+# （最多 SITEMAP_MAX_CHILDREN 个）直接作为子链接，没有匹配时回退到锚文本匹配。关闭时按网站输出两种方式的对比
+SITEMAP_DISCOVERY_ENABLED = False
+SITEMAP_MAX_FILES = 10
+SITEMAP_MAX_CHILDREN = 30
+
+# 相关性分类（program_crawler/relevance.py，需安装 joblib、scikit-learn、xgboost）：子页面的提取内容
+# 跨页面攒批（RELEVANCE_BATCH_SIZE 个或等待 RELEVANCE_BATCH_WAIT 秒）后在线程池中用 XGBoost 模型打分。
+# RELEVANCE_THRESHOLD 为 None 时使用模型包中的优化阈值；低分页面按 RELEVANCE_LOW_SCORE_ACTION 处理：
+# 'drop' 不输出，'stub' 只保留URL/标题/分数，'keep' 照常输出（只记录分数）。
+# RELEVANCE_GATE_EXPANSION：深度1页面也提取链接（子页面深度为2，受 DEPTH_LIMIT 限制），分数达到阈值的才展开
+RELEVANCE_CLASSIFIER_ENABLED = False
+RELEVANCE_MODEL_PATH = '../classifier/xgboost_classifier.joblib'
+RELEVANCE_THRESHOLD = None
+RELEVANCE_LOW_SCORE_ACTION = 'stub'
+RELEVANCE_GATE_EXPANSION = False
+RELEVANCE_BATCH_SIZE = 32
+RELEVANCE_BATCH_WAIT = 0.2
+
+# 近似重复页面（NearDuplicatePipeline，program_crawler/near_duplicate.py）：页面正文的 64 位 SimHash 与已出现页面的
+# 汉明距离不超过 NEAR_DUPLICATE_MAX_DISTANCE 时，只保存指向规范页面的 duplicate_of 指针，不再保存正文。
+# NEAR_DUPLICATE_SCOPE：'crawl' 整个爬取范围（指针可能指向其他项目的输出）或 'project' 只在项目内部；
+# 正文少于 NEAR_DUPLICATE_MIN_LENGTH 个字符的页面不参与。节省的字节见 output/_near_duplicates/report_*.json
+NEAR_DUPLICATE_ENABLED = False
+NEAR_DUPLICATE_SCOPE = 'crawl'
+NEAR_DUPLICATE_MAX_DISTANCE = 5
+NEAR_DUPLICATE_MIN_LENGTH = 200
+
+# 条件请求缓存：保存每个URL的 ETag/Last-Modified 与提取结果，重新爬取时发送 If-None-Match /
+# If-Modified-Since，304 直接复用提取结果（不下载正文、不解析）。默认关闭：开启后修改解析/提取代码不会
+# 影响服务器返回 304 的页面，需要删除缓存文件后重新爬取
+HTTP_CONDITIONAL_CACHE_ENABLED = False
+HTTP_CONDITIONAL_CACHE_DB = 'httpcache/conditional_cache.sqlite'
+
+# 增量模式：保存每个页面的规范化正文哈希，哈希未变的页面跳过解析；页面集合与内容都未变的项目
+# 标记为 unchanged，不重写输出，有变化的项目记录到 output/_delta/delta_*.jsonl
+INCREMENTAL_MODE = False
+INCREMENTAL_STATE_DB = 'httpcache/incremental_state.sqlite'
+
+# 输出模式：'project' 项目完成时输出包含全部页面的 JSON；
+# 'stream' 每解析一个页面就追加到 {项目}.pages.jsonl，项目完成时只写摘要 JSON，爬虫内存不随页面数增长
+OUTPUT_MODE = 'project'
+
+# 跨项目共享页面库：同一大学不同项目链接到的相同子页面（招生/学费/FAQ等）只下载、解析一次，
+# 其他项目直接引用；值为最多保存的页面数（0 关闭，默认关闭；如 2000），节省量记录在 stats shared_pages/requests_avoided、bytes_avoided
+SHARED_PAGE_CACHE_SIZE = 0
+
+# 子链接正则URL黑名单（url_filter.URL_BLACKLIST_PATTERNS，导入时预编译）：开启后先按规则过滤再匹配白名单；
+# URL_FILTER_CACHE_SIZE 为每个 host 缓存的最近判定数（0 关闭缓存），命中的规则计入 stats url_filter/regex_rule/<下标>
+URL_FILTER_USE_REGEX = False
+URL_FILTER_CACHE_SIZE = 1024
+
+# 爬取状态文件（status_log/crawl_status_*.json）写盘频率：每累计 N 个项目或每隔 T 秒写一次
+CRAWL_STATUS_FLUSH_ITEMS = 50
+CRAWL_STATUS_FLUSH_INTERVAL = 30
+
+# 扇出映射（plan_crawl.py 生成的 {计划CSV名}.fanout.json）：项目结果额外复制给引用同一根URL的项目；
+# run_crawler.py 会自动使用与CSV同名的映射文件
+FANOUT_MAP_FILE = None
+
+# 输出与日志目录：OUTPUT_DIR 为项目JSON输出目录；FAILURE_LOG_DIR / STATUS_LOG_DIR 为空时使用 crawl/log 与 crawl/status_log。
+# shard_launcher.py 生成的分片任务通过 run_crawler.py --run-dir 为每个分片指定独立目录，避免多个节点写同一文件
+OUTPUT_DIR = 'output'
+FAILURE_LOG_DIR = None
+STATUS_LOG_DIR = None
+
+# 爬取断点：已完成/进行中的项目实时写入 checkpoints/{CSV文件名}.jsonl（CHECKPOINT_FILE 可指定路径），
+# 崩溃后重新运行同一CSV会跳过已完成的项目并优先重爬中断的项目；正常结束后自动删除断点。
+# 默认关闭（重新运行同一CSV会重爬全部项目），需要续爬时开启
+CHECKPOINT_ENABLED = False
+CHECKPOINT_FILE = None
+
 ITEM_PIPELINES = {
+    'program_crawler.pipelines.NearDuplicatePipeline': 200,
     'program_crawler.pipelines.JsonWriterPipeline': 300,
 }
 
@@ -0,0 +1,14 @@
+"""
+自定义信号
+
+ProgramSpider 在项目收尾（计数器归零、Item 已交给管道）后通过
+``crawler.signals.send_catch_log`` 发送以下信号，扩展/管道可用
+``crawler.signals.connect(handler, signal=project_completed)`` 订阅。
+
+project_completed 参数：
+    spider: 当前 Spider 实例
+    project_id (str): 项目ID
+    item (ProgramPageItem): 项目汇总 Item
+"""
+
+project_completed = object()
@@ -0,0 +1,226 @@
+"""
+Sitemap 辅助的子链接发现（settings.SITEMAP_DISCOVERY_ENABLED）
+
+很多大学网站的 /sitemap.xml 列出了全部项目页与招生页。原来每个项目都要解析根页面、
+靠锚文本关键词猜测子链接，锚文本不含关键词（如 "Learn more"）的页面就会漏掉。
+
+流程：
+1. 每个网站（scheme + host）只在第一个项目启动时请求一次 /sitemap.xml；sitemap 索引文件
+   中的子 sitemap 最多再请求 SITEMAP_MAX_FILES 个，结果在本次爬取中缓存
+2. 同一网站的项目等待 sitemap 解析完成（或失败）后再请求根页面
+3. sitemap 中的URL按路径排序建立索引；项目根URL所在目录作为路径前缀，二分查找得到
+   该目录下的全部URL，路径中含白名单关键词的作为根页面的子链接（不再从根页面提取锚文本链接）
+4. sitemap 不存在、或前缀下没有匹配的URL时，回退到原来的锚文本匹配
+
+每个网站分别统计经 sitemap / 锚文本发现子链接的项目数、平均页面数、平均耗时与主题覆盖率，
+爬虫关闭时输出，用于比较两种方式的吞吐与覆盖度。
+"""
+
+import bisect
+import gzip
+import html
+import re
+from urllib.parse import urlsplit
+
+from .url_filter import get_matched_whitelist_keyword
+
+PENDING = 'pending'
+READY = 'ready'
+MISSING = 'missing'
+
+_LOC_PATTERN = re.compile(rb'<(?:\w+:)?loc>\s*(.*?)\s*</(?:\w+:)?loc>', re.S | re.I)
+_SITEMAP_INDEX_PATTERN = re.compile(rb'<(?:\w+:)?sitemapindex[\s>]', re.I)
+_WORD_SEPARATORS = re.compile(r'(?:[-_/.+]|%20)+')
+_FILE_EXTENSION = re.compile(r'\.[a-z0-9]{1,5}$')
+
+
+def site_key(url):
+    """网站键：scheme://host（sitemap 按主机提供）"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc.lower()}"
+
+
+def parse_sitemap(body):
+    """
+    解析 sitemap / sitemap 索引（支持 gzip 压缩的 .xml.gz）
+
+    Returns:
+        tuple: (页面URL列表, 子sitemap URL列表)
+    """
+    if body[:2] == b'\x1f\x8b':
+        body = gzip.decompress(body)
+    locs = [html.unescape(loc.decode('utf-8', 'replace')) for loc in _LOC_PATTERN.findall(body)]
+    if _SITEMAP_INDEX_PATTERN.search(body[:2048]):
+        return [], locs
+    return locs, []
+
+
+def path_prefix(root_url):
+    """根URL所在目录（以 / 结尾）；根URL为站点首页时返回 None（前缀覆盖整个网站，没有意义）"""
+    path = urlsplit(root_url).path.lower()
+    if not path.endswith('/'):
+        last_segment = path.rsplit('/', 1)[-1]
+        path = path.rsplit('/', 1)[0] + '/' if '.' in last_segment else path + '/'
+    return None if path == '/' else path
+
+
+def path_anchor_text(relative_path):
+    """把相对路径转为可做关键词匹配的伪锚文本：admissions/entry-requirements -> 'admissions entry requirements'"""
+    return _WORD_SEPARATORS.sub(' ', _FILE_EXTENSION.sub('', relative_path)).strip()
+
+
+class SiteSitemap:
+    """单个网站的 sitemap 状态与路径索引"""
+
+    __slots__ = ('state', 'pending_files', 'files', 'urls', 'paths', 'waiters', 'projects')
+
+    def __init__(self):
+        self.state = PENDING
+        self.pending_files = 0   # 尚未返回的 sitemap 请求数
+        self.files = 0           # 已请求的 sitemap 文件数
+        self.urls = {}           # 路径(小写) -> URL
+        self.paths = []          # 排序后的路径，用于前缀二分查找
+        self.waiters = []        # 等待 sitemap 的项目ID
+        # 按发现方式统计的项目：{'sitemap' / 'anchor': {'projects', 'pages', 'seconds', 'covered'}}
+        self.projects = {}
+
+
+class SitemapIndex:
+    """
+    本次爬取的各网站 sitemap（只在 reactor 线程中使用）
+
+    Args:
+        max_files (int): 每个网站最多请求的 sitemap 文件数（含 /sitemap.xml 本身）
+        max_children (int): 每个项目最多从 sitemap 取多少个子链接
+    """
+
+    def __init__(self, max_files=10, max_children=30):
+        self.max_files = max_files
+        self.max_children = max_children
+        self.sites = {}
+
+    def get(self, site):
+        return self.sites.get(site)
+
+    def add_waiter(self, site, project_id):
+        """
+        项目等待网站的 sitemap
+
+        Returns:
+            bool: True 表示该网站第一次出现，调用方需要发出 /sitemap.xml 请求
+        """
+        entry = self.sites.get(site)
+        is_new = entry is None
+        if is_new:
+            entry = self.sites[site] = SiteSitemap()
+            entry.pending_files = 1
+            entry.files = 1
+        entry.waiters.append(project_id)
+        return is_new
+
+    def is_resolved(self, site):
+        entry = self.sites.get(site)
+        return entry is not None and entry.state != PENDING
+
+    def add_file(self, site, body):
+        """
+        记录一个 sitemap 文件的解析结果
+
+        Returns:
+            list: 需要继续请求的子 sitemap URL
+        """
+        entry = self.sites[site]
+        entry.pending_files -= 1
+        try:
+            urls, child_sitemaps = parse_sitemap(body)
+        except (OSError, EOFError, ValueError):
+            return []
+        for url in urls:
+            entry.urls.setdefault(urlsplit(url).path.lower(), url)
+        child_sitemaps = child_sitemaps[:max(0, self.max_files - entry.files)]
+        entry.files += len(child_sitemaps)
+        entry.pending_files += len(child_sitemaps)
+        return child_sitemaps
+
+    def file_failed(self, site):
+        self.sites[site].pending_files -= 1
+
+    def resolve_if_done(self, site):
+        """
+        所有 sitemap 文件都已返回时建立路径索引
+
+        Returns:
+            list | None: 等待的项目ID；仍有文件未返回时返回 None
+        """
+        entry = self.sites[site]
+        if entry.pending_files > 0:
+            return None
+        entry.paths = sorted(entry.urls)
+        entry.state = READY if entry.paths else MISSING
+        waiters, entry.waiters = entry.waiters, []
+        return waiters
+
+    def children(self, root_url):
+        """
+        根URL所在目录下、路径含白名单关键词的 sitemap URL
+
+        Returns:
+            list: extract_anchor_links 格式的链接 [{"url", "anchor_text", "matched_keyword"}, ...]，
+                  浅层路径优先；没有 sitemap 或没有匹配时返回空列表
+        """
+        entry = self.sites.get(site_key(root_url))
+        prefix = path_prefix(root_url)
+        if entry is None or entry.state != READY or prefix is None:
+            return []
+        root_path = urlsplit(root_url).path.lower().rstrip('/')
+
+        start = bisect.bisect_left(entry.paths, prefix)
+        candidates = []
+        for path in entry.paths[start:]:
+            if not path.startswith(prefix):
+                break
+            if path.rstrip('/') == root_path:
+                continue
+            relative_path = path[len(prefix):].strip('/')
+            anchor_text = path_anchor_text(relative_path)
+            matched_keyword = get_matched_whitelist_keyword(anchor_text)
+            if matched_keyword:
+                candidates.append((relative_path.count('/'), path, {
+                    "url": entry.urls[path],
+                    "anchor_text": anchor_text,
+                    "matched_keyword": matched_keyword,
+                }))
+        candidates.sort(key=lambda candidate: candidate[:2])
+        return [link for _depth, _path, link in candidates[:self.max_children]]
+
+    def record_project(self, site, method, pages, seconds, covered):
+        """记录一个已完成项目（method 为 'sitemap' 或 'anchor'），用于按网站比较两种发现方式"""
+        entry = self.sites.get(site)
+        if entry is None:
+            return
+        summary = entry.projects.setdefault(method, {'projects': 0, 'pages': 0, 'seconds': 0.0, 'covered': 0.0})
+        summary['projects'] += 1
+        summary['pages'] += pages
+        summary['seconds'] += seconds
+        summary['covered'] += covered
+
+    def report(self):
+        """
+        各网站的对比结果
+
+        Returns:
+            list[dict]: 每个网站一项：sitemap URL 数，以及两种方式各自的项目数/平均页面数/平均耗时/平均主题覆盖率
+        """
+        rows = []
+        for site, entry in sorted(self.sites.items()):
+            row = {'site': site, 'state': entry.state, 'sitemap_urls': len(entry.paths)}
+            for method, summary in entry.projects.items():
+                projects = summary['projects']
+                row[method] = {
+                    'projects': projects,
+                    'avg_pages': round(summary['pages'] / projects, 1),
+                    'avg_seconds': round(summary['seconds'] / projects, 1),
+                    'avg_coverage': round(summary['covered'] / projects, 2),
+                }
+            rows.append(row)
+        return rows
@@ -1,28 +1,66 @@
 import scrapy
 import csv
 import os
+import time
+from collections import Counter
 from datetime import datetime
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
 import re
 from scrapy import signals
 from scrapy.exceptions import DontCloseSpider
-from ..url_filter import filter_url
-from ..items import ProgramPageItem
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from twisted.internet import defer
+from scrapy.utils.defer import maybe_deferred_to_future
+from ..url_filter import (
+    URL_BLACKLIST_PATTERNS,
+    UrlVerdictCache,
+    filter_url,
+    get_matched_blacklist_rule,
+    get_matched_whitelist_keyword,
+)
+from ..html_parsing import check_parser_backend, make_soup
+from ..content_extraction import (
+    CONTENT_EXTRACTORS,
+    extract_anchor_links,
+    extract_clean_table_html,
+    extract_page_from_body,
+    extract_structured_content,
+    extract_structured_content_legacy,
+    extract_structured_headings,
+    extract_structured_tables,
+    extract_structured_text_elements,
+    extract_title,
+    is_valid_link,
+)
+from ..items import ProgramPageItem, ProgramPageRecordItem
+from ..link_scoring import TOPIC_KEYWORDS, CoverageReached, page_topics, score_link
+from ..relevance import LOW_SCORE_ACTIONS, RelevanceBatcher, RelevanceClassifier
+from ..sitemap import SitemapIndex, site_key
+from ..signals import project_completed
+from ..failure_journal import FailureJournal, split_source_file
+from ..page_store import SharedPageStore, canonical_page_url
+from ..http_cache import ConditionalCacheStore
+from ..incremental import IncrementalStateStore, normalized_content_hash, page_digest, project_fingerprint
+from ..checkpoint import CrawlCheckpoint
+from ..circuit_breaker import DomainCircuitOpen
 
 # =============================================================================
 # ProgramSpider — GradPilot 定制爬虫
 # -----------------------------------------------------------------------------
 # 功能概览
-#   1. 逐个“项目(project)”顺序爬取：每个项目代表一条 CSV 记录（包含 UUID、项目
+#   1. 按“项目(project)”调度爬取：每个项目代表一条 CSV 记录（包含 UUID、项目
 #      名称、根 URL 等）。根页面 + 同域名且锚文本/URL 包含白名单关键词的若干子
 #      页面（深度≤1）会被抓取。
-#   2. 手动请求计数(request_counters) + spider_idle 信号：避免同时调度成百上千个
-#      请求导致 DEPTH_LIMIT 或并发压力；当前项目全部完成后再启动下一个项目。
+#   2. 手动请求计数(request_counters) + 项目槽位：同时保持 CONCURRENT_PROJECTS 个
+#      项目在爬取中，项目按域名交错启动（同一域名最多 PROJECTS_PER_DOMAIN 个），
+#      某个项目完成后立即补位；spider_idle 作为兜底调度。
 #   3. 全局去重策略：使用 per-project 的 seen_urls 集合自行去重，并统一给所有新的
 #      Request 加 `dont_filter=True`，从而保证 “计数器 == 实际排队请求数”。
 #   4. 稳健的错误处理：errback → handle_error() 会即时递减计数并在计数归零时直接
-#      调用 complete_project()，保证无论成功还是失败都能正确收尾并解锁下一个项目。
+#      调用 complete_project()，保证无论成功还是失败都能正确收尾并释放项目槽位。
+#   5. 事件驱动收尾：只在计数器归零时收尾（不再 sleep 阻塞 reactor），收尾后发送
+#      project_completed 信号，供扩展/管道订阅。
 #
 # 维护者须知
 #   • 如果要修改链接白名单，请查看 crawl/program_crawler/url_filter.py
@@ -32,6 +70,10 @@ from ..items import ProgramPageItem
 # =============================================================================
 
 
+# 可选的输出模式
+OUTPUT_MODES = ('project', 'stream')
+
+
 class ProgramSpider(scrapy.Spider):
     name = 'program_spider'
     allowed_domains = []
@@ -45,6 +87,89 @@ class ProgramSpider(scrapy.Spider):
             kwargs['csv_file'] = urls_file
             
         spider = super(ProgramSpider, cls).from_crawler(crawler, *args, **kwargs)
+        # 多项目并发调度参数（默认 1 即保持逐个项目顺序爬取）
+        spider.max_concurrent_projects = max(1, crawler.settings.getint('CONCURRENT_PROJECTS', 1))
+        spider.projects_per_domain = max(1, crawler.settings.getint('PROJECTS_PER_DOMAIN', 1))
+        # HTML解析后端（html.parser / lxml / selectolax），启动时即校验依赖是否可用
+        spider.html_parser_backend = crawler.settings.get('HTML_PARSER_BACKEND', 'html.parser')
+        check_parser_backend(spider.html_parser_backend)
+        # 结构化内容提取器：single_pass（单次遍历、文档顺序、嵌套去重）或 legacy
+        spider.content_extractor = crawler.settings.get('CONTENT_EXTRACTOR', 'legacy')
+        if spider.content_extractor not in CONTENT_EXTRACTORS:
+            raise ValueError(f"未知的 CONTENT_EXTRACTOR: {spider.content_extractor}，可选: {', '.join(CONTENT_EXTRACTORS)}")
+        # 输出模式：project 为每个项目输出一个完整 JSON；stream 为逐页追加 JSONL + 项目摘要
+        spider.output_mode = crawler.settings.get('OUTPUT_MODE', 'project')
+        if spider.output_mode not in OUTPUT_MODES:
+            raise ValueError(f"未知的 OUTPUT_MODE: {spider.output_mode}，可选: {', '.join(OUTPUT_MODES)}")
+        # 进程池解析：HTML解码/解析/提取放到子进程执行，reactor 线程只负责下载与调度
+        if crawler.settings.getbool('PARSE_PROCESS_POOL', False):
+            spider.parse_pool_workers = crawler.settings.getint('PARSE_PROCESS_POOL_WORKERS', 0) or os.cpu_count() or 1
+            # 使用 spawn 启动子进程，避免在已运行 reactor 线程的进程中 fork
+            spider.parse_pool = ProcessPoolExecutor(
+                max_workers=spider.parse_pool_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            spider.logger.info(f"已启用进程池解析，工作进程数: {spider.parse_pool_workers}")
+        # 正则URL黑名单（预编译合并规则 + 按 host 的 LRU 判定缓存），默认关闭
+        spider.url_filter_use_regex = crawler.settings.getbool('URL_FILTER_USE_REGEX', False)
+        cache_size = crawler.settings.getint('URL_FILTER_CACHE_SIZE', 0)
+        if spider.url_filter_use_regex and cache_size > 0:
+            spider.url_verdict_cache = UrlVerdictCache(per_host=cache_size)
+        # 跨项目共享页面库：同一子页面只下载、解析一次，其他项目直接引用
+        shared_page_cache_size = crawler.settings.getint('SHARED_PAGE_CACHE_SIZE', 0)
+        if shared_page_cache_size > 0:
+            spider.shared_pages = SharedPageStore(max_pages=shared_page_cache_size)
+        # 条件请求缓存：保存 ETag/Last-Modified 与提取结果，重新爬取时 304 直接复用
+        if crawler.settings.getbool('HTTP_CONDITIONAL_CACHE_ENABLED', False):
+            spider.http_cache = ConditionalCacheStore.shared(
+                crawler.settings.get('HTTP_CONDITIONAL_CACHE_DB', 'httpcache/conditional_cache.sqlite'))
+        # 增量模式：正文哈希未变的页面跳过解析，所有页面都未变的项目标记为 unchanged
+        if crawler.settings.getbool('INCREMENTAL_MODE', False):
+            spider.incremental_state = IncrementalStateStore.shared(
+                crawler.settings.get('INCREMENTAL_STATE_DB', 'httpcache/incremental_state.sqlite'))
+        # 失败URL日志目录（分片运行时每个分片使用独立目录），默认 crawl/log；设置确定后只创建、加载一次
+        failure_log_dir = crawler.settings.get('FAILURE_LOG_DIR') or os.path.join(spider.crawl_dir, 'log')
+        spider.failure_journal = FailureJournal(failure_log_dir)
+        spider.preload_failure_journal()
+        # 项目预算：单个项目的墙钟时间（秒）与页面数上限，超出后以 partial 收尾（0 表示不限制）
+        spider.project_time_budget = crawler.settings.getfloat('PROJECT_TIME_BUDGET', 0)
+        spider.project_page_budget = crawler.settings.getint('PROJECT_PAGE_BUDGET', 0)
+        if spider.project_time_budget > 0:
+            crawler.signals.connect(spider.start_budget_timer, signal=signals.spider_opened)
+        # 子链接打分：按锚文本关键词权重与路径相似度排序并设置请求优先级；
+        # 项目已覆盖 LINK_COVERAGE_TOPICS 中的全部主题后不再调度新的子链接
+        spider.link_scoring = crawler.settings.getbool('LINK_SCORING_ENABLED', False)
+        spider.coverage_topics = frozenset(crawler.settings.getlist('LINK_COVERAGE_TOPICS', []))
+        # sitemap 辅助发现：每个网站请求一次 /sitemap.xml，按根URL路径前缀为项目提供子链接
+        if crawler.settings.getbool('SITEMAP_DISCOVERY_ENABLED', False):
+            spider.sitemaps = SitemapIndex(
+                max_files=crawler.settings.getint('SITEMAP_MAX_FILES', 10),
+                max_children=crawler.settings.getint('SITEMAP_MAX_CHILDREN', 30),
+            )
+        # 相关性分类：子页面内容跨页面攒批交给 XGBoost 模型打分，低分页面丢弃/存根，可选地不再展开
+        if crawler.settings.getbool('RELEVANCE_CLASSIFIER_ENABLED', False):
+            spider.relevance_action = crawler.settings.get('RELEVANCE_LOW_SCORE_ACTION', 'stub')
+            if spider.relevance_action not in LOW_SCORE_ACTIONS:
+                raise ValueError(
+                    f"未知的 RELEVANCE_LOW_SCORE_ACTION: {spider.relevance_action}，可选: {', '.join(LOW_SCORE_ACTIONS)}")
+            threshold = crawler.settings.get('RELEVANCE_THRESHOLD')
+            classifier = RelevanceClassifier(
+                crawler.settings.get('RELEVANCE_MODEL_PATH', '../classifier/xgboost_classifier.joblib'),
+                threshold=float(threshold) if threshold is not None else None)
+            spider.relevance_threshold = classifier.threshold
+            spider.relevance_gate_expansion = crawler.settings.getbool('RELEVANCE_GATE_EXPANSION', False)
+            spider.relevance_batcher = RelevanceBatcher(
+                classifier,
+                batch_size=crawler.settings.getint('RELEVANCE_BATCH_SIZE', 32),
+                max_wait=crawler.settings.getfloat('RELEVANCE_BATCH_WAIT', 0.2),
+            )
+            spider.logger.info(
+                f"已启用相关性分类: {classifier.model_name}，阈值 {classifier.threshold:.3f}，"
+                f"低分页面 {spider.relevance_action}，按分数决定是否展开: {spider.relevance_gate_expansion}")
+        # 爬取断点：跳过已完成的项目，崩溃时正在爬取的项目优先重爬
+        if crawler.settings.getbool('CHECKPOINT_ENABLED', False):
+            spider.apply_checkpoint(crawler.settings.get('CHECKPOINT_FILE'))
+            crawler.signals.connect(spider.checkpoint_project_done, signal=project_completed)
         crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
         return spider
     
@@ -52,17 +177,53 @@ class ProgramSpider(scrapy.Spider):
         super(ProgramSpider, self).__init__(*args, **kwargs)
         
         self.csv_file = csv_file
-        self.start_index = int(start_index)  # 支持从指定索引开始
+        # 实例属性：同一进程中运行多个爬虫（run_crawler.py 多CSV模式）时互不影响
+        self.allowed_domains = []
+        self.start_index = int(start_index)  # 支持从指定索引开始（崩溃续爬由 CHECKPOINT_ENABLED 的断点完成）
         self.project_queue = []
-        self.current_project = None
-        self.current_project_id = None
         self.request_counters = {}
         self.project_data = {}
         
+        # 多项目并发调度状态：正在爬取的项目 + 各域名的活跃项目数
+        self.max_concurrent_projects = 1
+        self.projects_per_domain = 1
+        self.html_parser_backend = 'html.parser'
+        self.content_extractor = 'legacy'
+        self.output_mode = 'project'
+        self.parse_pool_workers = 0  # 0 表示在 reactor 线程中解析
+        self.parse_pool = None
+        self.url_filter_use_regex = False
+        self.url_verdict_cache = None
+        self.shared_pages = None
+        self.http_cache = None
+        self.incremental_state = None
+        self.checkpoint = None
+        self.project_time_budget = 0
+        self.project_page_budget = 0
+        self.budget_task = None
+        # 因超出时间预算提前收尾的项目 -> 尚未返回的请求数；排队中的请求由 ProjectBudgetMiddleware 丢弃，全部返回后移除
+        self.cut_off_projects = {}
+        self.project_durations = []    # 各项目耗时（秒），关闭时输出分布
+        self.link_scoring = False
+        self.coverage_topics = frozenset()
+        self.covered_projects = set()  # 已覆盖全部主题的项目，排队中的子页面请求由 CoverageStopMiddleware 丢弃
+        self.relevance_batcher = None
+        self.relevance_action = 'keep'
+        self.relevance_threshold = 0.0
+        self.relevance_gate_expansion = False
+        self.sitemaps = None
+        self.active_projects = {}
+        self.active_domains = Counter()
+        
         self.total_projects = 0
         self.completed_projects = 0
         self.failed_projects = 0
-        self.is_processing_project = False
+        self._completed_projects = set()  # 已收尾的项目ID，避免重复输出
+        
+        # 失败URL追加式日志：log/{学科}/failed_urls_{来源文件}.jsonl
+        # __file__ = .../crawl/program_crawler/spiders/program_spider.py，向上三级到达crawl目录
+        self.crawl_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        self.failure_journal = None  # 由 from_crawler 按 FAILURE_LOG_DIR 创建
         
         self.load_projects()
         
@@ -89,9 +250,10 @@ class ProgramSpider(scrapy.Spider):
                         'url': row['program_url'],
                         'source_file': row['source_file']
                     }
+                    domain = urlparse(project['url']).netloc
+                    project['domain'] = domain
                     all_projects.append(project)
                     
-                    domain = urlparse(project['url']).netloc
                     if domain not in self.allowed_domains:
                         self.allowed_domains.append(domain)
                 
@@ -107,7 +269,6 @@ class ProgramSpider(scrapy.Spider):
                 self.logger.info(f"从索引 {self.start_index} 开始，跳过了 {self.start_index} 个项目")
             self.logger.info(f"将要爬取 {self.total_projects} 个项目")
             self.logger.info(f"允许的域名: {self.allowed_domains}")
-            self.logger.info("将按顺序逐个项目进行爬取")
             self.logger.info("="*80)
             
         except Exception as e:
@@ -118,52 +279,127 @@ class ProgramSpider(scrapy.Spider):
             # 不要继续运行，确保问题被发现
             raise RuntimeError(f"CSV文件加载失败，无法继续: {e}")
             
+    def preload_failure_journal(self):
+        """启动时一次性加载各来源文件已有的失败URL（去重索引），运行中不再读取日志文件"""
+        for source_file in {project['source_file'] for project in self.project_queue}:
+            self.failure_journal.load(source_file)
+    
+    def apply_checkpoint(self, checkpoint_file=None):
+        """
+        加载爬取断点并调整项目队列：跳过已完成的项目，进行中的项目移到队列最前面
+        
+        Args:
+            checkpoint_file (str): 断点文件路径，默认 checkpoints/{CSV文件名}.jsonl
+        """
+        if not checkpoint_file:
+            csv_basename = os.path.splitext(os.path.basename(str(self.csv_file)))[0]
+            checkpoint_file = os.path.join(self.crawl_dir, 'checkpoints', f'{csv_basename}.jsonl')
+        self.checkpoint = CrawlCheckpoint(checkpoint_file)
+        completed, in_flight = self.checkpoint.load()
+        if not completed and not in_flight:
+            return
+        
+        retry, pending = [], []
+        skipped = 0
+        for project in self.project_queue:
+            key = (project['id'], project['source_file'])
+            if key in completed:
+                skipped += 1
+            elif key in in_flight:
+                retry.append(project)
+            else:
+                pending.append(project)
+        self.project_queue = retry + pending
+        self.completed_projects += skipped  # 断点中已完成的项目算作已完成
+        
+        self.logger.info(f"从断点续爬: {checkpoint_file}")
+        self.logger.info(f"跳过已完成项目 {skipped} 个，重新爬取中断的项目 {len(retry)} 个，剩余 {len(pending)} 个")
+    
+    def checkpoint_project_done(self, spider, project_id, item):
+        """project_completed 信号处理器：把收尾的项目写入断点"""
+        if spider is self and self.checkpoint is not None:
+            self.checkpoint.mark_done(project_id, item['source_file'])
+    
     def start_requests(self):
-        """开始第一个项目的爬取，其他项目将在前一个完成后依次启动"""
+        """填满项目槽位，其余项目将在已有项目完成后依次补位启动"""
+        # 在 from_crawler 应用 CONCURRENT_PROJECTS 之后输出（load_projects 运行时仍是默认值）
+        self.logger.info(f"将按域名交错调度项目，最多同时爬取 {self.max_concurrent_projects} 个项目")
         if self.project_queue:
-            for request in self.start_next_project():
+            for request in self.start_next_projects():
                 yield request
         return
             
-    def start_next_project(self):
-        """启动下一个项目的爬取"""
-        if not self.project_queue:
-            self.logger.info("\n" + "="*50)
-            self.logger.info("所有项目已完成")
-            self.logger.info("="*50)
-            return []
-            
-        if self.is_processing_project:
-            self.logger.warning("当前正在处理项目，跳过启动新项目")
-            return []
-            
-        self.current_project = self.project_queue.pop(0)
-        project_id = self.current_project['id']
-        self.current_project_id = project_id
-        self.is_processing_project = True
+    def start_next_projects(self):
+        """在空闲的项目槽位中启动新项目，返回各项目根页面请求"""
+        while len(self.active_projects) < self.max_concurrent_projects:
+            if not self.project_queue:
+                if not self.active_projects:
+                    self.logger.info("\n" + "="*50)
+                    self.logger.info("所有项目已完成")
+                    self.logger.info("="*50)
+                return
+            
+            project = self._pop_next_project()
+            if project is None:
+                # 队列中剩余项目所在域名均已达到并发上限，等待已有项目完成
+                self.logger.debug(f"剩余 {len(self.project_queue)} 个项目的域名均在爬取中，等待空闲槽位")
+                return
+            
+            yield from self.start_project(project)
+    
+    def _pop_next_project(self):
+        """按队列顺序取出第一个域名未达到 PROJECTS_PER_DOMAIN 上限的项目，实现跨域名交错"""
+        for index, project in enumerate(self.project_queue):
+            if self.active_domains[project['domain']] < self.projects_per_domain:
+                return self.project_queue.pop(index)
+        return None
+    
+    def _schedule_next_projects(self):
+        """在回调/信号处理器中补位启动项目：直接交给 engine 调度，避免深度叠加导致的 DEPTH_LIMIT 丢包"""
+        scheduled = 0
+        for request in self.start_next_projects():
+            # Scrapy ≥2.9 的 crawl 只接受 request 参数
+            self.crawler.engine.crawl(request)
+            scheduled += 1
+        return scheduled
+            
+    def start_project(self, project):
+        """启动指定项目的爬取"""
+        project_id = project['id']
+        self.active_projects[project_id] = project
+        self.active_domains[project['domain']] += 1
         
         self.request_counters[project_id] = 0
         self.project_data[project_id] = {
             'project_id': project_id,
-            'program_name': self.current_project['name'],
-            'source_file': self.current_project['source_file'],
-            'root_url': self.current_project['url'],
+            'program_name': project['name'],
+            'source_file': project['source_file'],
+            'root_url': project['url'],
             'crawl_time': datetime.now().isoformat(),
             'pages': [],
+            'page_count': 0,  # 已记录页面数（stream 模式下 pages 不累积）
             'total_pages': 0,
             'successful_pages': 0,
             'failed_pages': 0,
             'status': 'crawling',
-            'seen_urls': set([self.current_project['url']])  # 记录已调度的 URL，避免重复
+            'started_at': time.monotonic(),
+            'scheduled_pages': 1,       # 已调度的页面数（含根页面），用于页面预算
+            'budget_exceeded': None,    # 超出的预算：'time' / 'pages'
+            'covered_topics': set(),    # 已成功爬取的页面覆盖的主题（LINK_COVERAGE_TOPICS）
+            'page_digests': [],  # 增量模式：[(页面URL, 页面摘要), ...]，用于计算项目指纹
+            'seen_urls': set([project['url']])  # 记录已调度的 URL，避免重复
         }
         
+        if self.checkpoint is not None:
+            self.checkpoint.mark_started(project_id, project['source_file'])
+        
         # 更清晰的项目开始日志
         self.logger.info("\n" + "="*80)
-        self.logger.info(f"开始爬取项目 [{self.completed_projects + 1}/{self.total_projects}]")
-        self.logger.info(f"项目名称: {self.current_project['name']}")
+        self.logger.info(f"开始爬取项目 [{self.completed_projects + len(self.active_projects)}/{self.total_projects}]")
+        self.logger.info(f"项目名称: {project['name']}")
         self.logger.info(f"项目ID: {project_id}")
-        self.logger.info(f"根URL: {self.current_project['url']}")
-        self.logger.info(f"剩余项目数: {len(self.project_queue)}")
+        self.logger.info(f"根URL: {project['url']}")
+        self.logger.info(f"剩余项目数: {len(self.project_queue)}, 活跃项目数: {len(self.active_projects)}")
         self.logger.info("="*80)
         
         old_count = self.request_counters[project_id]
@@ -171,161 +407,453 @@ class ProgramSpider(scrapy.Spider):
         self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 启动根页面请求")
         
         # 验证URL有效性
-        url = self.current_project['url']
+        url = project['url']
         if not url or url.strip() in ['暂无', 'N/A', 'None', ''] or not url.startswith(('http://', 'https://')):
             self.logger.warning(f"[{project_id}] 跳过无效URL: {url}")
-            # 先减少计数器，然后完成项目
+            # 先减少计数器，然后完成项目（释放槽位，由调用方继续启动后续项目）
             self.request_counters[project_id] -= 1
             self._complete_project_sync(project_id)  # 同步完成项目，不yield Item
-            # 继续处理下一个项目
-            if self.project_queue:
-                yield from self.start_next_project()
             return
         
-        request = scrapy.Request(
+        if self.sitemaps is not None:
+            site = site_key(url)
+            if not self.sitemaps.is_resolved(site):
+                # 等该网站的 sitemap 解析完成后再请求根页面；网站的第一个项目负责请求 /sitemap.xml
+                if self.sitemaps.add_waiter(site, project_id):
+                    yield self._make_sitemap_request(f"{site}/sitemap.xml", site)
+                return
+            self._apply_sitemap_links(project_id)
+        
+        # 根页面的深度为0，避免深度限制问题
+        yield self._make_page_request(url, project_id, depth=0, is_root=True)
+    
+    def _make_sitemap_request(self, url, site):
+        """sitemap 请求：不计入项目计数器，不重试（失败时回退到锚文本匹配，不拖慢等待的项目）"""
+        return scrapy.Request(
             url=url,
-            callback=self.parse_page,
-            errback=self.handle_error,
-            meta={
-                'project_id': project_id,
-                'depth': 0,
-                'is_root': True,
-                'cookiejar': project_id,
-            },
-            dont_filter=True  # 避免全局去重影响计数
+            callback=self.parse_sitemap,
+            errback=self.sitemap_failed,
+            meta={'sitemap_site': site, 'dont_retry': True},
+            priority=100,
+            dont_filter=True
         )
-        # 重置根页面的深度为0，避免深度限制问题
-        request.meta['depth'] = 0
-        yield request
+    
+    def parse_sitemap(self, response):
+        """解析 sitemap；索引文件中的子 sitemap 直接交给 engine 调度（避免 DepthMiddleware 累加深度）"""
+        site = response.meta['sitemap_site']
+        for url in self.sitemaps.add_file(site, response.body):
+            self.crawler.engine.crawl(self._make_sitemap_request(url, site))
+        self._resolve_sitemap(site)
+    
+    def sitemap_failed(self, failure):
+        site = failure.request.meta['sitemap_site']
+        self.logger.info(f"sitemap 请求失败 {failure.request.url}: {failure.value}")
+        self.sitemaps.file_failed(site)
+        self._resolve_sitemap(site)
+    
+    def _resolve_sitemap(self, site):
+        """网站的 sitemap 全部返回后，为等待的项目计算子链接并请求根页面"""
+        waiters = self.sitemaps.resolve_if_done(site)
+        if waiters is None:
+            return
+        entry = self.sitemaps.get(site)
+        self.crawler.stats.inc_value(f'sitemap/sites_{entry.state}')
+        self.logger.info(f"sitemap {site}: {len(entry.paths)} 个URL，{len(waiters)} 个项目等待")
+        for project_id in waiters:
+            if self._is_stale(project_id, f'{site}/sitemap.xml'):
+                continue  # 等待期间已按时间预算收尾：待发的根页面请求也计入了剩余请求数，在此回收
+            self._apply_sitemap_links(project_id)
+            self.crawler.engine.crawl(self._make_page_request(
+                self.project_data[project_id]['root_url'], project_id, depth=0, is_root=True))
+    
+    def _apply_sitemap_links(self, project_id):
+        """从 sitemap 中按根URL路径前缀取子链接；没有匹配时根页面照常提取锚文本链接"""
+        project_data = self.project_data[project_id]
+        links = self.sitemaps.children(project_data['root_url'])
+        project_data['sitemap_links'] = links or None
+        if links:
+            self.crawler.stats.inc_value('sitemap/projects_sitemap')
+            self.logger.info(f"[{project_id}] sitemap 提供 {len(links)} 个子链接，根页面不再提取锚文本链接")
+        else:
+            self.crawler.stats.inc_value('sitemap/projects_anchor')
         
-    def parse_page(self, response):
-        """解析页面内容"""
+    def _make_page_request(self, url, project_id, depth, is_root, shared_key=None, priority=0, anchor_text=None):
+        """
+        构建项目页面请求；统一加 dont_filter=True，避免 Scrapy 去重导致计数器失配
+        
+        shared_key 为共享页面库中的规范化URL，下载完成后结果会提供给等待同一页面的其他项目；
+        priority 为子链接分数（LINK_SCORING_ENABLED），anchor_text 用于判断页面覆盖的主题
+        """
+        meta = {
+            'project_id': project_id,
+            'depth': depth,
+            'is_root': is_root,
+            'cookiejar': project_id,
+        }
+        if shared_key is not None:
+            meta['shared_key'] = shared_key
+        if anchor_text:
+            meta['anchor_text'] = anchor_text
+        return scrapy.Request(
+            url=url,
+            callback=self.page_callback,
+            errback=self.handle_error,
+            meta=meta,
+            priority=priority,
+            dont_filter=True
+        )
+    
+    @property
+    def page_callback(self):
+        """页面回调：开启 PARSE_PROCESS_POOL 或相关性分类时使用异步回调，否则在 reactor 线程中同步解析"""
+        return self.parse_page_offloaded if self.parse_pool_workers or self.relevance_batcher else self.parse_page
+    
+    def _log_page_progress(self, response):
+        """在解析每个页面时输出进度信息"""
         project_id = response.meta['project_id']
         depth = response.meta.get('depth', 0)
         is_root = response.meta.get('is_root', False)
         
-        # 在解析每个页面时输出进度信息
         current_project_data = self.project_data[project_id]
         processed_pages = current_project_data['successful_pages'] + current_project_data['failed_pages']
         page_type = "根页面" if is_root else f"子页面(深度{depth})"
         
         self.logger.info(f"[{project_id}] 正在处理{page_type} (已处理{processed_pages}个页面): {response.url[:100]}{'...' if len(response.url) > 100 else ''}")
+    
+    def _should_extract_links(self, response):
+        """
+        允许根页面(is_root=True)或深度小于1的页面提取链接；子链接已由 sitemap 提供的根页面除外。
+        RELEVANCE_GATE_EXPANSION 开启时深度1页面也提取链接，是否展开由相关性分数决定（子页面深度为2）
+        """
+        if response.meta.get('is_root') and \
+                self.project_data.get(response.meta.get('project_id'), {}).get('sitemap_links'):
+            return False
+        max_depth = 2 if self.relevance_gate_expansion else 1
+        return response.meta.get('depth', 0) < max_depth or response.meta.get('is_root', False)
+        
+    def _is_stale(self, project_id, url):
+        """项目已收尾（状态已回收）时到达的响应/错误直接忽略"""
+        if project_id in self.project_data:
+            return False
+        remaining = self.cut_off_projects.get(project_id)
+        if remaining is not None:
+            # 超出时间预算提前收尾的项目：剩余请求的结果属于预期情况，全部返回后不再记录该项目
+            self.logger.debug(f"[{project_id}] 项目已按预算收尾，忽略: {url}")
+            if remaining > 1:
+                self.cut_off_projects[project_id] = remaining - 1
+            else:
+                del self.cut_off_projects[project_id]
+        else:
+            self.logger.warning(f"[{project_id}] 项目已收尾，忽略迟到的结果: {url}")
+        return True
+    
+    def start_budget_timer(self, spider):
+        """spider_opened：定时检查活跃项目是否超出时间预算"""
+        if spider is not self:
+            return
+        from twisted.internet import task
+        
+        self.budget_task = task.LoopingCall(self._check_time_budgets)
+        self.budget_task.start(max(1.0, min(10.0, self.project_time_budget / 10)), now=False)
+    
+    def _check_time_budgets(self):
+        now = time.monotonic()
+        for project_id in list(self.active_projects):
+            project_data = self.project_data.get(project_id)
+            if project_data is not None and now - project_data['started_at'] > self.project_time_budget:
+                self._cut_off_project(project_id, 'time')
+    
+    def _cut_off_project(self, project_id, reason):
+        """
+        项目超出预算：以已收集的页面提前收尾为 partial
+        
+        排队中的请求由 ProjectBudgetMiddleware 丢弃，下载中的请求返回后按迟到结果忽略；
+        计数器直接清零，项目槽位立即释放给下一个项目。剩余请求数记在 cut_off_projects 中，
+        每返回一个（_is_stale）减一，全部返回后移除该项目
+        """
+        project_data = self.project_data[project_id]
+        project_data['budget_exceeded'] = reason
+        cancelled = self.request_counters.get(project_id, 0)
+        if cancelled > 0:
+            self.cut_off_projects[project_id] = cancelled
+        self.crawler.stats.inc_value('project_budget/cancelled_requests', cancelled)
+        self.logger.warning(
+            f"[{project_id}] 超出时间预算 {self.project_time_budget:.0f} 秒，取消剩余 {cancelled} 个请求，"
+            f"以已收集的 {project_data['page_count']} 个页面 partial 收尾")
+        
+        self.request_counters[project_id] = 0
+        self._complete_project_sync(project_id)
+        if self.project_queue:
+            self._schedule_next_projects()
+        
+    def parse_page(self, response):
+        """解析页面内容"""
+        if self._is_stale(response.meta['project_id'], response.url):
+            yield from self._reissue_shared_waiters(response.request)
+            return
+        self._log_page_progress(response)
+        
+        # 304：复用条件请求缓存中保存的提取结果，不再解析
+        if 'conditional_cache_result' in response.meta:
+            yield from self._handle_page_result(response, self._cached_page_result(response))
+            return
         
         if not self.is_html_content(response):
-            self.logger.info(f"[{project_id}] 跳过非HTML内容: {response.url}")
-            
-            # 为非HTML内容创建一个基本的页面记录
-            page_data = {
-                'url': response.url,
-                'depth': depth,
-                'title': '',
-                'content': f"非HTML内容 - Content-Type: {response.headers.get('Content-Type', b'').decode('utf-8')}",
-                'links': [],
-                'crawl_status': 'skipped_non_html'
-            }
-            self.project_data[project_id]['pages'].append(page_data)
-            self.project_data[project_id]['failed_pages'] += 1
-            
-            # 检查项目是否完成  
-            old_count = self.request_counters[project_id]
-            self.request_counters[project_id] -= 1
-            self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 完成非HTML页面处理")
-            self.logger.info(f"[{project_id}] 剩余请求数: {self.request_counters[project_id]}")
-            
-            if self.request_counters[project_id] <= 0:
-                yield from self.complete_project(project_id)
+            yield from self._handle_non_html_page(response)
+            return
+        
+        # 增量模式：正文哈希未变化，复用上次的提取结果
+        unchanged_result = self._unchanged_page_result(response)
+        if unchanged_result is not None:
+            yield from self._handle_page_result(response, unchanged_result)
             return
             
+        yield from self._handle_page_result(response, self._parse_response(response))
+    
+    def _parse_response(self, response):
+        """在 reactor 线程中解析页面，返回 {'title', 'content', 'links'}；解析失败返回 None"""
         try:
             # 🎯 一次解析HTML，多次复用 - 性能优化核心
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
+            soup = make_soup(response.text, self.html_parser_backend)
+            result = {
+                'title': self.extract_title_from_soup(soup),
+                'content': self.extract_content_from_soup(soup),  # 统一使用结构化内容
+                'links': None,
+            }
+            if self._should_extract_links(response):
+                result['links'] = self.extract_links_from_soup(soup, response)  # 仅匹配锚文本
+        except Exception as e:
+            self.logger.error(f"[{response.meta['project_id']}] 解析页面失败 {response.url}: {e}")
+            result = None
+        return result
+    
+    async def parse_page_offloaded(self, response):
+        """
+        解析页面内容（进程池 / 相关性分类模式）
+        
+        进程池模式：原始响应字节发送到工作进程完成解码、解析、标题/内容/链接提取，reactor 线程
+        只等待结果并做计数与调度，下载不会被CPU密集的解析阻塞。
+        相关性分类模式：子页面的提取结果与其他页面攒批打分后，再记录页面与调度子链接。
+        """
+        if self._is_stale(response.meta['project_id'], response.url):
+            return list(self._reissue_shared_waiters(response.request))
+        self._log_page_progress(response)
+        
+        if 'conditional_cache_result' in response.meta:
+            return list(self._handle_page_result(response, self._cached_page_result(response)))
+        
+        if not self.is_html_content(response):
+            return list(self._handle_non_html_page(response))
+        
+        unchanged_result = self._unchanged_page_result(response)
+        if unchanged_result is not None:
+            return list(self._handle_page_result(response, unchanged_result))
+        
+        project_id = response.meta['project_id']
+        if self.parse_pool is None:
+            result = self._parse_response(response)
+        else:
+            try:
+                result = await maybe_deferred_to_future(self._submit_to_parse_pool(response))
+                if result['link_stats'] is not None:
+                    self._log_link_stats(project_id, response.url, result['link_stats'])
+            except Exception as e:
+                self.logger.error(f"[{project_id}] 解析页面失败 {response.url}: {e}")
+                result = None
+        
+        if result is not None and self.relevance_batcher is not None and not response.meta.get('is_root'):
+            try:
+                result['relevance'] = await maybe_deferred_to_future(self.relevance_batcher.score(result['content']))
+            except Exception as e:
+                # 打分失败不影响页面本身，按未打分处理
+                self.logger.error(f"[{project_id}] 相关性打分失败 {response.url}: {e}")
+        
+        # 等待期间项目可能已按时间预算收尾
+        if self._is_stale(project_id, response.url):
+            return list(self._reissue_shared_waiters(response.request))
+        return list(self._handle_page_result(response, result))
+    
+    def _cached_page_result(self, response):
+        """304 响应对应的缓存提取结果；不需要提取链接的页面忽略保存的链接"""
+        cached = response.meta['conditional_cache_result']
+        self.logger.info(f"[{response.meta['project_id']}] 页面未修改(304)，复用缓存结果: {response.url}")
+        return {
+            'title': cached['title'],
+            'content': cached['content'],
+            'links': cached.get('links') if self._should_extract_links(response) else None,
+        }
+    
+    def _unchanged_page_result(self, response):
+        """
+        增量模式：计算规范化正文哈希（保存在 meta['content_hash']），与上次相同则返回保存的提取结果
+        """
+        if self.incremental_state is None:
+            return None
+        content_hash = normalized_content_hash(response.body)
+        response.meta['content_hash'] = content_hash
+        
+        needs_links = self._should_extract_links(response)
+        stored = self.incremental_state.get_unchanged_result(response.request.url, content_hash, needs_links)
+        if stored is None:
+            return None
+        
+        response.meta['content_unchanged'] = True
+        self.crawler.stats.inc_value('incremental/unchanged_pages')
+        self.logger.info(f"[{response.meta['project_id']}] 页面内容未变化，跳过解析: {response.url}")
+        return {
+            'title': stored['title'],
+            'content': stored['content'],
+            'links': stored.get('links') if needs_links else None,
+        }
+    
+    def _store_page_hash(self, response, result):
+        """增量模式：保存新解析页面的正文哈希与提取结果"""
+        if 'content_hash' not in response.meta or response.meta.get('content_unchanged'):
+            return
+        try:
+            self.incremental_state.put_page(
+                response.request.url,
+                response.meta['content_hash'],
+                {'title': result['title'], 'content': result['content'], 'links': result['links']},
+            )
+        except Exception as e:
+            self.logger.warning(f"保存页面哈希失败 {response.url}: {e}")
+    
+    def _store_http_cache(self, response, result):
+        """保存响应的 ETag/Last-Modified 与提取结果，供下次条件请求使用"""
+        if self.http_cache is None or 'conditional_cache_result' in response.meta:
+            return
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        try:
+            self.http_cache.put(
+                response.request.url,
+                etag.decode('latin-1') if etag else None,
+                last_modified.decode('latin-1') if last_modified else None,
+                {'title': result['title'], 'content': result['content'], 'links': result['links'],
+                 'body_bytes': len(response.body)},
+            )
+        except Exception as e:
+            self.logger.warning(f"保存条件请求缓存失败 {response.url}: {e}")
+    
+    def _submit_to_parse_pool(self, response):
+        """提交解析任务到进程池，返回在 reactor 线程中触发的 Deferred"""
+        from twisted.internet import reactor
+        
+        content_type = response.headers.get('Content-Type', b'').decode('latin-1')
+        future = self.parse_pool.submit(
+            extract_page_from_body,
+            response.body,
+            content_type,
+            response.url,
+            self.html_parser_backend,
+            self.content_extractor,
+            self._should_extract_links(response),
+        )
+        
+        dfd = defer.Deferred()
+        
+        def _on_done(fut):
+            # 进程池的结果回调运行在管理线程中，需切回 reactor 线程触发 Deferred
+            try:
+                result = fut.result()
+            except BaseException as e:
+                reactor.callFromThread(dfd.errback, e)
+            else:
+                reactor.callFromThread(dfd.callback, result)
+        
+        future.add_done_callback(_on_done)
+        return dfd
+    
+    def _handle_non_html_page(self, response):
+        """为非HTML内容记录页面并回收计数"""
+        project_id = response.meta['project_id']
+        self.logger.info(f"[{project_id}] 跳过非HTML内容: {response.url}")
+        
+        # 为非HTML内容创建一个基本的页面记录
+        page_data = {
+            'url': response.url,
+            'depth': response.meta.get('depth', 0),
+            'title': '',
+            'content': f"非HTML内容 - Content-Type: {response.headers.get('Content-Type', b'').decode('utf-8')}",
+            'links': [],
+            'crawl_status': 'skipped_non_html'
+        }
+        yield from self._record_page(project_id, page_data)
+        self.project_data[project_id]['failed_pages'] += 1
+        yield from self._share_page_result(response, page_data)
+        
+        # 检查项目是否完成  
+        old_count = self.request_counters[project_id]
+        self.request_counters[project_id] -= 1
+        self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 完成非HTML页面处理")
+        self.logger.info(f"[{project_id}] 剩余请求数: {self.request_counters[project_id]}")
+        
+        if self.request_counters[project_id] <= 0:
+            yield from self.complete_project(project_id)
+    
+    def _handle_page_result(self, response, result):
+        """
+        记录页面提取结果、调度子链接请求，并回收当前页面的计数
+        
+        Args:
+            response: 当前页面响应
+            result (dict | None): {'title', 'content', 'links'}；links 为 None 表示不提取链接；
+                                  result 为 None 表示解析失败
+        """
+        project_id = response.meta['project_id']
+        depth = response.meta.get('depth', 0)
+        is_root = response.meta.get('is_root', False)
+        current_project_data = self.project_data[project_id]
+        
+        if result is None:
+            current_project_data['failed_pages'] += 1
+            yield from self._share_page_result(response, None)
+        else:
+            links = result['links']
+            if is_root and current_project_data.get('sitemap_links'):
+                links = current_project_data['sitemap_links']
             page_data = {
                 'url': response.url,
                 'depth': depth,
-                'title': self.extract_title_from_soup(soup),
-                'content': self.extract_structured_content_from_soup(soup),  # 统一使用结构化内容
-                'links': [],
+                'title': result['title'],
+                'content': result['content'],
+                'links': links if links is not None else [],
                 'crawl_status': 'success'
             }
+            relevant = True
+            if result.get('relevance') is not None:
+                page_data['relevance'] = round(result['relevance'], 4)
+                relevant = result['relevance'] >= self.relevance_threshold
+            
+            gated_page = page_data if relevant else self._gate_low_relevance_page(project_id, page_data)
+            if gated_page is not None:
+                yield from self._record_page(project_id, gated_page, response.meta.get('anchor_text'))
+            current_project_data['successful_pages'] += 1
+            yield from self._share_page_result(response, page_data)
+            self._store_http_cache(response, result)
+            self._store_page_hash(response, result)
+            
+            if links and not is_root and self.relevance_gate_expansion:
+                if relevant:
+                    self.crawler.stats.inc_value('relevance/expanded')
+                else:
+                    # 低分的深度1页面不值得继续展开
+                    self.crawler.stats.inc_value('relevance/not_expanded')
+                    self.logger.info(f"[{project_id}] 页面相关性低，不展开其 {len(links)} 个子链接: {response.url}")
+                    links = None
             
-            self.project_data[project_id]['pages'].append(page_data)
-            self.project_data[project_id]['successful_pages'] += 1
-            
-            # 修改链接提取条件：允许根页面(is_root=True)或深度小于1的页面提取链接
-            is_root = response.meta.get('is_root', False)
-            if depth < 1 or is_root:
-                links = self.extract_links_from_soup(soup, response) # 仅匹配锚文本
-                page_data['links'] = links
-                
+            if links is not None:
                 # 调试信息：如果没有提取到链接，记录详细信息
                 if not links:
                     self.logger.warning(f"[{project_id}] 页面 {response.url} (depth={depth}, is_root={is_root}) 没有提取到任何符合条件的链接")
                 else:
                     self.logger.info(f"[{project_id}] 页面 {response.url} (depth={depth}, is_root={is_root}) 提取到 {len(links)} 个链接")
                 
-                # 使用项目级全局集合进行去重，保证计数准确
-                seen_urls_global = self.project_data[project_id].setdefault('seen_urls', set())
-                new_requests = []
-                num_duplication = 0
-                # 处理新的字典格式links
-                for link_info in links:
-                    link_url = link_info["url"]
-                    anchor_text = link_info["anchor_text"] 
-                    matched_keyword = link_info["matched_keyword"]
-                    
-                    if link_url in seen_urls_global:
-                        num_duplication += 1
-                        continue
-                    seen_urls_global.add(link_url)
-
-                    if not filter_url(link_url, anchor_text=anchor_text): # 仅匹配锚文本
-                        self.logger.info(
-                            f"[{project_id}] 爬取子链接: {link_url} (锚文本: '{anchor_text}', 匹配关键词: '{matched_keyword}')")
-
-                        # 为根页面的子链接使用深度1，避免深度限制问题
-                        child_depth = 1 if is_root else depth + 1
-                        request = scrapy.Request(
-                            url=link_url,
-                            callback=self.parse_page,
-                            errback=self.handle_error,
-                            meta={
-                                'project_id': project_id,
-                                'depth': child_depth,
-                                'is_root': False,
-                                'cookiejar': project_id,
-                            },
-                            dont_filter=True  # 避免 Scrapy 去重导致计数器失配
-                        )
-                        new_requests.append(request)
-
-                # 记录去重后的新请求数
-                self.logger.info(f"[{project_id}] 提取链接完成，去重前 {len(links)} 个链接，去重后 {len(new_requests)} 个新请求（去重了 {num_duplication} 个重复链接）")
-                
-                # 一次性更新计数器（仅统计真正会被调度的请求）
-                if new_requests:
-                    old_count = self.request_counters[project_id]
-                    self.request_counters[project_id] += len(new_requests)
-                    self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 添加{len(new_requests)}个子页面请求")
-                    self.logger.info(
-                        f"[{project_id}] 添加 {len(new_requests)} 个新请求，当前剩余: {self.request_counters[project_id] - 1}")
-
-                
-                # 发出所有请求
-                for request in new_requests:
-                    yield request
-                        
-        except Exception as e:
-            self.logger.error(f"[{project_id}] 解析页面失败 {response.url}: {e}")
-            self.project_data[project_id]['failed_pages'] += 1
+                yield from self._schedule_child_requests(project_id, links, depth, is_root)
             
-        # 先检查并处理待完成的项目（来自错误处理）
-        if hasattr(self, '_projects_to_complete'):
-            for pending_project_id in list(self._projects_to_complete):
-                if self.request_counters.get(pending_project_id, 0) <= 0:
-                    self._projects_to_complete.remove(pending_project_id)
-                    yield from self.complete_project(pending_project_id)
-        
         # 最后检查当前项目是否完成（在所有yield操作完成后）
         old_count = self.request_counters[project_id]
         self.request_counters[project_id] -= 1
@@ -335,13 +863,270 @@ class ProgramSpider(scrapy.Spider):
         
         if self.request_counters[project_id] <= 0:
             yield from self.complete_project(project_id)
+    
+    def _gate_low_relevance_page(self, project_id, page_data):
+        """
+        低于相关性阈值的页面：按 RELEVANCE_LOW_SCORE_ACTION 返回要记录的页面
+        
+        Returns:
+            dict | None: keep 返回原页面；stub 返回只含URL/深度/标题/分数的存根；drop 返回 None
+        """
+        self.crawler.stats.inc_value('relevance/below_threshold')
+        if self.relevance_action == 'keep':
+            return page_data
+        self.logger.info(
+            f"[{project_id}] 页面相关性 {page_data['relevance']:.3f} 低于阈值 {self.relevance_threshold:.3f}，"
+            f"{'丢弃' if self.relevance_action == 'drop' else '只保留存根'}: {page_data['url']}")
+        if self.relevance_action == 'drop':
+            self.crawler.stats.inc_value('relevance/dropped')
+            return None
+        self.crawler.stats.inc_value('relevance/stubbed')
+        return dict(page_data, content='', links=[], crawl_status='low_relevance')
+    
+    def _record_page(self, project_id, page_data, anchor_text=None):
+        """
+        记录一个页面的提取结果
+        
+        project 模式：累积到项目数据中，项目完成时随 ProgramPageItem 一起输出；
+        stream 模式：立即作为 ProgramPageRecordItem 输出（由管道追加到 JSONL），
+        项目数据中只保留计数，内存占用不随页面数增长。
+        """
+        project_data = self.project_data[project_id]
+        project_data['page_count'] += 1
+        if ((self.coverage_topics or self.sitemaps is not None) and page_data['crawl_status'] == 'success'
+                and page_data['depth'] > 0):
+            # 根页面不计入覆盖度：停止规则要等真正讲这些主题的子页面爬到之后才生效
+            project_data['covered_topics'] |= page_topics(page_data, anchor_text)
+            if (self.coverage_topics and project_id not in self.covered_projects
+                    and project_data['covered_topics'] >= self.coverage_topics):
+                self.covered_projects.add(project_id)
+                self.logger.info(
+                    f"[{project_id}] 已覆盖全部主题 {sorted(self.coverage_topics)}，排队中的子页面不再下载")
+        if self.incremental_state is not None:
+            project_data['page_digests'].append((page_data['url'], page_digest(page_data)))
+        if self.output_mode == 'stream':
+            record = ProgramPageRecordItem()
+            record['project_id'] = project_id
+            record['program_name'] = project_data['program_name']
+            record['source_file'] = project_data['source_file']
+            record['page'] = page_data
+            yield record
+        else:
+            project_data['pages'].append(page_data)
+    
+    def _schedule_child_requests(self, project_id, links, depth, is_root):
+        """按项目级 seen_urls 去重后为匹配的子链接生成请求，并一次性更新计数器"""
+        # 使用项目级全局集合进行去重，保证计数准确
+        seen_urls_global = self.project_data[project_id].setdefault('seen_urls', set())
+        new_requests = []
+        num_duplication = 0
+        shared_hits = []     # 共享页面库中已有的页面：[(链接URL, 深度, 页面), ...]
+        num_shared_waiting = 0  # 其他项目正在下载、登记为等待的页面数
+        num_over_budget = 0     # 超出页面预算而未调度的链接数
+        project_data = self.project_data[project_id]
         
+        # 覆盖度停止规则：已成功爬取的页面覆盖了全部主题，不再调度新的子链接（已排队的由 CoverageStopMiddleware 丢弃）
+        if links and project_id in self.covered_projects:
+            self.crawler.stats.inc_value('link_scoring/skipped_after_coverage', len(links))
+            self.logger.info(
+                f"[{project_id}] 已覆盖全部主题 {sorted(self.coverage_topics)}，不再调度 {len(links)} 个子链接")
+            return
+        
+        # 子链接打分：高分链接先调度（页面预算只保留高分链接），并作为请求优先级
+        if self.link_scoring:
+            root_url = project_data['root_url']
+            scored_links = sorted(((score_link(link_info, root_url), link_info) for link_info in links),
+                                  key=lambda entry: -entry[0])
+        else:
+            scored_links = [(0, link_info) for link_info in links]
+        
+        # 处理新的字典格式links
+        for score, link_info in scored_links:
+            link_url = link_info["url"]
+            anchor_text = link_info["anchor_text"] 
+            matched_keyword = link_info["matched_keyword"]
+            
+            if link_url in seen_urls_global:
+                num_duplication += 1
+                continue
+            seen_urls_global.add(link_url)
+
+            if self.url_filter_use_regex:
+                rule_index = get_matched_blacklist_rule(link_url, self.url_verdict_cache)
+                if rule_index >= 0:
+                    self.crawler.stats.inc_value(f'url_filter/regex_rule/{rule_index}')
+                    self.logger.debug(
+                        f"[{project_id}] 正则黑名单跳过: {link_url} (规则 #{rule_index}: {URL_BLACKLIST_PATTERNS[rule_index]})")
+                    continue
+
+            if not filter_url(link_url, anchor_text=anchor_text): # 仅匹配锚文本
+                if self.project_page_budget and project_data['scheduled_pages'] >= self.project_page_budget:
+                    num_over_budget += 1
+                    continue
+                project_data['scheduled_pages'] += 1
+                self.logger.info(
+                    f"[{project_id}] 爬取子链接: {link_url} (锚文本: '{anchor_text}', 匹配关键词: '{matched_keyword}', 分数: {score})")
+                
+                # 为根页面的子链接使用深度1，避免深度限制问题
+                child_depth = 1 if is_root else depth + 1
+                
+                shared_key = None
+                if self.shared_pages is not None:
+                    shared_key = canonical_page_url(link_url)
+                    entry = self.shared_pages.get(shared_key)
+                    if entry is not None:
+                        shared_hits.append((link_url, child_depth, entry))
+                        continue
+                    if self.shared_pages.is_pending(shared_key):
+                        self.shared_pages.add_waiter(shared_key, project_id, link_url, child_depth)
+                        num_shared_waiting += 1
+                        continue
+                    self.shared_pages.start(shared_key)
+                
+                new_requests.append(self._make_page_request(
+                    link_url, project_id, child_depth, is_root=False, shared_key=shared_key,
+                    priority=score, anchor_text=anchor_text))
+
+        if num_over_budget:
+            project_data['budget_exceeded'] = project_data['budget_exceeded'] or 'pages'
+            self.crawler.stats.inc_value('project_budget/skipped_links', num_over_budget)
+            self.logger.warning(
+                f"[{project_id}] 达到页面预算 {self.project_page_budget}，跳过 {num_over_budget} 个子链接，项目将以 partial 收尾")
+        
+        # 记录去重后的新请求数
+        self.logger.info(f"[{project_id}] 提取链接完成，去重前 {len(links)} 个链接，去重后 {len(new_requests)} 个新请求（去重了 {num_duplication} 个重复链接）")
+        
+        # 共享页面库命中：直接引用已解析的页面，不再发请求
+        for link_url, child_depth, entry in shared_hits:
+            yield from self._record_shared_page(project_id, link_url, child_depth, entry)
+        if shared_hits or num_shared_waiting:
+            self.logger.info(f"[{project_id}] 共享页面库: 直接引用 {len(shared_hits)} 个页面，等待其他项目下载 {num_shared_waiting} 个页面")
+        
+        # 一次性更新计数器（仅统计真正会被调度的请求，以及等待其他项目下载的页面）
+        if new_requests or num_shared_waiting:
+            old_count = self.request_counters[project_id]
+            self.request_counters[project_id] += len(new_requests) + num_shared_waiting
+            self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 添加{len(new_requests)}个子页面请求, {num_shared_waiting}个共享页面等待")
+            self.logger.info(
+                f"[{project_id}] 添加 {len(new_requests)} 个新请求，当前剩余: {self.request_counters[project_id] - 1}")
+
+        # 发出所有请求
+        for request in new_requests:
+            yield request
+        
+    def _record_shared_page(self, project_id, link_url, depth, entry):
+        """把共享页面库中的页面记录到项目中（不发请求），并统计节省的请求与字节"""
+        page_data = dict(entry['page'], depth=depth)
+        gated_page = page_data
+        if page_data.get('relevance') is not None and page_data['relevance'] < self.relevance_threshold:
+            gated_page = self._gate_low_relevance_page(project_id, page_data)
+        if gated_page is not None:
+            yield from self._record_page(project_id, gated_page)
+        if page_data['crawl_status'] == 'success':
+            self.project_data[project_id]['successful_pages'] += 1
+        else:
+            self.project_data[project_id]['failed_pages'] += 1
+        
+        self.shared_pages.record_reuse(entry)
+        self.crawler.stats.inc_value('shared_pages/requests_avoided')
+        self.crawler.stats.inc_value('shared_pages/bytes_avoided', entry['bytes'])
+        self.logger.debug(f"[{project_id}] 引用共享页面: {link_url} -> {page_data['url']}")
+    
+    def _share_page_result(self, response, page_data):
+        """
+        页面下载完成：保存到共享页面库，并为等待同一页面的其他项目记录页面、回收计数
+        
+        page_data 为 None 表示解析失败，等待者同样记为失败页面（重新下载的结果相同）
+        """
+        shared_key = response.meta.get('shared_key')
+        if shared_key is None or self.shared_pages is None:
+            return
+        
+        if page_data is None:
+            waiters = self.shared_pages.release(shared_key)
+        else:
+            waiters = self.shared_pages.store(shared_key, page_data, self._original_body_size(response, page_data))
+        
+        for waiter_id, link_url, depth in waiters:
+            if self._is_stale(waiter_id, link_url):
+                continue
+            if page_data is None:
+                self.project_data[waiter_id]['failed_pages'] += 1
+            else:
+                yield from self._record_shared_page(waiter_id, link_url, depth, self.shared_pages.get(shared_key))
+            
+            old_count = self.request_counters[waiter_id]
+            self.request_counters[waiter_id] -= 1
+            self.logger.info(f"[{waiter_id}] 计数器变更: {old_count} -> {self.request_counters[waiter_id]}, 操作: 共享页面下载完成")
+            if self.request_counters[waiter_id] <= 0:
+                yield from self.complete_project(waiter_id)
+    
+    def _original_body_size(self, response, page_data):
+        """
+        页面原始响应体的字节数（共享页面库的 bytes_avoided 按此计算）
+        
+        304 复用缓存结果时响应体为空，取缓存中保存的大小；没有保存大小的旧缓存条目按提取内容估算
+        """
+        cached = response.meta.get('conditional_cache_result')
+        if cached is None:
+            return len(response.body)
+        return cached.get('body_bytes') or len(page_data['content'].encode('utf-8'))
+    
+    def _reissue_shared_waiters(self, request):
+        """共享页面下载失败：等待者各自重新请求（计数器在登记等待时已增加）"""
+        shared_key = request.meta.get('shared_key')
+        if shared_key is None or self.shared_pages is None:
+            return
+        
+        for waiter_id, link_url, depth in self.shared_pages.release(shared_key):
+            if self._is_stale(waiter_id, link_url):
+                continue
+            yield self._make_page_request(link_url, waiter_id, depth, is_root=False)
+    
     def handle_error(self, failure):
         """处理请求错误（作为生成器，可 yield item/request）"""
+        # 等待同一共享页面的其他项目改为各自请求
+        yield from self._reissue_shared_waiters(failure.request)
+        
         project_id = failure.request.meta.get('project_id')
-        if not project_id:
+        if not project_id or self._is_stale(project_id, failure.request.url):
             return
 
+        if failure.check(CoverageReached):
+            # 覆盖度停止规则丢弃的请求：不是失败，只回收计数
+            old_count = self.request_counters[project_id]
+            self.request_counters[project_id] -= 1
+            self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 覆盖度停止跳过 {failure.request.url}")
+            if self.request_counters[project_id] <= 0:
+                yield from self.complete_project(project_id)
+            return
+        
+        if failure.check(DomainCircuitOpen):
+            # 域名熔断：请求未发送，只记一行
+            self.logger.warning(f"[{project_id}] 域名熔断中，直接失败: {failure.request.url}")
+        else:
+            self._log_request_failure(project_id, failure)
+            
+        self.project_data[project_id]['failed_pages'] += 1
+
+        # 更新计数器
+        old_count = self.request_counters[project_id]
+        self.request_counters[project_id] -= 1
+        self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 处理请求错误")
+        current_project_data = self.project_data[project_id]
+        processed_pages = current_project_data['successful_pages'] + current_project_data['failed_pages']
+        self.logger.info(f"[{project_id}] 已处理页面: {processed_pages}, 剩余请求数: {self.request_counters[project_id]}")
+
+        # 记录失败到状态文件
+        self.record_failed_request(project_id, failure)
+
+        # 如果当前项目所有请求都已回收，立即完成项目
+        if self.request_counters[project_id] <= 0:
+            self.logger.info(f"[{project_id}] 项目在错误处理中完成，立即收尾 …")
+            yield from self.complete_project(project_id)
+    
+    def _log_request_failure(self, project_id, failure):
+        """输出请求失败的详细信息（状态码、关键响应头/请求头、响应预览）"""
         # 增强错误信息显示
         error_info = []
         error_info.append(f"URL: {failure.request.url}")
@@ -384,54 +1169,20 @@ class ProgramSpider(scrapy.Spider):
         self.logger.error(f"[{project_id}] 请求失败详情:")
         for info in error_info:
             self.logger.error(f"[{project_id}]   {info}")
-            
-        self.project_data[project_id]['failed_pages'] += 1
-
-        # 更新计数器
-        old_count = self.request_counters[project_id]
-        self.request_counters[project_id] -= 1
-        self.logger.info(f"[{project_id}] 计数器变更: {old_count} -> {self.request_counters[project_id]}, 操作: 处理请求错误")
-        current_project_data = self.project_data[project_id]
-        processed_pages = current_project_data['successful_pages'] + current_project_data['failed_pages']
-        self.logger.info(f"[{project_id}] 已处理页面: {processed_pages}, 剩余请求数: {self.request_counters[project_id]}")
-
-        # 记录失败到状态文件
-        self.record_failed_request(project_id, failure)
-
-        # 如果当前项目所有请求都已回收，立即完成项目
-        if self.request_counters[project_id] <= 0:
-            self.logger.info(f"[{project_id}] 项目在错误处理中完成，立即收尾 …")
-            yield from self.complete_project(project_id)
     
     def record_failed_request(self, project_id, failure):
-        """记录失败的请求到学科专门的失败日志文件"""
+        """记录失败的请求到学科专门的失败日志（追加式 JSONL，按URL去重）"""
         try:
-            import json
-            import os
-            from datetime import datetime
-            
             # 获取项目信息
             project_data = self.project_data.get(project_id, {})
             program_name = project_data.get('program_name', 'Unknown')
             source_file_raw = project_data.get('source_file', 'unknown.csv')
+            source_file, _ = split_source_file(source_file_raw)
             
-            # 统一处理source_file，移除所有可能的扩展名
-            source_file = source_file_raw.replace('.csv', '').replace('.json', '')
-            
-            # 提取学科名称（去掉可能的数字后缀，如"计算机_1" -> "计算机"）
-            subject_name = source_file.split('_')[0] if '_' in source_file else source_file
-            
-            # 构建失败日志文件路径
-            # __file__ = .../crawl/program_crawler/spiders/program_spider.py
-            # 需要4个dirname到达crawl目录：spiders -> program_crawler -> crawl
-            crawl_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            log_dir = os.path.join(crawl_dir, 'log', subject_name)
-            
-            # 确保学科日志目录存在
-            if not os.path.exists(log_dir):
-                os.makedirs(log_dir)
-            
-            failed_log_file = os.path.join(log_dir, f'failed_urls_{source_file}.json')
+            # 🎯 URL去重：内存索引中已存在则不再构建记录
+            if failure.request.url in self.failure_journal.load(source_file_raw):
+                self.logger.debug(f"[{project_id}] 失败URL已存在，跳过重复记录: {failure.request.url}")
+                return
             
             # 构建详细错误信息
             error_msg = f"{failure.type.__name__}: {failure.value}"
@@ -468,52 +1219,48 @@ class ProgramSpider(scrapy.Spider):
                 'response_preview': response_preview
             }
             
-            # 读取现有失败记录
-            failed_records = []
-            if os.path.exists(failed_log_file):
-                with open(failed_log_file, 'r', encoding='utf-8') as f:
-                    failed_records = json.load(f)
-            
-            # 🎯 URL去重：检查是否已存在相同URL的失败记录
-            existing_urls = {record['url'] for record in failed_records}
-            if failure.request.url not in existing_urls:
-                failed_records.append(failed_record)
-                self.logger.info(f"[{project_id}] 新增失败URL记录: {failure.request.url}")
-            else:
-                self.logger.debug(f"[{project_id}] 失败URL已存在，跳过重复记录: {failure.request.url}")
-            
-            # 保存失败记录（仅在有新记录时写入）
-            if failure.request.url not in existing_urls:
-                with open(failed_log_file, 'w', encoding='utf-8') as f:
-                    json.dump(failed_records, f, ensure_ascii=False, indent=2)
-                self.logger.info(f"[{project_id}] 失败记录已保存到: {failed_log_file}")
-            else:
-                self.logger.debug(f"[{project_id}] 未保存重复失败记录")
+            # 只追加一行，不再读取/重写整个文件
+            if self.failure_journal.record(source_file_raw, failed_record):
+                journal_path, _ = self.failure_journal.get_paths(source_file_raw)
+                self.logger.info(f"[{project_id}] 新增失败URL记录: {failure.request.url} -> {journal_path}")
             
         except Exception as e:
             # 状态记录失败不应影响主流程
             self.logger.warning(f"[{project_id}] 记录失败状态时出错: {e}")
             
-    def _complete_project_sync(self, project_id):
-        """同步完成项目，直接处理Item而不yield（用于Request生成器中）"""
-        import time
-        time.sleep(1)  # 给并发请求1秒缓冲时间，确保所有请求都已处理完毕
+    def _build_project_item(self, project_id):
+        """
+        汇总项目统计并构建 Item（事件驱动收尾，不阻塞 reactor）
+        
+        仅当项目计数器归零（没有任何排队/下载中的请求）且尚未完成时才会收尾，
+        否则返回 None。计数器由 parse_page / handle_error 在每个请求结束时递减，
+        因此无需再 sleep 等待“并发请求处理完毕”。
+        """
+        remaining = self.request_counters.get(project_id, 0)
+        if remaining > 0:
+            self.logger.debug(f"[{project_id}] 仍有 {remaining} 个请求未完成，暂不收尾")
+            return None
         
         self.logger.info(f"[{project_id}] 正在完成项目")
         
         # 检查项目是否已经完成过，避免重复处理
-        if not hasattr(self, '_completed_projects'):
-            self._completed_projects = set()
-        
         if project_id in self._completed_projects:
             self.logger.info(f"[{project_id}] 项目已经完成过，跳过")
-            return
+            return None
             
         self._completed_projects.add(project_id)
         
         project_data = self.project_data[project_id]
-        project_data['status'] = 'completed'
-        project_data['total_pages'] = len(project_data['pages'])
+        project_data['status'] = 'partial' if project_data['budget_exceeded'] else 'completed'
+        project_data['total_pages'] = project_data['page_count']
+        
+        # 增量模式：项目指纹与上次相同（页面集合与内容都未变化）时标记为 unchanged；partial 项目不参与比较
+        if (self.incremental_state is not None and project_data['page_count'] > 0
+                and project_data['status'] == 'completed'):
+            fingerprint = project_fingerprint(project_data['page_digests'])
+            if self.incremental_state.update_project(project_id, fingerprint):
+                project_data['status'] = 'unchanged'
+                self.crawler.stats.inc_value('incremental/unchanged_projects')
         
         total_attempts = project_data['successful_pages'] + project_data['failed_pages']
         success_rate = (project_data['successful_pages'] / max(1, total_attempts)) * 100
@@ -525,9 +1272,13 @@ class ProgramSpider(scrapy.Spider):
         self.logger.info(f"[{project_id}]   - 成功页数: {project_data['successful_pages']}")
         self.logger.info(f"[{project_id}]   - 失败页数: {project_data['failed_pages']}")
         self.logger.info(f"[{project_id}]   - 成功率: {success_rate:.1f}%")
+        if project_data['status'] == 'unchanged':
+            self.logger.info(f"[{project_id}]   - 与上次爬取相比没有变化 (unchanged)")
+        if project_data['status'] == 'partial':
+            self.crawler.stats.inc_value(f"project_budget/partial_{project_data['budget_exceeded']}")
+            self.logger.info(f"[{project_id}]   - 超出{'时间' if project_data['budget_exceeded'] == 'time' else '页面'}预算，部分完成 (partial)")
         self.logger.info("-"*60)
         
-        # 直接通过pipeline处理item，不通过yield
         item = ProgramPageItem()
         item['project_id'] = project_data['project_id']
         item['program_name'] = project_data['program_name']
@@ -537,80 +1288,80 @@ class ProgramSpider(scrapy.Spider):
         item['pages'] = project_data['pages']
         item['total_pages'] = project_data['total_pages']
         item['status'] = project_data['status']
-        
-        # 直接调用pipeline处理item
-        self.crawler.engine.scraper.itemproc.process_item(item, self)
-        
+        if project_data['budget_exceeded']:
+            item['partial_reason'] = project_data['budget_exceeded']
+        return item
+    
+    def _on_project_completed(self, project_id, item):
+        """项目收尾后的公共处理：更新统计、释放槽位、回收项目状态并广播 project_completed 信号"""
         self.completed_projects += 1
-        self.is_processing_project = False  # 释放当前项目状态
+        project_data = self.project_data.get(project_id, {})
+        started_at = project_data.get('started_at')
+        if started_at is not None:
+            self.project_durations.append(time.monotonic() - started_at)
+            if self.sitemaps is not None:
+                topics = self.coverage_topics or frozenset(TOPIC_KEYWORDS)
+                self.sitemaps.record_project(
+                    site_key(project_data['root_url']),
+                    'sitemap' if project_data.get('sitemap_links') else 'anchor',
+                    project_data['page_count'],
+                    time.monotonic() - started_at,
+                    len(project_data['covered_topics'] & topics) / len(topics),
+                )
+        self.release_project_slot(project_id)
+        self.covered_projects.discard(project_id)
+        # Item 已交给管道，回收项目级状态，保证长时间运行时内存不随项目数增长
+        self.project_data.pop(project_id, None)
+        self.request_counters.pop(project_id, None)
+        self.crawler.signals.send_catch_log(
+            signal=project_completed, spider=self, project_id=project_id, item=item)
         
-        # 不在此处直接启动下一个项目，而是留给 spider_idle 信号统一调度，
-        # 以避免深度叠加导致的 DEPTH_LIMIT 丢包
-        if self.project_queue:
-            self.logger.info(f"[{project_id}] 仍有 {len(self.project_queue)} 个项目待爬，将在爬虫空闲时继续。")
-        else:
+        if not self.project_queue and not self.active_projects:
             self.logger.info("\n" + "="*50)
             self.logger.info("所有项目已完成")
             self.logger.info(f"完成率: {self.completed_projects}/{self.total_projects} (100%)")
             self.logger.info("="*50)
     
-    def complete_project(self, project_id):
-        """完成当前项目，输出统计信息并开始下一个项目（生成器版本，用于正常流程）"""
-        import time
-        time.sleep(1)  # 给并发请求1秒缓冲时间，确保所有请求都已处理完毕
-        
-        self.logger.info(f"[{project_id}] 正在完成项目")
-        
-        # 检查项目是否已经完成过，避免重复处理
-        if not hasattr(self, '_completed_projects'):
-            self._completed_projects = set()
-        
-        if project_id in self._completed_projects:
-            self.logger.info(f"[{project_id}] 项目已经完成过，跳过")
+    def _complete_project_sync(self, project_id):
+        """同步完成项目，直接处理Item而不yield（用于Request生成器中）"""
+        item = self._build_project_item(project_id)
+        if item is None:
             return
-            
-        self._completed_projects.add(project_id)
         
-        project_data = self.project_data[project_id]
-        project_data['status'] = 'completed'
-        project_data['total_pages'] = len(project_data['pages'])
-        
-        total_attempts = project_data['successful_pages'] + project_data['failed_pages']
-        success_rate = (project_data['successful_pages'] / max(1, total_attempts)) * 100
+        # 直接调用pipeline处理item；pipeline 返回 Deferred，异常通过 errback 记录
+        dfd = self.crawler.engine.scraper.itemproc.process_item(item, self)
+        dfd.addErrback(lambda failure: self.logger.error(f"[{project_id}] 项目数据写入失败: {failure.value}"))
         
-        # 更清晰的项目完成日志
-        self.logger.info("\n" + "-"*60)
-        self.logger.info(f"[{project_id}] 项目完成: {project_data['program_name']}")
-        self.logger.info(f"[{project_id}]   - 总页数: {project_data['total_pages']}")
-        self.logger.info(f"[{project_id}]   - 成功页数: {project_data['successful_pages']}")
-        self.logger.info(f"[{project_id}]   - 失败页数: {project_data['failed_pages']}")
-        self.logger.info(f"[{project_id}]   - 成功率: {success_rate:.1f}%")
-        self.logger.info("-"*60)
+        self._on_project_completed(project_id, item)
         
-        item = ProgramPageItem()
-        item['project_id'] = project_data['project_id']
-        item['program_name'] = project_data['program_name']
-        item['source_file'] = project_data['source_file']
-        item['root_url'] = project_data['root_url']
-        item['crawl_time'] = project_data['crawl_time']
-        item['pages'] = project_data['pages']
-        item['total_pages'] = project_data['total_pages']
-        item['status'] = project_data['status']
+        # 不在此处启动下一个项目：调用方 start_next_projects 的循环会继续补位
+        if self.project_queue:
+            self.logger.info(f"[{project_id}] 仍有 {len(self.project_queue)} 个项目待爬，将继续补位启动。")
+    
+    def complete_project(self, project_id):
+        """完成当前项目，输出统计信息并补位启动下一个项目（生成器版本，用于正常流程）"""
+        item = self._build_project_item(project_id)
+        if item is None:
+            return
         
         yield item
         
-        self.completed_projects += 1
-        self.is_processing_project = False  # 释放当前项目状态
+        self._on_project_completed(project_id, item)
         
-        # 不在此处直接启动下一个项目，而是留给 spider_idle 信号统一调度，
-        # 以避免深度叠加导致的 DEPTH_LIMIT 丢包
+        # 立即补位启动下一个项目：通过 engine 直接调度，避免深度叠加导致的 DEPTH_LIMIT 丢包
         if self.project_queue:
-            self.logger.info(f"[{project_id}] 仍有 {len(self.project_queue)} 个项目待爬，将在爬虫空闲时继续。")
-        else:
-            self.logger.info("\n" + "="*50)
-            self.logger.info("所有项目已完成")
-            self.logger.info(f"完成率: {self.completed_projects}/{self.total_projects} (100%)")
-            self.logger.info("="*50)
+            scheduled = self._schedule_next_projects()
+            self.logger.info(f"[{project_id}] 仍有 {len(self.project_queue)} 个项目待爬，已补位启动 {scheduled} 个项目。")
+        
+    def release_project_slot(self, project_id):
+        """释放项目占用的并发槽位及其域名计数"""
+        project = self.active_projects.pop(project_id, None)
+        if project is None:
+            return
+        domain = project['domain']
+        self.active_domains[domain] -= 1
+        if self.active_domains[domain] <= 0:
+            del self.active_domains[domain]
         
     def is_html_content(self, response):
         """检查响应是否为HTML内容"""
@@ -620,7 +1371,7 @@ class ProgramSpider(scrapy.Spider):
     def extract_title(self, response):
         """提取页面标题（兼容性方法，建议使用extract_title_from_soup）"""
         try:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = make_soup(response.text, self.html_parser_backend)
             return self.extract_title_from_soup(soup)
         except:
             return ""
@@ -628,10 +1379,7 @@ class ProgramSpider(scrapy.Spider):
     def extract_title_from_soup(self, soup):
         """从soup对象提取页面标题"""
         try:
-            if soup is None:
-                return ""
-            title_tag = soup.find('title')
-            return title_tag.get_text().strip() if title_tag else ""
+            return extract_title(soup)
         except:
             return ""
             
@@ -639,7 +1387,7 @@ class ProgramSpider(scrapy.Spider):
     def extract_links(self, response):
         """提取页面链接并进行过滤（兼容性方法，建议使用extract_links_from_soup）"""
         try:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = make_soup(response.text, self.html_parser_backend)
             return self.extract_links_from_soup(soup, response)
         except Exception as e:
             self.logger.error(f"链接提取失败: {e}")
@@ -647,125 +1395,32 @@ class ProgramSpider(scrapy.Spider):
             
     def extract_links_from_soup(self, soup, response):
         """从soup对象提取页面链接并进行过滤；仅获取锚文本匹配的links"""
+        # 从 response 中获取 project_id
+        project_id = response.meta.get('project_id', 'unknown')
         try:
-            if soup is None:
-                return []
-                
-            # 从 response 中获取 project_id
-            project_id = response.meta.get('project_id', 'unknown')
-            
-            # 统计所有链接
-            all_links = soup.find_all('a', href=True)
-            self.logger.info(f"[{project_id}] 页面总链接数: {len(all_links)}")
-            
-            # # 临时调试：打印所有原始链接的锚文本
-            # self.logger.info(f"[{project_id}] === 原始链接锚文本列表 ===")
-            # for i, link in enumerate(all_links):  # 只显示前20个避免日志过长
-            #     anchor_text = link.get_text().strip()
-            #     href = link.get('href', 'N/A')
-            #     self.logger.info(f"[{project_id}] 原始链接{i+1}: '{anchor_text}' -> {href}")
-            
-            # 删除导航元素 - 减少误删，只删除明确的导航和页脚
-            nav_selectors = ['footer', '.menu', "header"]  # 移除了'nav'避免误删页面主要内容
-            removed_nav_count = 0
-            for selector in nav_selectors:
-                nav_elements = soup.select(selector)
-                for nav_elem in nav_elements:
-                    nav_elem.decompose()
-                    removed_nav_count += len(nav_elem.find_all('a', href=True))
-            
-            remaining_links = soup.find_all('a', href=True)
-            self.logger.info(f"[{project_id}] 移除导航后链接数: {len(remaining_links)} (移除了 {removed_nav_count} 个导航链接)")
-            
-            # # 临时调试：打印移除导航后的链接锚文本
-            # self.logger.info(f"[{project_id}] === 移除导航后链接锚文本列表 ===")
-            # for i, link in enumerate(remaining_links[:20]):  # 只显示前20个
-            #     anchor_text = link.get_text().strip()
-            #     href = link.get('href', 'N/A')
-            #     self.logger.info(f"[{project_id}] 剩余链接{i+1}: '{anchor_text}' -> {href}")
-            # if len(remaining_links) > 20:
-            #     self.logger.info(f"[{project_id}] ... 还有 {len(remaining_links)-20} 个链接未显示")
-                    
-            links = []
-            returned_urls = set()  # 页面内URL去重
-            valid_count = 0
-            keyword_matched_count = 0
-            
-            for a_tag in remaining_links:
-                href = a_tag['href']
-                anchor_text = a_tag.get_text().strip()
-                
-                # 转换为绝对URL
-                if not href.startswith(('http://', 'https://')):
-                    href = urljoin(response.url, href)
-                    
-                # 移除fragment
-                href = href.split('#')[0]
-                
-                # 跳过指向当前页面的链接（避免自循环）
-                if href == response.url:
-                    continue
-                    
-                if self.is_valid_link(href, response.url):
-                    valid_count += 1
-                    matched_keyword = self.get_matched_keyword(href, anchor_text) # 仅匹配锚文本
-                    if matched_keyword:
-                        keyword_matched_count += 1
-                        # 保存为结构化字典，便于JSON中查看和理解
-                        # 页面内URL唯一性去重
-                        if href in returned_urls:
-                            continue  # 跳过重复 URL
-                        returned_urls.add(href)
-
-                        link_info = {
-                            "url": href,                    # 链接地址
-                            "anchor_text": anchor_text,     # 锚文本（链接显示的文字）
-                            "matched_keyword": matched_keyword  # 匹配的白名单关键词
-                        }
-                        links.append(link_info)
-                        self.logger.debug(f"[{project_id}] 匹配链接: {href} (锚文本: '{anchor_text}', 关键词: '{matched_keyword}')")
-
-                    else:
-                        self.logger.debug(f"[{project_id}] 链接不匹配关键词: {href} (锚文本: '{anchor_text}')")
-                else:
-                    self.logger.debug(f"[{project_id}] 无效链接: {href} (锚文本: '{anchor_text}')")
-            
-            self.logger.info(f"[{project_id}] 有效链接数: {valid_count}, 关键词匹配数: {keyword_matched_count}, 最终提取数: {len(links)}")
+            links, stats = extract_anchor_links(soup, response.url)
+            self._log_link_stats(project_id, response.url, stats)
+            for link_info in links:
+                self.logger.debug(f"[{project_id}] 匹配链接: {link_info['url']} (锚文本: '{link_info['anchor_text']}', 关键词: '{link_info['matched_keyword']}')")
             return links
             
         except Exception as e:
-            project_id = response.meta.get('project_id', 'unknown')
             self.logger.error(f"[{project_id}] 链接提取失败: {e}")
             return []
+    
+    def _log_link_stats(self, project_id, url, stats):
+        """输出链接提取各阶段的统计"""
+        self.logger.info(f"[{project_id}] 页面总链接数: {stats['total']}")
+        self.logger.info(f"[{project_id}] 移除导航后链接数: {stats['remaining']} (移除了 {stats['removed_nav']} 个导航链接)")
+        self.logger.info(f"[{project_id}] 有效链接数: {stats['valid']}, 关键词匹配数: {stats['matched']}")
             
     def is_valid_link(self, url, base_url):
         """检查链接是否有效"""
-        try:
-            parsed_url = urlparse(url)
-            base_parsed = urlparse(base_url)
-            
-            if not parsed_url.netloc:
-                return False
-                
-            return True
-            
-        except:
-            return False
+        return is_valid_link(url)
             
     def get_matched_keyword(self, url, anchor_text):
         """获取匹配的白名单关键词；检查anchor_text中是否包含白名单关键词"""
-        from ..url_filter import URL_WHITELIST_KEYWORDS
-        
-        if not anchor_text:
-            return None
-            
-        text_to_check = anchor_text.lower()
-        
-        for keyword in URL_WHITELIST_KEYWORDS:
-            if keyword in text_to_check:
-                return keyword
-                
-        return None
+        return get_matched_whitelist_keyword(anchor_text)
         
     def closed(self, reason):
         """爬虫关闭时的统计信息"""
@@ -784,6 +1439,88 @@ class ProgramSpider(scrapy.Spider):
                 
         if unfinished_projects:
             self.logger.warning(f"发现未完成的项目: {unfinished_projects}")
+        
+        self._log_project_durations()
+        if self.budget_task is not None and self.budget_task.running:
+            self.budget_task.stop()
+        
+        if self.shared_pages is not None:
+            self.logger.info(
+                f"共享页面库: 节省请求 {self.shared_pages.requests_avoided} 个，"
+                f"节省下载 {self.shared_pages.bytes_avoided / 1024 / 1024:.1f} MB")
+        
+        if self.sitemaps is not None:
+            self._log_sitemap_report()
+        
+        if self.relevance_batcher is not None:
+            batcher = self.relevance_batcher
+            self.logger.info(
+                f"相关性分类: 打分 {batcher.scored} 个页面，{batcher.batches} 个批次"
+                f"（平均每批 {batcher.scored / max(batcher.batches, 1):.1f} 个），"
+                f"低于阈值 {self.crawler.stats.get_value('relevance/below_threshold', 0)} 个")
+        
+        if self.url_verdict_cache is not None:
+            self.logger.info(f"URL判定缓存: 命中 {self.url_verdict_cache.hits}，未命中 {self.url_verdict_cache.misses}")
+        
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+        
+        if self.failure_journal is not None:
+            self.failure_journal.close()
+        
+        if self.checkpoint is not None:
+            # 正常结束且没有剩余项目时删除断点，下一次运行重新开始
+            finished = reason == 'finished' and not self.project_queue and not self.active_projects
+            self.checkpoint.close(remove=finished)
+            if not finished:
+                self.logger.info(f"断点已保存，重新运行同一CSV即可续爬: {self.checkpoint.path}")
+        
+        if self.http_cache is not None:
+            self.http_cache.close()
+        
+        if self.incremental_state is not None:
+            self.incremental_state.close()
+    
+    def _log_project_durations(self):
+        """输出项目耗时分布，并写入 stats project_duration/*"""
+        if not self.project_durations:
+            return
+        durations = sorted(self.project_durations)
+        
+        def percentile(p):
+            return durations[min(len(durations) - 1, int(p / 100 * len(durations)))]
+        
+        summary = {'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99), 'max': durations[-1]}
+        for name, value in summary.items():
+            self.crawler.stats.set_value(f'project_duration/{name}', round(value, 1))
+        stats = self.crawler.stats
+        self.logger.info(
+            f"项目耗时分布（{len(durations)} 个项目）: "
+            + ", ".join(f"{name} {value:.1f}s" for name, value in summary.items())
+            + f"；超出时间预算 {stats.get_value('project_budget/partial_time', 0)} 个，"
+            f"达到页面预算 {stats.get_value('project_budget/partial_pages', 0)} 个")
+    
+    def _log_sitemap_report(self):
+        """按网站对比 sitemap 与锚文本两种子链接发现方式：项目数、平均页面数、平均耗时、平均主题覆盖率"""
+        def describe(summary):
+            if summary is None:
+                return '-'
+            return (f"{summary['projects']} 个项目，平均 {summary['avg_pages']} 页 / {summary['avg_seconds']}s，"
+                    f"覆盖率 {summary['avg_coverage']:.0%}")
+        
+        self.logger.info("=== sitemap 发现统计（按网站） ===")
+        for row in self.sitemaps.report():
+            self.logger.info(
+                f"{row['site']} [{row['state']}, {row['sitemap_urls']} 个URL] "
+                f"sitemap: {describe(row.get('sitemap'))}；锚文本: {describe(row.get('anchor'))}")
+    
+    def extract_content_from_soup(self, soup):
+        """按 CONTENT_EXTRACTOR 设置提取结构化内容（会移除 soup 中的脚本/导航等元素）"""
+        try:
+            return extract_structured_content(soup, self.content_extractor)
+        except Exception as e:
+            self.logger.error(f"结构化内容提取失败: {e}")
+            return ""
     
     def extract_structured_content_from_soup(self, soup):
         """
@@ -791,132 +1528,33 @@ class ProgramSpider(scrapy.Spider):
         保留标题层级、表格结构等关键信息
         """
         try:
-            if soup is None:
-                return ""
-            
-            # 移除不需要的元素但保留主要内容结构
-            for script in soup(["script", "style", "nav", "header", "footer", "aside"]):
-                script.decompose()
-            
-            content_parts = []
-            
-            # 提取并保留标题结构
-            content_parts.extend(self.extract_structured_headings(soup))
-            
-            # 提取并保留表格结构
-            content_parts.extend(self.extract_structured_tables(soup))
-            
-            # 提取段落和列表内容
-            content_parts.extend(self.extract_structured_text_elements(soup))
-            
-            return '\n'.join(filter(None, content_parts))
-            
+            return extract_structured_content_legacy(soup)
         except Exception as e:
             self.logger.error(f"结构化内容提取失败: {e}")
             return ""
     
     def extract_structured_headings(self, soup):
         """提取保留层级的标题结构"""
-        content_parts = []
-        
-        for tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            text = tag.get_text().strip()
-            if text:
-                tag_name = tag.name.upper()
-                content_parts.append(f"<{tag_name}>{text}</{tag_name}>")
-        
-        return content_parts
+        return extract_structured_headings(soup)
     
     def extract_structured_tables(self, soup):
         """提取保留结构的表格内容"""
-        content_parts = []
-        
-        for table in soup.find_all('table'):
-            table_html = self.extract_clean_table_html(table)
-            if table_html:
-                content_parts.append(table_html)
-        
-        return content_parts
+        return extract_structured_tables(soup)
     
     def extract_clean_table_html(self, table):
         """提取清理后的表格HTML结构"""
-        try:
-            # 创建新的表格结构
-            table_content = ["<table>"]
-            
-            for tr in table.find_all('tr'):
-                row_content = ["<tr>"]
-                
-                for cell in tr.find_all(['td', 'th']):
-                    cell_text = cell.get_text().strip()
-                    tag_name = cell.name
-                    if cell_text:
-                        row_content.append(f"<{tag_name}>{cell_text}</{tag_name}>")
-                    else:
-                        row_content.append(f"<{tag_name}></{tag_name}>")
-                
-                if len(row_content) > 1:  # 如果有内容才添加行
-                    row_content.append("</tr>")
-                    table_content.append("".join(row_content))
-            
-            table_content.append("</table>")
-            
-            # 只有表格有实际内容才返回
-            if len(table_content) > 2:  # 超过开始和结束标签
-                return "\n".join(table_content)
-            
-            return ""
-            
-        except Exception as e:
-            self.logger.error(f"表格HTML提取失败: {e}")
-            return ""
+        return extract_clean_table_html(table)
     
     def extract_structured_text_elements(self, soup):
         """提取其他文本元素，保持基本结构"""
-        content_parts = []
-        
-        # 提取段落
-        for tag in soup.find_all('p'):
-            text = tag.get_text().strip()
-            if text and len(text) > 10:
-                content_parts.append(f"<p>{text}</p>")
-        
-        # 提取列表，保持结构
-        for tag in soup.find_all(['ul', 'ol']):
-            list_items = []
-            for li in tag.find_all('li'):
-                item_text = li.get_text().strip()
-                if item_text:
-                    list_items.append(f"<li>{item_text}</li>")
-            
-            if list_items:
-                list_tag = tag.name
-                list_content = [f"<{list_tag}>"] + list_items + [f"</{list_tag}>"]
-                content_parts.append("\n".join(list_content))
-        
-        return content_parts
+        return extract_structured_text_elements(soup)
 
     # ------------------------------------------------------------------
     # signal handlers
     # ------------------------------------------------------------------
     def spider_idle(self):
-        """当爬虫即将 idle 时，如果队列中还有项目，则启动下一个项目"""
-        if self.project_queue and not self.is_processing_project:
-            self.logger.info("spider_idle 触发，调度下一个项目 …")
-            responses = list(self.start_next_project())
-            requests = []
-            
-            # 分离Request和Item对象
-            for obj in responses:
-                if hasattr(obj, 'url') and hasattr(obj, 'callback'):
-                    # 这是一个Request对象
-                    requests.append(obj)
-                else:
-                    # 这是一个Item对象，直接通过pipeline处理
-                    self.crawler.engine.scraper.itemproc.process_item(obj, self)
-            
-            if requests:
-                for req in requests:
-                    # 直接通过 engine 调度，避免深度叠加（Scrapy ≥2.9 的 crawl 只接受 request 参数）
-                    self.crawler.engine.crawl(req)
-                raise DontCloseSpider  # 告诉 Scrapy 暂时不要关闭
\ No newline at end of file
+        """当爬虫即将 idle 时，如果队列中还有项目，则补位启动项目（兜底调度）"""
+        if self.project_queue and len(self.active_projects) < self.max_concurrent_projects:
+            self.logger.info("spider_idle 触发，调度下一批项目 …")
+            if self._schedule_next_projects():
+                raise DontCloseSpider  # 告诉 Scrapy 暂时不要关闭
@@ -0,0 +1,67 @@
+"""
+SQLite 存储基类 - 条件请求缓存（http_cache）与增量状态（incremental）共用
+
+1. 打开连接并按子类的 SCHEMA 建表
+2. 写入计数，每 commit_every 次写入提交一次事务
+3. shared() / close()：同一进程内按 (类, 绝对路径) 共享一个实例，引用计数归零时才关闭连接
+
+只在 reactor 线程中读写。
+"""
+
+import os
+import sqlite3
+
+
+class SQLiteStore:
+    """
+    带批量提交与进程内共享的 SQLite 存储（子类通过 SCHEMA 定义表结构）
+
+    Args:
+        db_path (str): SQLite 文件路径
+        commit_every (int): 每多少次写入提交一次
+    """
+
+    SCHEMA = ''
+
+    _instances = {}  # (类, 绝对路径) -> 进程内共享的实例
+
+    def __init__(self, db_path, commit_every=100):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self.pending_writes = 0
+        self.refs = 0
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    def _write(self, sql, params):
+        self.conn.execute(sql, params)
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_writes = 0
+
+    @classmethod
+    def shared(cls, db_path, commit_every=100):
+        """
+        同一进程内的多个爬虫（run_crawler.py 多CSV模式）共用一个连接：
+        两个连接各自持有未提交的写事务时，后写入的一方会因 SQLite 写锁阻塞 reactor
+        """
+        key = (cls, os.path.abspath(db_path))
+        store = cls._instances.get(key)
+        if store is None:
+            store = cls._instances[key] = cls(db_path, commit_every)
+        store.refs += 1
+        return store
+
+    def close(self):
+        self.commit()
+        if self.refs > 1:
+            self.refs -= 1
+            return
+        self.conn.close()
+        self._instances.pop((type(self), os.path.abspath(self.db_path)), None)
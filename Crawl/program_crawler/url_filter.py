@@ -2,7 +2,7 @@
 URL过滤模块 - 黑名单过滤系统
 
 功能：
-1. 基于关键词的快速过滤
+1. 基于关键词的快速过滤（多模式关键词自动机，一次扫描匹配全部关键词）
 2. 基于正则表达式的精确过滤
 3. 统一的过滤接口
 
@@ -13,6 +13,8 @@ URL过滤模块 - 黑名单过滤系统
 """
 
 import re
+from collections import OrderedDict
+from urllib.parse import urlsplit
 
 # 白名单关键词 - 仅当 URL 或链接文本包含下列关键词时才会被爬取
 URL_WHITELIST_KEYWORDS = [
@@ -83,7 +85,7 @@ URL_BLACKLIST_KEYWORDS = [
 
 # 正则表达式黑名单 - 用于精确匹配
 # 优点：匹配精确，减少误杀
-# 缺点：速度较慢，正则表达式复杂
+# 缺点：正则表达式复杂（导入时预编译为 URL_BLACKLIST_REGEX，见 BlacklistRegex）
 URL_BLACKLIST_PATTERNS = [
     # 媒体/新闻/宣传 - 匹配路径中的媒体相关目录
     r'(?i)(^|/)(news|events?|event-calendar|stories|story|press(-office)?|media|podcasts?|videos?|webinars?|magazine|newsletter|campaigns?)(/|$)',
@@ -123,6 +125,176 @@ URL_BLACKLIST_PATTERNS = [
     r'\.(jpg|jpeg|png|gif|svg|ico|mp4|mp3|mov|zip|rar|pptx?|xls[x]?|docx?)$'
 ]
 
+class BlacklistRegex:
+    """
+    预编译的URL正则黑名单
+    
+    形如 (?i)(^|/)(...)(/|$) 的“路径段”规则（绝大多数规则）合并为一个正则：
+    (?i)(?:^|/)(?:(?P<r0>...)|(?P<r1>...)|...)(?=/|$)，一次扫描即可判断全部规则，
+    并通过命名分组得知命中的是哪条规则；其余规则（如静态资源扩展名）单独预编译。
+    
+    注意：Python re 对未提取公共前后缀的多规则大分支并不比逐条匹配快，
+    因此这里只合并结构相同的规则。
+    
+    Args:
+        patterns (list[str]): 正则规则列表，match_rule 返回的下标即对应此列表
+    """
+    
+    SEGMENT_PREFIX = '(?i)(^|/)('
+    SEGMENT_SUFFIX = ')(/|$)'
+    
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        segment_rules = []
+        self.other_rules = []  # [(下标, 编译后的正则), ...]
+        for index, pattern in enumerate(self.patterns):
+            if pattern.startswith(self.SEGMENT_PREFIX) and pattern.endswith(self.SEGMENT_SUFFIX):
+                body = pattern[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]
+                segment_rules.append(f'(?P<r{index}>{body})')
+            else:
+                self.other_rules.append((index, re.compile(pattern)))
+        
+        self.segment_regex = None
+        if segment_rules:
+            self.segment_regex = re.compile(f"(?i)(?:^|/)(?:{'|'.join(segment_rules)})(?=/|$)")
+    
+    def match_rule(self, url):
+        """
+        返回命中的规则下标，未命中返回 -1
+        
+        路径段规则中报告URL里最靠左的命中位置对应的规则（同一位置按列表顺序），
+        路径段规则均未命中时再按列表顺序检查其余规则。
+        """
+        if self.segment_regex is not None:
+            match = self.segment_regex.search(url)
+            if match is not None:
+                return int(match.lastgroup[1:])
+        for index, regex in self.other_rules:
+            if regex.search(url):
+                return index
+        return -1
+
+
+class UrlVerdictCache:
+    """
+    按 host 分组的 LRU 判定缓存
+    
+    同一网站的页面往往重复链接相同的导航/页脚URL，缓存最近的判定结果可避免重复匹配。
+    每个 host 最多缓存 per_host 条URL，最多保留 max_hosts 个 host（均按最近使用淘汰）。
+    
+    Args:
+        per_host (int): 每个 host 缓存的URL数
+        max_hosts (int): 缓存的 host 数
+    """
+    
+    def __init__(self, per_host=1024, max_hosts=256):
+        self.per_host = per_host
+        self.max_hosts = max_hosts
+        self.hosts = OrderedDict()  # host -> OrderedDict(url -> 判定结果)
+        self.hits = 0
+        self.misses = 0
+    
+    def get_or_compute(self, url, compute):
+        """返回缓存的判定结果；未缓存时调用 compute(url) 并缓存"""
+        host = urlsplit(url).netloc
+        entries = self.hosts.get(host)
+        if entries is None:
+            entries = self.hosts[host] = OrderedDict()
+            if len(self.hosts) > self.max_hosts:
+                self.hosts.popitem(last=False)
+        else:
+            self.hosts.move_to_end(host)
+            if url in entries:
+                entries.move_to_end(url)
+                self.hits += 1
+                return entries[url]
+        
+        self.misses += 1
+        verdict = entries[url] = compute(url)
+        if len(entries) > self.per_host:
+            entries.popitem(last=False)
+        return verdict
+
+
+# 预编译的正则黑名单（模块导入时构建一次）
+URL_BLACKLIST_REGEX = BlacklistRegex(URL_BLACKLIST_PATTERNS)
+
+
+class KeywordAutomaton:
+    """
+    多模式关键词自动机（Aho-Corasick，预先展开为DFA）
+    
+    构建一次后，对任意文本只需从左到右扫描一遍即可判断是否包含任一关键词，
+    耗时与关键词数量无关（原实现对每个关键词各做一次子串查找）。
+    
+    只用于 contains_any 这类“是否包含任一关键词”的判断：未命中的文本原实现要查完全部关键词。
+    需要按列表顺序返回第一个关键词时（get_matched_whitelist_keyword），短文本逐个子串查找更快。
+    
+    注意：关键词在构建时固定，之后修改原关键词列表不会影响已构建的自动机。
+    
+    Args:
+        keywords (list[str]): 关键词列表（需已是小写）
+    """
+    
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        
+        # 1. 构建关键词前缀树（goto）
+        goto = [{}]
+        output = [False]  # 到达该状态时是否已匹配到某个关键词
+        for keyword in self.keywords:
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    goto.append({})
+                    output.append(False)
+                    next_state = len(goto) - 1
+                    goto[state][char] = next_state
+                state = next_state
+            output[state] = True
+        
+        # 2. 按层（BFS）计算失败指针，并把 goto + 失败指针展开为完整的转移表
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = list(goto[0].values())
+        while queue:
+            next_queue = []
+            for state in queue:
+                # 失败状态的层数更浅，转移表已经展开完成
+                transitions = dict(delta[fail[state]])
+                for char, child in goto[state].items():
+                    fail[child] = delta[fail[state]].get(char, 0)
+                    transitions[char] = child
+                    next_queue.append(child)
+                delta[state] = transitions
+                # 失败状态匹配到的关键词（当前状态的后缀）同样算作匹配
+                output[state] = output[state] or output[fail[state]]
+            queue = next_queue
+        
+        self._delta = delta
+        self._output = output
+    
+    def contains_any(self, text):
+        """文本是否包含任一关键词（找到第一个匹配即返回）"""
+        delta = self._delta
+        output = self._output
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+# 预构建的关键词自动机，所有过滤函数共用（模块导入时构建一次）
+URL_WHITELIST_AUTOMATON = KeywordAutomaton(URL_WHITELIST_KEYWORDS)
+ANCHOR_TEXT_BLACKLIST_AUTOMATON = KeywordAutomaton(ANCHOR_TEXT_BLACKLIST)
+URL_BLACKLIST_AUTOMATON = KeywordAutomaton(URL_BLACKLIST_KEYWORDS)
+
 
 def should_skip_url(url):
     """
@@ -147,15 +319,15 @@ def should_skip_url(url):
     """
     url_lower = url.lower()  # 转换为小写，忽略大小写差异
     
-    # 遍历黑名单关键词，只要匹配到一个就返回True
-    return any(keyword in url_lower for keyword in URL_BLACKLIST_KEYWORDS)
+    # 一次扫描匹配全部黑名单关键词，只要匹配到一个就返回True
+    return URL_BLACKLIST_AUTOMATON.contains_any(url_lower)
 
 
-def should_skip_url_regex(url):
+def should_skip_url_regex(url, verdict_cache=None):
     """
     基于正则表达式的精确URL过滤
     
-    策略：使用预定义的正则表达式模式精确匹配URL结构
+    策略：使用预编译的正则黑名单（URL_BLACKLIST_REGEX）精确匹配URL结构
     
     优点：
     - 匹配精确，减少误杀
@@ -163,20 +335,29 @@ def should_skip_url_regex(url):
     - 支持路径边界匹配
     
     缺点：
-    - 执行速度较慢
     - 正则表达式复杂，维护成本高
     
     Args:
         url (str): 要检查的URL
+        verdict_cache (UrlVerdictCache): 可选的按 host 判定缓存
         
     Returns:
         bool: True表示应该跳过该URL，False表示可以爬取
     """
-    # 遍历正则表达式模式列表
-    for pattern in URL_BLACKLIST_PATTERNS:
-        if re.search(pattern, url):  # 使用re.search进行模式匹配
-            return True
-    return False
+    return get_matched_blacklist_rule(url, verdict_cache) >= 0
+
+
+def get_matched_blacklist_rule(url, verdict_cache=None):
+    """
+    返回命中的正则黑名单规则下标（对应 URL_BLACKLIST_PATTERNS），未命中返回 -1
+    
+    Args:
+        url (str): 要检查的URL
+        verdict_cache (UrlVerdictCache): 可选的按 host 判定缓存
+    """
+    if verdict_cache is not None:
+        return verdict_cache.get_or_compute(url, URL_BLACKLIST_REGEX.match_rule)
+    return URL_BLACKLIST_REGEX.match_rule(url)
 
 
 def has_whitelist_keywords(url: str, anchor_text: str = "") -> bool:
@@ -194,8 +375,29 @@ def has_whitelist_keywords(url: str, anchor_text: str = "") -> bool:
     if not anchor_text:
         return False
  
+    return URL_WHITELIST_AUTOMATON.contains_any(anchor_text.lower())
+
+def get_matched_whitelist_keyword(anchor_text):
+    """
+    返回锚文本中匹配到的第一个白名单关键词（按 URL_WHITELIST_KEYWORDS 顺序）
+    
+    锚文本通常很短，按列表顺序逐个子串查找比自动机逐字符扫描更快（常见关键词排在前面，
+    命中时很早返回），因此这里不使用 URL_WHITELIST_AUTOMATON。
+    
+    Args:
+        anchor_text (str): 链接显示文本
+        
+    Returns:
+        str | None: 匹配的关键词，未匹配返回 None
+    """
+    if not anchor_text:
+        return None
+    
     text_lower = anchor_text.lower()
-    return any(keyword in text_lower for keyword in URL_WHITELIST_KEYWORDS)
+    for keyword in URL_WHITELIST_KEYWORDS:
+        if keyword in text_lower:
+            return keyword
+    return None
 
 def should_skip_by_anchor_text(anchor_text):
     """
@@ -211,28 +413,33 @@ def should_skip_by_anchor_text(anchor_text):
         return False
         
     text_lower = anchor_text.lower().strip()
-    return any(blacklist_text in text_lower for blacklist_text in ANCHOR_TEXT_BLACKLIST)
+    return ANCHOR_TEXT_BLACKLIST_AUTOMATON.contains_any(text_lower)
 
-def filter_url(url, use_regex=False, enable_whitelist=True, anchor_text=''):
+def filter_url(url, use_regex=False, enable_whitelist=True, anchor_text='', verdict_cache=None):
     """
-    统一的URL过滤接口（纯白名单模式）
+    统一的URL过滤接口（白名单模式，可选叠加正则黑名单）
     
     过滤逻辑：
-    1. 只要 URL 或 anchor text 包含白名单关键词 -> 允许爬取（返回 False）
-    2. 其余情况一律跳过（返回 True）
+    1. use_regex=True 时，URL 命中正则黑名单 -> 跳过（返回 True）
+    2. 只要 anchor text 包含白名单关键词 -> 允许爬取（返回 False）
+    3. 其余情况一律跳过（返回 True）
     
     Args:
         url (str): 要过滤的 URL
-        use_regex (bool): 保留参数以兼容旧调用，当前忽略
+        use_regex (bool): 是否先用正则黑名单过滤 URL（settings.URL_FILTER_USE_REGEX）
         enable_whitelist (bool): 保留参数以兼容旧调用，当前忽略
         anchor_text (str): 链接文本
+        verdict_cache (UrlVerdictCache): 可选的正则黑名单按 host 判定缓存
     
     Returns:
         bool: True 表示跳过 (不爬取)，False 表示允许爬取
     """
-    # 纯白名单判断：匹配关键词即通过
+    if use_regex and should_skip_url_regex(url, verdict_cache):
+        return True
+    
+    # 白名单判断：匹配关键词即通过
     if has_whitelist_keywords(url, anchor_text):
         return False  # 不跳过，允许爬取
     
     # 其他任何情况都跳过
-    return True
\ No newline at end of file
+    return True
@@ -1,6 +1,41 @@
 #!/usr/bin/env python3
+"""
+多CSV并行爬取 - 有界进程池运行 run_crawler.py
+
+- 同时运行最多 --workers 个 run_crawler.py 子进程，每个CSV一个进程
+- 耗时最长的CSV优先启动：按 status_log/run_history.json 中上次的耗时排序，
+  没有历史记录的CSV按项目数 × 历史平均每项目耗时估算
+- --max-per-domain K：同一站点（注册域名）最多同时被 K 个进程爬取；0 表示不限制
+  （单个进程内部的并发由 settings.PROJECTS_PER_DOMAIN 控制）
+- 每个进程以 --separate-state 运行：状态文件写入 status_log/{CSV名}/，条件请求缓存与增量状态
+  使用 httpcache/{CSV名}/ 下各自的 SQLite
+- 单个CSV失败不影响其他CSV；结束时输出每个CSV的状态，并写入运行历史
+- --retry-failed：只重新运行上次未成功的CSV（失败、中断或仍有断点）
+
+用法：
+    python run_all_subjects.py --group 5 --workers 4
+    python run_all_subjects.py --all --workers 8 --max-per-domain 2
+    python run_all_subjects.py --retry-failed --workers 4
+    python run_all_subjects.py urls_subject/计算机/计算机_1.csv urls_subject/金融/金融_1.csv
+"""
+
+import argparse
+import csv
+import json
+import os
 import subprocess
 import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from shard_launcher import site_key
+from plan_crawl import collect_csv_files
+
+CRAWL_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(CRAWL_DIR, 'status_log', 'run_history.json')
+RUNNER_LOG_DIR = os.path.join(CRAWL_DIR, 'status_log', 'runner')
+
 
 # 第1组 (1-23)
 group1 = [
@@ -146,21 +181,189 @@ group5 = [
     "urls_subject/食品科学/食品科学_urls.csv"
 ]
 
-# 选择要运行的组 (修改这里选择组号)
-selected_group = group5  # 改为 group1, group2, group3, group4, group5
+GROUPS = [group1, group2, group3, group4, group5]
+
+# 没有任何历史耗时时，每个项目的估算耗时（秒），只用于排序
+DEFAULT_SECONDS_PER_PROJECT = 10.0
+
+
+def load_history():
+    if not os.path.exists(HISTORY_FILE):
+        return {}
+    with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_history(history):
+    """原子写入运行历史"""
+    os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+    tmp_file = HISTORY_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, HISTORY_FILE)
+
+
+def read_job(csv_file):
+    """读取CSV的项目数与站点集合"""
+    with open(os.path.join(CRAWL_DIR, csv_file), 'r', encoding='utf-8-sig') as f:
+        urls = [(row.get('program_url') or '').strip() for row in csv.DictReader(f)]
+    sites = {site_key(url) for url in urls if url.startswith(('http://', 'https://'))}
+    return {'csv_file': csv_file, 'projects': len(urls), 'sites': sites}
+
+
+def estimate_durations(jobs, history):
+    """上次耗时；没有历史的按项目数 × 历史平均每项目耗时估算"""
+    known = [(history[job['csv_file']]['duration'], history[job['csv_file']].get('projects') or 0)
+             for job in jobs if job['csv_file'] in history and history[job['csv_file']].get('duration')]
+    total_projects = sum(projects for _duration, projects in known)
+    per_project = (sum(duration for duration, _projects in known) / total_projects
+                   if total_projects else DEFAULT_SECONDS_PER_PROJECT)
+    for job in jobs:
+        entry = history.get(job['csv_file'], {})
+        job['estimate'] = entry.get('duration') or job['projects'] * per_project
+
+
+def checkpoint_exists(csv_file):
+    """run_crawler 正常结束会删除断点；断点仍在说明该CSV没有爬完"""
+    csv_basename = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.exists(os.path.join(CRAWL_DIR, 'checkpoints', f'{csv_basename}.jsonl'))
 
-print(f"开始爬取选定组，共 {len(selected_group)} 个CSV文件")
 
-for i, csv_file in enumerate(selected_group, 1):
-    print(f"\n[{i}/{len(selected_group)}] 爬取: {csv_file}")
+def can_start(job, active_sites, max_per_domain):
+    if not max_per_domain:
+        return True
+    return all(active_sites[site] < max_per_domain for site in job['sites'])
+
+
+def run_jobs(jobs, workers, max_per_domain, history):
+    """
+    有界进程池运行全部CSV
+
+    Returns:
+        dict: {csv_file: 状态}，状态为 success / failed / incomplete / interrupted
+    """
+    os.makedirs(RUNNER_LOG_DIR, exist_ok=True)
+    pending = sorted(jobs, key=lambda job: -job['estimate'])  # 耗时最长的先启动
+    running = {}  # csv_file -> (Popen, job, 开始时间, 输出文件)
+    active_sites = Counter()
+    results = {}
+    total = len(pending)
+
+    def finish(csv_file, status, returncode):
+        process, job, started, out_file = running.pop(csv_file)
+        out_file.close()
+        active_sites.subtract(job['sites'])
+        duration = time.time() - started
+        results[csv_file] = status
+        entry = history.setdefault(csv_file, {})
+        entry.update({
+            'status': status,
+            'returncode': returncode,
+            'projects': job['projects'],
+            'finished_at': datetime.now().isoformat(),
+        })
+        # 只用完整运行的耗时估算下一次的排序
+        if status == 'success':
+            entry['duration'] = round(duration, 1)
+        save_history(history)
+        mark = '✓' if status == 'success' else '✗'
+        print(f"{mark} [{len(results)}/{total}] {csv_file}: {status}（{duration / 60:.1f} 分钟，退出码 {returncode}）")
+
     try:
-        subprocess.run([sys.executable, "run_crawler.py", csv_file], check=True)
-        print(f"✓ 完成")
-    except subprocess.CalledProcessError:
-        print(f"✗ 失败")
-        break
+        while pending or running:
+            # 启动：按优先级取第一个站点未达上限的CSV
+            while pending and len(running) < workers:
+                job = next((job for job in pending if can_start(job, active_sites, max_per_domain)), None)
+                if job is None:
+                    break
+                pending.remove(job)
+                csv_file = job['csv_file']
+                log_name = csv_file.replace('/', '_').replace(os.sep, '_') + '.out'
+                out_file = open(os.path.join(RUNNER_LOG_DIR, log_name), 'w', encoding='utf-8')
+                # 同时运行的进程各写自己的状态文件与 SQLite，避免互相覆盖和写锁超时
+                process = subprocess.Popen([sys.executable, 'run_crawler.py', csv_file, '--separate-state'],
+                                           cwd=CRAWL_DIR, stdout=out_file, stderr=subprocess.STDOUT)
+                running[csv_file] = (process, job, time.time(), out_file)
+                active_sites.update(job['sites'])
+                print(f"→ 启动 {csv_file}（{job['projects']} 个项目，预计 {job['estimate'] / 60:.1f} 分钟），"
+                      f"运行中 {len(running)}，等待 {len(pending)}")
+
+            time.sleep(1)
+            for csv_file, (process, _job, _started, _out) in list(running.items()):
+                returncode = process.poll()
+                if returncode is None:
+                    continue
+                if returncode != 0:
+                    status = 'failed'
+                elif checkpoint_exists(csv_file):
+                    status = 'incomplete'
+                else:
+                    status = 'success'
+                finish(csv_file, status, returncode)
+
     except KeyboardInterrupt:
-        print("\n用户中断")
-        break
+        print("\n用户中断，正在停止运行中的爬虫...")
+        for process, _job, _started, _out in running.values():
+            process.terminate()
+        for csv_file, (process, _job, _started, _out) in list(running.items()):
+            process.wait()
+            finish(csv_file, 'interrupted', process.returncode)
+        for job in pending:
+            results[job['csv_file']] = 'not_started'
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多CSV并行爬取')
+    parser.add_argument('csv_files', nargs='*', help='要爬取的CSV（默认使用 --group 指定的组）')
+    parser.add_argument('--group', type=int, default=5, choices=range(1, len(GROUPS) + 1),
+                        help='预设CSV组（1-5）')
+    parser.add_argument('--all', action='store_true', help='爬取 urls_subject/ 下全部CSV')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='只运行运行历史中上次未成功的CSV（可与组/CSV列表组合作为过滤）')
+    parser.add_argument('--workers', type=int, default=4, help='同时运行的爬虫进程数')
+    parser.add_argument('--max-per-domain', type=int, default=0,
+                        help='同一站点最多同时被几个进程爬取（0 不限制）')
+    args = parser.parse_args()
+
+    history = load_history()
+    if args.csv_files:
+        csv_files = args.csv_files
+    elif args.all:
+        csv_files = [os.path.relpath(path, CRAWL_DIR)
+                     for path in collect_csv_files([os.path.join(CRAWL_DIR, 'urls_subject')])]
+    elif args.retry_failed:
+        csv_files = sorted(history)
+    else:
+        csv_files = GROUPS[args.group - 1]
+
+    if args.retry_failed:
+        csv_files = [csv_file for csv_file in csv_files
+                     if history.get(csv_file, {}).get('status') not in (None, 'success')]
+
+    if not csv_files:
+        print("没有需要运行的CSV")
+        return
+
+    jobs = [read_job(csv_file) for csv_file in csv_files]
+    estimate_durations(jobs, history)
+
+    print(f"开始爬取，共 {len(jobs)} 个CSV，{args.workers} 个并行进程"
+          + (f"，同一站点最多 {args.max_per_domain} 个进程" if args.max_per_domain else ''))
+    started = time.time()
+    results = run_jobs(jobs, max(1, args.workers), args.max_per_domain, history)
+
+    print("\n" + "=" * 60)
+    print(f"爬取结束，用时 {(time.time() - started) / 60:.1f} 分钟")
+    for csv_file in csv_files:
+        print(f"  {results.get(csv_file, 'not_started'):<12} {csv_file}")
+    counts = Counter(results.values())
+    print(f"成功 {counts['success']}，失败 {counts['failed']}，未完成 {counts['incomplete']}，"
+          f"中断 {counts['interrupted']}，未启动 {counts['not_started']}")
+    if len(results) != counts['success']:
+        print("重新运行未成功的CSV: python run_all_subjects.py --retry-failed")
+
 
-print("\n该组爬取结束")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
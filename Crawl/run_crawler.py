@@ -3,84 +3,217 @@
 爬虫启动脚本
 
 支持两种模式：
-1. 测试模式：python run_crawler.py --test 
-2. 完整模式：python run_crawler.py 
+1. 测试模式：python run_crawler.py --test
+2. 完整模式：python run_crawler.py
+
+可以一次传入多个CSV：python run_crawler.py a.csv b.csv c.csv --overlap 2
+所有CSV在同一个 CrawlerProcess 中依次（或最多 --overlap 个同时）爬取，Scrapy/解析库的导入与
+reactor 启动只发生一次；每个CSV仍有各自的日志文件、断点与状态文件。
 """
 
 import os
 import sys
 import argparse
+import logging
 from datetime import datetime
-from scrapy.crawler import CrawlerProcess
+from scrapy.crawler import Crawler, CrawlerProcess
 from scrapy.utils.project import get_project_settings
 
+
+class SpiderCsvFilter(logging.Filter):
+    """只放行属于指定CSV爬虫的日志记录（Scrapy 的爬虫日志带有 extra={'spider': spider}）"""
+
+    def __init__(self, csv_file):
+        super().__init__()
+        self.csv_file = csv_file
+
+    def filter(self, record):
+        spider = getattr(record, 'spider', None)
+        return spider is not None and getattr(spider, 'csv_file', None) == self.csv_file
+
+
+def get_log_filepath(csv_file, timestamp, log_root):
+    """日志路径：{日志根目录}/{学科}/{CSV文件名}_{时间}.log"""
+    # 从CSV文件路径中提取文件名（不含扩展名）
+    csv_basename = os.path.splitext(os.path.basename(csv_file))[0]
+
+    # 提取学科名称（去掉可能的数字后缀，如"计算机_1" -> "计算机"）
+    subject_name = csv_basename.split('_')[0] if '_' in csv_basename else csv_basename
+
+    subject_log_dir = os.path.join(log_root, subject_name)
+    # 确保学科日志目录存在
+    if not os.path.exists(subject_log_dir):
+        os.makedirs(subject_log_dir)
+    return os.path.join(subject_log_dir, f'{csv_basename}_{timestamp}.log')
+
+
+def get_fanout_map(csv_file, fanout_map=None):
+    """计划CSV（plan_crawl.py）旁边的扇出映射：结果复制给引用同一根URL的其他项目"""
+    if fanout_map is None and os.path.exists(os.path.splitext(csv_file)[0] + '.fanout.json'):
+        fanout_map = os.path.splitext(csv_file)[0] + '.fanout.json'
+    if fanout_map:
+        fanout_map = os.path.abspath(fanout_map)
+        print(f"使用扇出映射: {fanout_map}")
+    return fanout_map
+
+
+def apply_run_settings(settings, csv_file, run_dir, log_root, fanout_map, separate_state=False):
+    """设置单个CSV爬取相关的配置（扇出映射、独立运行目录、按CSV分开的状态文件与 SQLite）"""
+    csv_basename = os.path.splitext(os.path.basename(csv_file))[0]
+    if fanout_map:
+        settings.set('FANOUT_MAP_FILE', fanout_map)
+    if run_dir:
+        # 每个分片写自己的目录，多个节点共享文件系统时互不干扰
+        settings.set('OUTPUT_DIR', os.path.join(run_dir, 'output'))
+        settings.set('FAILURE_LOG_DIR', log_root)
+        settings.set('STATUS_LOG_DIR', os.path.join(run_dir, 'status_log'))
+        settings.set('CHECKPOINT_FILE', os.path.join(run_dir, 'checkpoints', f'{csv_basename}.jsonl'))
+        settings.set('HTTP_CONDITIONAL_CACHE_DB', os.path.join(run_dir, 'httpcache', 'conditional_cache.sqlite'))
+        settings.set('INCREMENTAL_STATE_DB', os.path.join(run_dir, 'httpcache', 'incremental_state.sqlite'))
+        settings.set('ADAPTIVE_RATE_FILE', os.path.join(run_dir, 'httpcache', 'domain_rates.json'))
+    if separate_state:
+        # 多个 run_crawler.py 进程同时运行（run_all_subjects.py）：状态文件名只精确到分钟，同一分钟启动的进程
+        # 会互相覆盖；共用一个 SQLite 时，持有未提交写事务的进程会让其他进程等到锁超时（database is locked）
+        state_root = run_dir or os.getcwd()
+        settings.set('STATUS_LOG_DIR', os.path.join(state_root, 'status_log', csv_basename))
+        settings.set('HTTP_CONDITIONAL_CACHE_DB',
+                     os.path.join(state_root, 'httpcache', csv_basename, 'conditional_cache.sqlite'))
+        settings.set('INCREMENTAL_STATE_DB',
+                     os.path.join(state_root, 'httpcache', csv_basename, 'incremental_state.sqlite'))
+
+
+def run_multiple(process, settings, csv_files, args, run_dir, log_root, timestamp):
+    """
+    在同一个 CrawlerProcess 中爬取多个CSV：最多 args.overlap 个同时运行，其余排队
+
+    Returns:
+        list: 每个CSV的日志路径
+    """
+    from twisted.internet import defer, reactor
+
+    semaphore = defer.DeferredSemaphore(max(1, args.overlap))
+    spider_cls = process.spider_loader.load('program_spider')
+    status_root = settings.get('STATUS_LOG_DIR') or os.path.join(os.getcwd(), 'status_log')
+    if run_dir:
+        status_root = os.path.join(run_dir, 'status_log')
+
+    log_filepaths = []
+    crawls = []
+    for csv_file in csv_files:
+        crawler_settings = settings.copy()
+        apply_run_settings(crawler_settings, csv_file, run_dir, log_root, get_fanout_map(csv_file),
+                           args.separate_state)
+        # 同时运行的爬虫各写自己的状态文件（文件名只精确到分钟，放在同一目录会互相覆盖）
+        csv_basename = os.path.splitext(os.path.basename(csv_file))[0]
+        crawler_settings.set('STATUS_LOG_DIR', os.path.join(status_root, csv_basename))
+
+        # 每个CSV单独的日志文件：按日志记录所属的爬虫过滤
+        log_filepath = get_log_filepath(csv_file, timestamp, log_root)
+        handler = logging.FileHandler(log_filepath, encoding='utf-8')
+        handler.setLevel(settings.get('LOG_LEVEL'))
+        handler.setFormatter(logging.Formatter(settings.get('LOG_FORMAT'), settings.get('LOG_DATEFORMAT')))
+        handler.addFilter(SpiderCsvFilter(csv_file))
+        logging.root.addHandler(handler)
+        log_filepaths.append(log_filepath)
+
+        def crawl(crawler_settings=crawler_settings, csv_file=csv_file):
+            print(f"开始爬取: {csv_file}")
+            return process.crawl(Crawler(spider_cls, crawler_settings), csv_file=csv_file)
+
+        crawls.append(semaphore.run(crawl))
+
+    # 所有CSV结束后停止 reactor（stop_after_crawl 只等待启动时已在运行的爬虫）
+    defer.DeferredList(crawls).addBoth(lambda _: reactor.stop())
+    process.start(stop_after_crawl=False)
+    return log_filepaths
+
+
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='大学项目网页爬虫')
-    parser.add_argument('csv_file', type=str,
-                       help='指定CSV文件路径')
-    
+    parser.add_argument('csv_files', type=str, nargs='+',
+                       help='指定CSV文件路径（可传入多个，在同一进程中爬取）')
+    parser.add_argument('--fanout-map', type=str, default=None,
+                       help='扇出映射JSON（plan_crawl.py 生成）；默认自动使用与CSV同名的 .fanout.json')
+    parser.add_argument('--run-dir', type=str, default=None,
+                       help='独立运行目录（shard_launcher.py 分片使用）：输出、日志、状态、断点与缓存都写入该目录')
+    parser.add_argument('--separate-state', action='store_true',
+                       help='状态文件与条件请求缓存/增量状态 SQLite 按CSV分开存放（多个进程同时运行时使用，run_all_subjects.py 自动开启）')
+    parser.add_argument('--overlap', type=int, default=1,
+                       help='多个CSV时最多同时爬取几个（默认 1，即依次爬取）')
+
     args = parser.parse_args()
-    
-    # 使用指定的CSV文件
-    csv_file = args.csv_file
-    print(f"使用CSV文件: {csv_file}")
-    
+
     # 检查CSV文件是否存在
-    if not os.path.exists(csv_file):
-        print(f"错误：找不到文件 {csv_file}")
-        return
-    
+    for csv_file in args.csv_files:
+        if not os.path.exists(csv_file):
+            print(f"错误：找不到文件 {csv_file}")
+            return
+    if args.fanout_map and len(args.csv_files) > 1:
+        parser.error('--fanout-map 只能用于单个CSV；多个CSV时自动使用各自同名的 .fanout.json')
+
+    # 切换目录前转为绝对路径
+    csv_files = [os.path.abspath(csv_file) for csv_file in args.csv_files]
+    print(f"使用CSV文件: {', '.join(args.csv_files)}")
+    run_dir = os.path.abspath(args.run_dir) if args.run_dir else None
+    fanout_map = get_fanout_map(csv_files[0], args.fanout_map) if len(csv_files) == 1 else None
+
     # 切换到脚本目录
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     sys.path.insert(0, os.getcwd())
-    
+
     # 配置日志输出
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    # 从CSV文件路径中提取文件名（不含扩展名）
-    csv_basename = os.path.splitext(os.path.basename(csv_file))[0]
-    
-    # 提取学科名称（去掉可能的数字后缀，如"计算机_1" -> "计算机"）
-    subject_name = csv_basename.split('_')[0] if '_' in csv_basename else csv_basename
-    
-    log_filename = f'{csv_basename}_{timestamp}.log'
-    subject_log_dir = os.path.join('log', subject_name)
-    log_filepath = os.path.join(subject_log_dir, log_filename)
-    
-    # 确保学科日志目录存在
-    if not os.path.exists(subject_log_dir):
-        os.makedirs(subject_log_dir)
-    
+    log_root = os.path.join(run_dir, 'log') if run_dir else 'log'
+    if len(csv_files) == 1:
+        log_filepath = get_log_filepath(csv_files[0], timestamp, log_root)
+    else:
+        # 多CSV：此文件记录整个进程的日志，各CSV另有单独的日志文件
+        multi_log_dir = os.path.join(log_root, '_multi')
+        os.makedirs(multi_log_dir, exist_ok=True)
+        log_filepath = os.path.join(multi_log_dir, f'run_{timestamp}.log')
+
     # 初始化Scrapy设置
     settings = get_project_settings()
     settings.setmodule('program_crawler.settings')
-    
+
     # 设置日志配置
     settings.set('LOG_FILE', log_filepath)
     settings.set('LOG_LEVEL', 'INFO')
     settings.set('LOG_ENCODING', 'utf-8')
-    
+    if len(csv_files) == 1:
+        apply_run_settings(settings, csv_files[0], run_dir, log_root, fanout_map, args.separate_state)
+    if run_dir:
+        print(f"运行目录: {run_dir}")
+
     # 创建爬虫进程
     process = CrawlerProcess(settings)
-    
-    # 启动爬虫，传递CSV文件参数
-    process.crawl('program_spider', csv_file=csv_file)
-    
+
     try:
-        print(f"开始爬取，使用文件: {csv_file}")
         print("按 Ctrl+C 可随时中断爬取")
         print("-" * 50)
-        
-        process.start()
-        
+
+        if len(csv_files) == 1:
+            # 启动爬虫，传递CSV文件参数
+            process.crawl('program_spider', csv_file=csv_files[0])
+            print(f"开始爬取，使用文件: {args.csv_files[0]}")
+            process.start()
+        else:
+            csv_log_files = run_multiple(process, settings, csv_files, args, run_dir, log_root, timestamp)
+            print("\n各CSV日志:")
+            for csv_log_file in csv_log_files:
+                print(f"  {csv_log_file}")
+
     except KeyboardInterrupt:
         print(f"\n爬虫被用户中断")
         print(f"日志已保存在: {log_filepath}")
     except Exception as e:
         print(f"爬虫运行出错: {e}")
         print(f"日志已保存在: {log_filepath}")
+        # 非零退出码，供 run_all_subjects.py 等调用方判断失败
+        sys.exit(1)
     finally:
         print(f"\n完整日志记录已保存在: {log_filepath}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+分片爬取启动器 - 按域名哈希把全部项目分成 N 个分片，生成 Slurm 作业数组脚本，并合并各分片结果
+
+原来 run_all_subjects.py 手工维护 5 组CSV、改 selected_group 后逐个在节点上启动；
+同一大学的项目分散在不同学科CSV里，多个节点会同时访问同一所大学。
+
+本脚本：
+1. plan：合并所有输入CSV，按“站点”（注册域名，如 imperial.ac.uk）分成 N 个分片，
+   同一大学的所有项目只会落在一个分片（一个节点）上；写出 shard_000.csv ... 与 crawl_array.sbatch
+   - balanced（默认）：站点按项目数从大到小依次分给当前项目数最少的分片。站点规模差异很大
+     （ucl.ac.uk 一个站点就有 450+ 个项目），纯哈希时最大分片会明显偏大，拖慢整个作业数组
+   - hash：按站点的 md5 哈希取模，输入CSV变化时已有站点的分片归属不变
+2. 提交：sbatch shards/<名称>/crawl_array.sbatch，每个数组任务运行
+   run_crawler.py shard_XXX.csv --run-dir shard_XXX/，输出/日志/状态/断点/缓存都写在分片自己的目录
+3. merge：把各分片的 output/ 与失败URL日志合并回 crawl/output 与 crawl/log，状态文件按学科求和
+
+输入与 N 不变时两种策略的划分都是确定的，重新运行同一分片可以复用其断点与缓存。
+
+用法：
+    python shard_launcher.py plan --shards 8                          # 默认合并 urls_subject/ 下全部CSV
+    python shard_launcher.py plan --shards 8 --dedupe --name full_v2  # 同时按根URL去重（见 plan_crawl.py）
+    sbatch shards/full_v2/crawl_array.sbatch
+    python shard_launcher.py merge shards/full_v2
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from plan_crawl import build_plan, collect_csv_files  # noqa: E402
+from program_crawler.failure_journal import merge_records, read_records  # noqa: E402
+
+CRAWL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 二级域名后缀：这些后缀下注册域名取最后三段（如 ox.ac.uk、unimelb.edu.au）
+SECOND_LEVEL_LABELS = {'ac', 'edu', 'co', 'com', 'org', 'gov', 'net'}
+
+SBATCH_TEMPLATE = """#!/bin/bash
+#SBATCH --job-name={job_name}
+#SBATCH --array=0-{last_index}{concurrency}
+#SBATCH --output={slurm_log_dir}/{job_name}_%A_%a.out
+#SBATCH --error={slurm_log_dir}/{job_name}_%A_%a.err
+#SBATCH --cpus-per-task={cpus}
+#SBATCH --mem={mem}
+#SBATCH --time={time}
+{partition}
+# 由 shard_launcher.py 生成：每个数组任务爬取一个分片，分片之间没有共同的域名
+cd {crawl_dir}
+SHARD=$(printf "%03d" "$SLURM_ARRAY_TASK_ID")
+{python} run_crawler.py "{shard_dir}/shard_$SHARD.csv" --run-dir "{shard_dir}/shard_$SHARD"
+"""
+
+
+def site_key(url):
+    """
+    项目所属站点：URL host 的注册域名（近似），同一大学的不同子域名归为一个站点
+
+    Example:
+        >>> site_key("https://www.imperial.ac.uk/study/")
+        "imperial.ac.uk"
+        >>> site_key("https://grad.stanford.edu/programs")
+        "stanford.edu"
+    """
+    host = (urlparse(url).hostname or '').lower().rstrip('.')
+    labels = host.split('.')
+    if len(labels) >= 3 and labels[-2] in SECOND_LEVEL_LABELS and len(labels[-1]) == 2:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def shard_index(site, num_shards):
+    """按站点的稳定哈希（md5，与进程/Python版本无关）计算分片编号"""
+    return int(hashlib.md5(site.encode('utf-8')).hexdigest(), 16) % num_shards
+
+
+def assign_shards(rows, num_shards, strategy='balanced'):
+    """
+    把项目按站点分配到分片，同一站点的项目总在同一分片
+
+    Returns:
+        list: 每个分片的项目行列表
+    """
+    site_rows = {}
+    for row in rows:
+        url = (row.get('program_url') or '').strip()
+        site_rows.setdefault(site_key(url) or url, []).append(row)
+
+    shards = [[] for _ in range(num_shards)]
+    if strategy == 'hash':
+        for site, members in site_rows.items():
+            shards[shard_index(site, num_shards)].extend(members)
+        return shards
+
+    # 最大项目数优先（LPT）：大站点先放，小站点填平；站点名参与排序保证结果确定
+    for site, members in sorted(site_rows.items(), key=lambda entry: (-len(entry[1]), entry[0])):
+        target = min(range(num_shards), key=lambda index: (len(shards[index]), index))
+        shards[target].extend(members)
+    return shards
+
+
+def read_rows(csv_files):
+    """读取并合并所有CSV行"""
+    fieldnames = None
+    rows = []
+    for csv_file in csv_files:
+        with open(csv_file, 'r', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            if fieldnames is None:
+                fieldnames = reader.fieldnames
+            rows.extend(reader)
+    return fieldnames, rows
+
+
+def plan(args):
+    csv_files = collect_csv_files(args.inputs)
+    if not csv_files:
+        print("没有找到输入CSV")
+        return
+
+    fanout = {}
+    if args.dedupe:
+        fieldnames, rows, fanout, total_rows = build_plan(csv_files)
+    else:
+        fieldnames, rows = read_rows(csv_files)
+        total_rows = len(rows)
+
+    shard_dir = os.path.abspath(os.path.join(args.output_root, args.name))
+    os.makedirs(shard_dir, exist_ok=True)
+
+    shards = assign_shards(rows, args.shards, args.strategy)
+    sites = [{site_key((row.get('program_url') or '').strip()) for row in shard_rows} for shard_rows in shards]
+
+    for index, shard_rows in enumerate(shards):
+        shard_csv = os.path.join(shard_dir, f'shard_{index:03d}.csv')
+        with open(shard_csv, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(shard_rows)
+        if fanout:
+            # run_crawler.py 自动加载与CSV同名的扇出映射
+            shard_fanout = {row['id']: fanout[row['id']] for row in shard_rows if row['id'] in fanout}
+            with open(os.path.splitext(shard_csv)[0] + '.fanout.json', 'w', encoding='utf-8') as f:
+                json.dump(shard_fanout, f, ensure_ascii=False, indent=2)
+
+    slurm_log_dir = os.path.join(CRAWL_DIR, 'slurm_log')
+    sbatch_path = os.path.join(shard_dir, 'crawl_array.sbatch')
+    with open(sbatch_path, 'w', encoding='utf-8') as f:
+        f.write(SBATCH_TEMPLATE.format(
+            job_name=args.job_name,
+            last_index=args.shards - 1,
+            concurrency=f'%{args.max_running}' if args.max_running else '',
+            slurm_log_dir=slurm_log_dir,
+            cpus=args.cpus,
+            mem=args.mem,
+            time=args.time,
+            partition=f'#SBATCH --partition={args.partition}\n' if args.partition else '',
+            crawl_dir=CRAWL_DIR,
+            python=args.python,
+            shard_dir=shard_dir,
+        ))
+
+    with open(os.path.join(shard_dir, 'shards.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'inputs': csv_files,
+            'num_shards': args.shards,
+            'strategy': args.strategy,
+            'dedupe': args.dedupe,
+            'shards': [{'projects': len(s), 'sites': len(sites[i])} for i, s in enumerate(shards)],
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"输入CSV: {len(csv_files)} 个，共 {total_rows} 行，待爬取 {len(rows)} 个项目")
+    for index, shard_rows in enumerate(shards):
+        print(f"  shard_{index:03d}: {len(shard_rows)} 个项目，{len(sites[index])} 个站点")
+    largest = max(len(s) for s in shards)
+    print(f"最大分片占比: {largest / max(len(rows), 1):.1%}（理想值 {1 / args.shards:.1%}）")
+    print(f"Slurm 脚本: {sbatch_path}")
+    print(f"提交: sbatch {sbatch_path}")
+    print(f"完成后合并: python shard_launcher.py merge {shard_dir}")
+
+
+def merge_tree(src_dir, dst_dir):
+    """复制目录树；JSONL 增量清单按行追加，其余文件覆盖"""
+    copied = 0
+    for root, _dirs, files in os.walk(src_dir):
+        target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for filename in files:
+            if filename.endswith('.tmp'):
+                continue
+            src = os.path.join(root, filename)
+            dst = os.path.join(target_root, filename)
+            if os.path.basename(root) == '_delta':
+                with open(src, 'r', encoding='utf-8') as fin, open(dst, 'a', encoding='utf-8') as fout:
+                    shutil.copyfileobj(fin, fout)
+            else:
+                shutil.copy2(src, dst)
+            copied += 1
+    return copied
+
+
+def merge_failure_logs(shard_log_dirs, log_root):
+    """按来源文件合并各分片的失败URL日志（按URL去重），追加到 crawl/log 下同名 JSONL"""
+    journals = {}
+    for shard_log_dir in shard_log_dirs:
+        for path in glob.glob(os.path.join(shard_log_dir, '*', 'failed_urls_*.jsonl')):
+            relpath = os.path.relpath(path, shard_log_dir)
+            journals.setdefault(relpath, []).append(read_records(path))
+
+    merged_count = 0
+    for relpath, record_lists in journals.items():
+        target = os.path.join(log_root, relpath)
+        existing = read_records(target)
+        existing_urls = {record.get('url') for record in existing}
+        new_records = [r for r in merge_records(*record_lists) if r.get('url') not in existing_urls]
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'a', encoding='utf-8') as f:
+            for record in new_records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        merged_count += len(new_records)
+    return len(journals), merged_count
+
+
+def merge_status(shard_status_dirs, status_file):
+    """各分片最新的状态文件按来源文件求和，格式与 CrawlStatusAggregator 的状态文件相同"""
+    merged = {
+        'subjects': {},
+        'failed_projects': [],
+        'completed_subjects': [],
+        'start_time': None,
+        'last_update': datetime.now().isoformat(),
+    }
+    for status_dir in shard_status_dirs:
+        status_files = sorted(glob.glob(os.path.join(status_dir, 'crawl_status_*.json')))
+        if not status_files:
+            continue
+        with open(status_files[-1], 'r', encoding='utf-8') as f:
+            shard_status = json.load(f)
+        for key, subject in shard_status.get('subjects', {}).items():
+            target = merged['subjects'].setdefault(
+                key, {'status': 'running', 'total': 0, 'completed': 0, 'unchanged': 0, 'partial': 0, 'failed': 0})
+            for field in ('total', 'completed', 'unchanged', 'partial', 'failed'):
+                target[field] += subject.get(field, 0)
+        merged['failed_projects'].extend(shard_status.get('failed_projects', []))
+        start_time = shard_status.get('start_time')
+        if start_time and (merged['start_time'] is None or start_time < merged['start_time']):
+            merged['start_time'] = start_time
+
+    for key, subject in merged['subjects'].items():
+        if subject['total'] and subject['completed'] + subject['unchanged'] + subject['partial'] + subject['failed'] >= subject['total']:
+            subject['status'] = 'completed'
+            merged['completed_subjects'].append(key)
+
+    os.makedirs(os.path.dirname(status_file), exist_ok=True)
+    with open(status_file, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+
+
+def merge(args):
+    shard_dir = os.path.abspath(args.shard_dir)
+    run_dirs = sorted(d for d in glob.glob(os.path.join(shard_dir, 'shard_*')) if os.path.isdir(d))
+    if not run_dirs:
+        print(f"{shard_dir} 下没有分片运行目录")
+        return
+
+    copied = 0
+    for run_dir in run_dirs:
+        if os.path.isdir(os.path.join(run_dir, 'output')):
+            copied += merge_tree(os.path.join(run_dir, 'output'), args.output)
+    print(f"合并输出: {len(run_dirs)} 个分片，{copied} 个文件 -> {args.output}")
+
+    journal_count, record_count = merge_failure_logs(
+        [os.path.join(run_dir, 'log') for run_dir in run_dirs], args.log_root)
+    print(f"合并失败URL日志: {journal_count} 个来源文件，新增 {record_count} 条 -> {args.log_root}")
+
+    status_file = os.path.join(CRAWL_DIR, 'status_log',
+                               f'crawl_status_{os.path.basename(shard_dir)}_merged.json')
+    merge_status([os.path.join(run_dir, 'status_log') for run_dir in run_dirs], status_file)
+    print(f"合并状态: {status_file}")
+
+    unfinished = [os.path.basename(d) for d in run_dirs if glob.glob(os.path.join(d, 'checkpoints', '*.jsonl'))]
+    if unfinished:
+        print(f"注意: {len(unfinished)} 个分片仍有断点（未正常结束），可重新提交对应数组任务续爬: {', '.join(unfinished)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按域名分片的分布式爬取启动器（Slurm 作业数组）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = subparsers.add_parser('plan', help='生成分片CSV与 Slurm 作业数组脚本')
+    plan_parser.add_argument('inputs', nargs='*', default=[os.path.join(CRAWL_DIR, 'urls_subject')],
+                             help='输入CSV文件或目录（默认 urls_subject/）')
+    plan_parser.add_argument('--shards', type=int, required=True, help='分片数（= Slurm 数组任务数）')
+    plan_parser.add_argument('--name', default=datetime.now().strftime('%y%m%d%H%M'), help='分片目录名')
+    plan_parser.add_argument('--output-root', default=os.path.join(CRAWL_DIR, 'shards'), help='分片根目录')
+    plan_parser.add_argument('--strategy', choices=('balanced', 'hash'), default='balanced',
+                             help='站点分配策略：balanced 按项目数均衡，hash 按站点哈希')
+    plan_parser.add_argument('--dedupe', action='store_true', help='先按根URL去重，重复项目通过扇出映射输出')
+    plan_parser.add_argument('--job-name', default='GP_Crawler')
+    plan_parser.add_argument('--cpus', type=int, default=4)
+    plan_parser.add_argument('--mem', default='8G')
+    plan_parser.add_argument('--time', default='24:00:00')
+    plan_parser.add_argument('--partition', default=None)
+    plan_parser.add_argument('--max-running', type=int, default=0, help='同时运行的数组任务上限（0 不限制）')
+    plan_parser.add_argument('--python', default=sys.executable, help='节点上使用的 Python 解释器')
+
+    merge_parser = subparsers.add_parser('merge', help='合并各分片的输出、失败URL日志与状态')
+    merge_parser.add_argument('shard_dir', help='plan 生成的分片目录')
+    merge_parser.add_argument('--output', default=os.path.join(CRAWL_DIR, 'output'), help='合并后的输出目录')
+    merge_parser.add_argument('--log-root', default=os.path.join(CRAWL_DIR, 'log'), help='合并后的失败URL日志目录')
+
+    args = parser.parse_args()
+    if args.command == 'plan':
+        if args.shards < 1:
+            parser.error('--shards 必须 >= 1')
+        plan(args)
+    else:
+        merge(args)
+
+
+if __name__ == '__main__':
+    main()